@@ -1,94 +1,299 @@
 # api_service.py
 import requests
+from metrics import ERRORS, LINES, REQUESTS, STAGE_SECONDS
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
 
-class APIService:
-    def __init__(self, base_url: str, headers: Dict, bookie_map: Dict):
+try:
+    import orjson
+    loads = orjson.loads
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:  # Fall back to the stdlib codec
+    import json
+    loads = json.loads
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, sort_keys=True)
+
+class LineRecord(NamedTuple):
+    """A single parsed line. Lines from one fetch share a timestamp object."""
+    event_id: str
+    market_id: int
+    market_type: str
+    bookie_id: int
+    bookie: str
+    player_name: Optional[str]
+    selection: str
+    line_value: Optional[float]
+    odds: int
+    timestamp: datetime
+    player_id: Optional[str] = None  # Upstream participant ID, for props
+
+    @property
+    def display(self) -> str:
+        """Human-readable line, rendered on demand"""
+        if self.market_type == 'props':
+            return f"{self.player_name} - {self.selection} {self.line_value} ({self.odds})"
+        if self.market_id == 1:  # Moneyline
+            return f"{self.selection} ({self.odds})"
+        if self.market_id == 2:  # Total
+            return f"{self.selection} {self.line_value} ({self.odds})"
+        return f"{self.selection} {self.line_value:+g} ({self.odds})"  # Spread
+
+class UnchangedOffer(NamedTuple):
+    """A book's offer that was skipped because its payload matched the last fetch"""
+    event_id: str
+    market_id: int
+    player_name: Optional[str]
+    bookie_id: int
+    timestamp: datetime
+
+class LineBatch(list):
+    """Lines parsed from one fetch, plus the offers skipped as unchanged"""
+    def __init__(self, lines=(), unchanged: List[UnchangedOffer] = None, fetched_at: datetime = None):
+        super().__init__(lines)
+        self.unchanged = unchanged if unchanged is not None else []
+        self.fetched_at = fetched_at
+
+class BaseAPIService:
+    """What the sync and async API services share: conditional-request
+    caching, offer parsing and unchanged-offer hashing. Subclasses supply the
+    transport: _get(), fetch_events(), fetch_market_odds() and _fetch_offers().
+    """
+    def __init__(self, base_url: str, headers: Dict, bookie_map: Dict, page_limit: int = 100,
+                 timeout: float = 10, skip_unchanged: bool = True):
         self.base_url = base_url
         self.headers = headers
         self.bookie_map = bookie_map
-        
-    def fetch_events(self, sport="NFL", week=18, season=2024) -> Dict[str, Any]:
-        """Fetch active events"""
-        params = {
-            "sport": sport,
-            "week": week,
-            "season": season
+        self.page_limit = page_limit
+        self.max_pages = 50  # Guard against an upstream that ignores the page param
+        self.timeout = timeout
+        # Short-circuit unchanged payloads: ETags per request, hashes per book
+        self.skip_unchanged = skip_unchanged
+        self._etags = {}  # (path, params) -> (etag, decoded body)
+        self._offer_hashes = {}  # (event_id, market_id) -> {player_name: (offer hashes, {bookie_id: hash})}
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Zero the request and offer hit counters"""
+        self.stats = {
+            'requests': 0,
+            'not_modified': 0,
+            'books': 0,
+            'books_unchanged': 0
         }
-        try:
-            response = requests.get(
-                f"{self.base_url}/events",
-                headers=self.headers,
-                params=params
-            )
-            response.raise_for_status()
-            events = response.json().get('events', [])
-            
-            event_info = {}
-            for event in events:
-                event_id = str(event['id'])
-                event_info[event_id] = {
-                    'event_id': event_id,
-                    'home': event['participants'][1]['name'],
-                    'away': event['participants'][0]['name'],
-                    'scheduled': event['scheduled'],
-                    'status': event.get('status', '').lower()
-                }
-            print(f"Fetched {len(event_info)} events.")
-            return event_info
-        except Exception as e:
-            print(f"Error fetching events: {e}")
-            return {}
+    
+    def hit_rates(self) -> Dict[str, float]:
+        """Share of requests answered 304 and of book offers skipped as unchanged"""
+        stats = self.stats
+        return {
+            'not_modified': stats['not_modified'] / stats['requests'] if stats['requests'] else 0.0,
+            'books_unchanged': stats['books_unchanged'] / stats['books'] if stats['books'] else 0.0
+        }
+    
+    def reset_hashes(self):
+        """Forget every ETag and offer hash, so the next fetch parses everything.
+        
+        Call this when lines from a fetch were not persisted; otherwise their
+        offers would be skipped as unchanged next time.
+        """
+        self._etags.clear()
+        self._offer_hashes.clear()
+    
+    def _request_key(self, path: str, params: Dict) -> Tuple:
+        return (path, tuple(sorted(params.items())))
+    
+    def _conditional_headers(self, key: Tuple) -> Dict[str, str]:
+        """If-None-Match for a request whose last response carried an ETag"""
+        cached = self._etags.get(key) if self.skip_unchanged else None
+        return {'If-None-Match': cached[0]} if cached else {}
+    
+    def _decode(self, key: Tuple, status_code: int, headers, content: bytes) -> Dict:
+        """Decode a response body, or return the cached body for a 304"""
+        self.stats['requests'] += 1
+        if status_code == 304 and key in self._etags:
+            self.stats['not_modified'] += 1
+            return self._etags[key][1]
+        
+        data = loads(content)
+        etag = headers.get('ETag')
+        if etag and self.skip_unchanged:
+            self._etags[key] = (etag, data)
+        else:
+            self._etags.pop(key, None)
+        return data
+        
+    def _process_events(self, events: List[Dict]) -> Dict[str, Any]:
+        """Index raw events by event ID"""
+        event_info = {}
+        for event in events:
+            event_id = str(event['id'])
+            event_info[event_id] = {
+                'event_id': event_id,
+                'home': event['participants'][1]['name'],
+                'away': event['participants'][0]['name'],
+                'scheduled': event['scheduled'],
+                'status': event.get('status', '').lower(),
+                'season': event.get('season'),
+                'week': event.get('week')
+            }
+        return event_info
 
-    def fetch_market_odds(self, market_type: str, market_id: int, event_ids: List[str]) -> List[Dict]:
-        """Fetch odds for a specific market"""
-        if not event_ids:
-            return []
-            
-        event_id_str = ','.join(event_ids)
-        params = {
+    def _parse_offers(self, market_type: str, market_id: int, offers: List[Dict], event_ids: List[str]) -> LineBatch:
+        """Timed and counted _process_offers, shared by the sync and async fetch paths"""
+        with STAGE_SECONDS.time(stage='parse', market_id=market_id):
+            processed_lines = self._process_offers(market_type, market_id, offers, event_ids)
+        LINES.inc(len(processed_lines), kind='parsed', market_id=market_id)
+        LINES.inc(len(processed_lines.unchanged), kind='unchanged', market_id=market_id)
+        print(f"Processed {len(processed_lines)} lines for market {market_id} "
+              f"({len(processed_lines.unchanged)} book offers unchanged)")
+        return processed_lines
+
+    def _offer_params(self, market_id: int, event_ids: List[str], page: int) -> Dict:
+        """Build the query parameters for one page of /offers"""
+        return {
             "sport": "NFL",
             "market_id": market_id,
-            "event_id": event_id_str,
+            "event_id": ','.join(event_ids),
             "location": "OH",
-            "limit": 100
+            "limit": self.page_limit,
+            "page": page
         }
+
+    def _is_last_page(self, data: Dict, page_offers: List[Dict], page: int) -> bool:
+        """Check whether an /offers response is the final page"""
+        # Prefer the upstream pagination block; fall back to a short page
+        pagination = data.get("_pagination") or {}
+        total_pages = pagination.get("total_pages")
+        if total_pages is not None:
+            return page >= total_pages
+        return len(page_offers) < self.page_limit
+
+    def _report_truncated(self, market_id: int, offers: List[Dict]):
+        """Count and report a market that still had pages after max_pages"""
+        ERRORS.inc(stage='pagination')
+        print(f"Warning: market {market_id} has more than {self.max_pages} pages of offers; "
+              f"keeping the first {len(offers)}")
+
+    def _process_offers(self, market_type: str, market_id: int, offers: List[Dict],
+                        event_ids: List[str] = None) -> LineBatch:
+        """Process raw offers into line records.
         
-        try:
-            response = requests.get(
-                f"{self.base_url}/offers",
-                headers=self.headers,
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            offers = data.get("offers", [])
-            processed_lines = []
+        With skip_unchanged, books whose lines hash the same as in the last
+        fetch of this market aren't parsed; they're listed in the batch's
+        `unchanged` instead. `event_ids` are the events the fetch covered, so
+        hashes for events that returned no offers are dropped.
+        """
+        # One timestamp for the whole fetch so its lines share a snapshot time
+        batch = LineBatch(fetched_at=datetime.utcnow())
+        changed = self._diff_books(market_type, market_id, offers, event_ids, batch) if self.skip_unchanged else None
+        
+        for offer in offers:
+            bookie_ids = None
+            if changed is not None:
+                bookie_ids = changed.get((str(offer.get("event_id")), self._offer_player(market_type, offer)))
+                if not bookie_ids:
+                    continue
+            # Handle different market types
+            if market_type == 'game_lines':
+                batch.extend(self._process_game_lines(offer, market_id, batch.fetched_at, bookie_ids))
+            else:  # props
+                batch.extend(self._process_props(offer, market_id, batch.fetched_at, bookie_ids))
+        return batch
+
+    def _diff_books(self, market_type: str, market_id: int, offers: List[Dict], event_ids: List[str],
+                    batch: LineBatch) -> Dict[Tuple, set]:
+        """Hash each book's lines per (event, player) and compare with the last fetch.
+        
+        Whole offers are hashed first, so a player whose offers are unchanged
+        skips the per-book pass. Records unchanged books in `batch.unchanged`
+        and returns the changed ones as {(event_id, player_name): {bookie_id}}.
+        """
+        by_player = {}
+        for offer in offers:
+            key = (str(offer.get("event_id")), self._offer_player(market_type, offer))
+            by_player.setdefault(key, []).append(offer)
+        
+        hashes = {}
+        changed = {}
+        books = 0
+        for (event_id, player_name), player_offers in by_player.items():
+            previous = self._offer_hashes.get((event_id, market_id), {}).get(player_name)
+            offer_digest = tuple(hash(dumps(offer)) for offer in player_offers)
             
-            for offer in offers:
-                # Handle different market types
-                if market_type == 'game_lines':
-                    processed_lines.extend(self._process_game_lines(offer, market_id))
-                else:  # props
-                    processed_lines.extend(self._process_props(offer, market_id))
-                
-            print(f"Processed {len(processed_lines)} lines for market {market_id}")
-            return processed_lines
+            if previous and previous[0] == offer_digest:
+                # Nothing changed for this player: every book is unchanged
+                hashes.setdefault((event_id, market_id), {})[player_name] = previous
+                batch.unchanged.extend(
+                    UnchangedOffer(event_id, market_id, player_name, bookie_id, batch.fetched_at)
+                    for bookie_id in previous[1]
+                )
+                books += len(previous[1])
+                continue
             
-        except Exception as e:
-            print(f"Error fetching market {market_id}: {e}")
-            return []
+            contents = {}
+            for offer in player_offers:
+                for selection in offer.get('selections', []):
+                    side = selection.get('label', '')
+                    for book in selection.get('books', []):
+                        if book['id'] in self.bookie_map:
+                            contents.setdefault(book['id'], []).append((side, book.get('lines', [])))
+            book_digests = {bookie_id: hash(dumps(content)) for bookie_id, content in contents.items()}
+            hashes.setdefault((event_id, market_id), {})[player_name] = (offer_digest, book_digests)
+            previous_books = previous[1] if previous else {}
+            for bookie_id, digest in book_digests.items():
+                if previous_books.get(bookie_id) == digest:
+                    batch.unchanged.append(UnchangedOffer(event_id, market_id, player_name, bookie_id, batch.fetched_at))
+                else:
+                    changed.setdefault((event_id, player_name), set()).add(bookie_id)
+            books += len(contents)
+        
+        # Hashes are replaced per event so a book that drops out and later
+        # returns with the same lines is parsed again
+        for event_id in event_ids or []:
+            self._offer_hashes.pop((event_id, market_id), None)
+        self._offer_hashes.update(hashes)
+        
+        self.stats['books'] += books
+        self.stats['books_unchanged'] += len(batch.unchanged)
+        return changed
+
+    def _offer_player(self, market_type: str, offer: Dict) -> Optional[str]:
+        """Player an offer is for; game lines have none"""
+        if market_type == 'game_lines':
+            return None
+        
+        # Get player info if available
+        player_name = "Unknown"
+        if offer.get('participants'):
+            player = offer['participants'][0].get('player', {})
+            player_name = f"{player.get('first_name', '')} {player.get('last_name', '')}"
+        return player_name
+
+    def _offer_player_id(self, offer: Dict) -> Optional[str]:
+        """Upstream participant ID of a prop offer's player, if the API sent one"""
+        if offer.get('participants'):
+            participant_id = offer['participants'][0].get('id')
+            if participant_id is not None:
+                return str(participant_id)
+        return None
 
-    def _process_game_lines(self, offer: Dict, market_id: int) -> List[Dict]:
-        """Process game lines markets (moneyline, spread, totals)"""
+    def _process_game_lines(self, offer: Dict, market_id: int, fetched_at: datetime,
+                            bookie_ids: set = None) -> List[LineRecord]:
+        """Process game lines markets (moneyline, spread, totals), optionally only some books"""
         processed_lines = []
         event_id = str(offer.get("event_id"))
+        bookie_map = self.bookie_map
         
         for selection in offer.get('selections', []):
+            side = selection.get('label', '')
             for book in selection.get('books', []):
-                bookie_name = self.bookie_map.get(book['id'])
+                bookie_id = book['id']
+                if bookie_ids is not None and bookie_id not in bookie_ids:
+                    continue
+                bookie_name = bookie_map.get(bookie_id)
                 if not bookie_name:
                     continue
                     
@@ -96,72 +301,108 @@ class APIService:
                     if not (line.get('active') and not line.get('replaced')):
                         continue
                     
-                    side = selection.get('label', '')
-                    line_value = line.get('line')
-                    odds = line.get('cost')
-                    
-                    # Format the display string based on market type and side
-                    if market_id == 1:  # Moneyline
-                        display = f"{side} ({odds})"
-                    elif market_id == 2:  # Total
-                        display = f"{side} {line_value} ({odds})"
-                    else:  # Spread
-                        display = f"{side} {line_value:+g} ({odds})"
-                        
-                    line_data = {
-                        'event_id': event_id,
-                        'market_id': market_id,
-                        'bookie': bookie_name,
-                        'bookie_id': book['id'],
-                        'selection': side,
-                        'line_value': line_value,
-                        'odds': odds,
-                        'display': display,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    processed_lines.append(line_data)
+                    processed_lines.append(LineRecord(
+                        event_id, market_id, 'game_lines', bookie_id, bookie_name, None,
+                        side, line.get('line'), line.get('cost'), fetched_at
+                    ))
         
         return processed_lines
 
-    def _process_props(self, offer: Dict, market_id: int) -> List[Dict]:
-        """Process player prop markets"""
+    def _process_props(self, offer: Dict, market_id: int, fetched_at: datetime,
+                       bookie_ids: set = None) -> List[LineRecord]:
+        """Process player prop markets, optionally only some books"""
         processed_lines = []
         event_id = str(offer.get("event_id"))
+        bookie_map = self.bookie_map
         
-        # Get player info if available
-        player_name = "Unknown"
-        if offer.get('participants'):
-            player = offer['participants'][0].get('player', {})
-            player_name = f"{player.get('first_name', '')} {player.get('last_name', '')}"
+        player_name = self._offer_player('props', offer)
+        player_id = self._offer_player_id(offer)
         
         for selection in offer.get('selections', []):
+            side = selection.get('label', '')
             for book in selection.get('books', []):
-                bookie_name = self.bookie_map.get(book['id'])
+                bookie_id = book['id']
+                if bookie_ids is not None and bookie_id not in bookie_ids:
+                    continue
+                bookie_name = bookie_map.get(bookie_id)
                 if not bookie_name:
                     continue
                     
                 for line in book.get('lines', []):
                     if not (line.get('active') and not line.get('replaced')):
                         continue
-                        
-                    side = selection.get('label', '')
-                    line_value = line.get('line')
-                    odds = line.get('cost')
                     
-                    display = f"{player_name} - {side} {line_value} ({odds})"
-                        
-                    line_data = {
-                        'event_id': event_id,
-                        'market_id': market_id,
-                        'bookie': bookie_name,
-                        'bookie_id': book['id'],
-                        'player_name': player_name,
-                        'selection': side,
-                        'line_value': line_value,
-                        'odds': odds,
-                        'display': display,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    processed_lines.append(line_data)
+                    processed_lines.append(LineRecord(
+                        event_id, market_id, 'props', bookie_id, bookie_name, player_name,
+                        side, line.get('line'), line.get('cost'), fetched_at, player_id
+                    ))
         
         return processed_lines
+
+class APIService(BaseAPIService):
+    """Blocking API service on a pooled requests session"""
+    def __init__(self, base_url: str, headers: Dict, bookie_map: Dict, page_limit: int = 100,
+                 timeout: float = 10, skip_unchanged: bool = True):
+        super().__init__(base_url, headers, bookie_map, page_limit=page_limit, timeout=timeout,
+                         skip_unchanged=skip_unchanged)
+        self.session = requests.Session()  # Pooled connections reused across calls
+    
+    def _get(self, path: str, params: Dict) -> Dict:
+        """Conditional GET, reusing the last body when the upstream answers 304"""
+        key = self._request_key(path, params)
+        response = self.session.get(
+            f"{self.base_url}{path}",
+            headers={**self.headers, **self._conditional_headers(key)},
+            params=params,
+            timeout=self.timeout
+        )
+        REQUESTS.inc(path=path, status=response.status_code)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return self._decode(key, response.status_code, response.headers, response.content)
+    
+    def fetch_events(self, sport="NFL", week=18, season=2024) -> Dict[str, Any]:
+        """Fetch active events"""
+        params = {
+            "sport": sport,
+            "week": week,
+            "season": season
+        }
+        try:
+            event_info = self._process_events(self._get("/events", params).get('events', []))
+            print(f"Fetched {len(event_info)} events.")
+            return event_info
+        except Exception as e:
+            ERRORS.inc(stage='fetch')
+            print(f"Error fetching events: {e}")
+            return {}
+    
+    def fetch_market_odds(self, market_type: str, market_id: int, event_ids: List[str]) -> LineBatch:
+        """Fetch odds for a specific market across one or more events"""
+        if not event_ids:
+            return LineBatch()
+        
+        try:
+            with STAGE_SECONDS.time(stage='fetch', market_id=market_id):
+                offers = self._fetch_offers(market_id, event_ids)
+            return self._parse_offers(market_type, market_id, offers, event_ids)
+            
+        except Exception as e:
+            ERRORS.inc(stage='fetch')
+            print(f"Error fetching market {market_id}: {e}")
+            return LineBatch()
+    
+    def _fetch_offers(self, market_id: int, event_ids: List[str]) -> List[Dict]:
+        """Fetch every page of offers for a market, following pagination"""
+        offers = []
+        
+        for page in range(1, self.max_pages + 1):
+            data = self._get("/offers", self._offer_params(market_id, event_ids, page))
+            page_offers = data.get("offers", [])
+            offers.extend(page_offers)
+            if self._is_last_page(data, page_offers, page):
+                break
+        else:
+            self._report_truncated(market_id, offers)
+        
+        return offers
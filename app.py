@@ -5,18 +5,14 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from config import Config
 from api_service import APIService
+from board_cache import BoardCache
 from database import Database
+from line_archive import LineArchive, duckdb
 from line_tracker import LineTracker
+from movement_bus import MovementFeed
+from odds_analytics import analyze_board, book_holds, load_board
 
-# Initialize components
 config = Config()
-api_service = APIService(
-    base_url=config.API_BASE_URL,
-    headers=config.HEADERS,
-    bookie_map=config.BOOKIE_MAP
-)
-db = Database()
-line_tracker = LineTracker(db)
 
 # Page config
 st.set_page_config(
@@ -25,23 +21,113 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_components():
+    """Engine and services, shared by every session and rerun"""
+    api_service = APIService(
+        base_url=config.API_BASE_URL,
+        headers=config.HEADERS,
+        bookie_map=config.BOOKIE_MAP,
+        page_limit=config.OFFERS_PAGE_LIMIT,
+        timeout=config.REQUEST_TIMEOUT
+    )
+    db = Database(
+        config.DATABASE_URL,
+        storage_mode=config.LINE_STORAGE_MODE,
+        # The poller writes boards from another process; load each one fresh, as
+        # load_current_lines only asks again once a new cycle has landed
+        board_cache=BoardCache(ttl=0),
+        wal=config.SQLITE_WAL,
+        busy_timeout=config.SQLITE_BUSY_TIMEOUT,
+        checkpoint_interval=config.SQLITE_CHECKPOINT_SECONDS
+    )
+    line_tracker = LineTracker(db)
+    return api_service, db, line_tracker
+
+# Cached data below is keyed by `cycle`, the latest snapshot ID, so a new
+# poll cycle landing invalidates it; the TTL bounds staleness otherwise.
+
+@st.cache_data(ttl=config.DASHBOARD_EVENTS_TTL)
+def load_events() -> dict:
+    """Current events from the API, for the configured season and weeks"""
+    api_service, _, _ = get_components()
+    events = {}
+    for week in config.WEEKS:
+        events.update(api_service.fetch_events(week=week, season=config.SEASON))
+    return events
+
+@st.cache_data(ttl=config.DASHBOARD_DATA_TTL)
+def load_current_lines(event_id: str, market_id: int, cycle: int) -> pd.DataFrame:
+    """Current board for a market"""
+    _, db, _ = get_components()
+    return pd.DataFrame(
+        [line._asdict() for line in db.get_current_lines(event_id, market_id)]
+    )
+
+@st.cache_data(ttl=config.DASHBOARD_DATA_TTL)
+def load_line_history(event_id: str, market_id: int, cycle: int, player_name: str = None) -> dict:
+    """Downsampled line history for a market, bounded by chart width rather than row count"""
+    _, db, _ = get_components()
+    return db.get_line_history_buckets(
+        event_id,
+        market_id,
+        start=datetime.utcnow() - timedelta(hours=config.DASHBOARD_HISTORY_HOURS),
+        max_points=config.DASHBOARD_HISTORY_POINTS,
+        player_name=player_name
+    )
+
+@st.cache_data(ttl=config.DASHBOARD_DATA_TTL)
+def load_board_analysis(event_ids: tuple, cycle: int) -> pd.DataFrame:
+    """Every line on the slate with its implied probability, book hold and no-vig fair odds"""
+    _, db, _ = get_components()
+    board = load_board(db, list(event_ids), config.BOOKIE_MAP)
+    return analyze_board(board, spread_market_ids=(config.MARKET_CONFIG['game_lines']['spread'],))
+
+@st.cache_resource
+def get_movement_feed() -> MovementFeed:
+    """Movements pushed by the poller's stream, shared by every session"""
+    return MovementFeed(f"http://127.0.0.1:{config.MOVEMENT_STREAM_PORT}/movements", config.MOVEMENT_HISTORY)
+
+@st.cache_data(ttl=config.DASHBOARD_DATA_TTL)
+def query_movements(event_id: str, cycle: int) -> list:
+    """Last hour's significant line movements for an event, from the database"""
+    _, db, _ = get_components()
+    movements, _ = db.get_movements(event_id, since=datetime.utcnow() - timedelta(hours=1))
+    return movements
+
+def load_movements(event_id: str, cycle: int) -> list:
+    """Streamed movements, newest first; reads the database when no poller is
+    streaming, or the stream holds nothing for the event yet"""
+    feed = get_movement_feed() if config.MOVEMENT_STREAM_PORT else None
+    movements = feed.recent(event_id) if feed and feed.connected else []
+    if movements:
+        return movements[::-1]
+    return query_movements(event_id, cycle)
+
+@st.cache_data(ttl=config.DASHBOARD_DATA_TTL)
+def load_season_history(market_id: int, season: int = None, player_name: str = None) -> pd.DataFrame:
+    """Per-week open/close movement of a market from the Parquet archive"""
+    _, db, _ = get_components()
+    archive = LineArchive(db, config.ARCHIVE_DIR)
+    return archive.market_movement(market_id, season=season, player_name=player_name or None)
+
 def format_odds(odds: int) -> str:
     """Format odds for display"""
     return f"+{odds}" if odds > 0 else str(odds)
 
-def plot_line_history(history_data: list) -> go.Figure:
+def plot_line_history(history: dict) -> go.Figure:
     """Create line movement plot"""
     fig = go.Figure()
     
-    bookies = set(h.bookie_id for h in history_data)
-    for bookie_id in bookies:
-        bookie_data = [h for h in history_data if h.bookie_id == bookie_id]
+    for (bookie_id, selection, player_name), series in history.items():
         bookie_name = config.BOOKIE_MAP.get(bookie_id, str(bookie_id))
         
         fig.add_trace(go.Scatter(
-            x=[h.timestamp for h in bookie_data],
-            y=[h.odds for h in bookie_data],
-            name=bookie_name,
+            x=series['timestamp'],
+            y=series['close'],
+            customdata=list(zip(series['open'], series['min'], series['max'])),
+            hovertemplate="Open %{customdata[0]}<br>Close %{y}<br>Low %{customdata[1]}<br>High %{customdata[2]}",
+            name=f"{bookie_name} - {selection}",
             mode='lines+markers'
         ))
     
@@ -57,8 +143,11 @@ def plot_line_history(history_data: list) -> go.Figure:
 def main():
     st.title("NFL Betting Lines Tracker")
     
+    _, db, _ = get_components()
+    cycle = db.get_last_snapshot_id()
+    
     # Fetch current events
-    events = api_service.fetch_events()
+    events = load_events()
     if not events:
         st.error("No events found")
         return
@@ -75,7 +164,7 @@ def main():
     event_id = event_options[selected_event]
     
     # Market type tabs
-    tab1, tab2 = st.tabs(["Game Lines", "Player Props"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Game Lines", "Player Props", "Fair Odds", "Season History"])
     
     with tab1:
         st.header("Game Lines")
@@ -89,27 +178,24 @@ def main():
             st.subheader(market_name)
             
             # Get current lines
-            current_lines = db.get_current_lines(event_id, market_id)
-            if current_lines:
+            current_lines = load_current_lines(event_id, market_id, cycle)
+            if not current_lines.empty:
                 # Format data for display
-                data = []
-                for line in current_lines:
-                    data.append({
-                        'Bookie': config.BOOKIE_MAP.get(line.bookie_id),
-                        'Selection': line.selection,
-                        'Line': line.line_value,
-                        'Odds': format_odds(line.odds)
-                    })
+                df = pd.DataFrame({
+                    'Bookie': current_lines['bookie_id'].map(config.BOOKIE_MAP),
+                    'Selection': current_lines['selection'],
+                    'Line': current_lines['line_value'],
+                    'Odds': current_lines['odds'].map(format_odds)
+                })
                 
                 # Show as dataframe
-                df = pd.DataFrame(data)
                 st.dataframe(df, use_container_width=True)
                 
                 # Line movement chart
-                history = db.get_line_history(event_id, market_id)
+                history = load_line_history(event_id, market_id, cycle)
                 if history:
                     fig = plot_line_history(history)
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig, use_container_width=True, key=f"history_chart_{market_id}")
     
     with tab2:
         st.header("Player Props")
@@ -117,29 +203,91 @@ def main():
         # Props markets
         for market_id, market_name in config.MARKET_CONFIG['props'].items():
             with st.expander(market_name):
-                current_lines = db.get_current_lines(event_id, market_id)
-                if current_lines:
-                    data = []
-                    for line in current_lines:
-                        data.append({
-                            'Player': line.player_name,
-                            'Bookie': config.BOOKIE_MAP.get(line.bookie_id),
-                            'Selection': line.selection,
-                            'Line': line.line_value,
-                            'Odds': format_odds(line.odds)
-                        })
-                    
-                    df = pd.DataFrame(data)
+                current_lines = load_current_lines(event_id, market_id, cycle)
+                if not current_lines.empty:
+                    df = pd.DataFrame({
+                        'Player': current_lines['player_name'],
+                        'Bookie': current_lines['bookie_id'].map(config.BOOKIE_MAP),
+                        'Selection': current_lines['selection'],
+                        'Line': current_lines['line_value'],
+                        'Odds': current_lines['odds'].map(format_odds)
+                    })
                     st.dataframe(df, use_container_width=True)
                     
-                    history = db.get_line_history(event_id, market_id)
+                    # Chart one player at a time
+                    player_name = st.selectbox(
+                        "Player",
+                        options=sorted(current_lines['player_name'].dropna().unique()),
+                        key=f"history_player_{market_id}"
+                    )
+                    history = load_line_history(event_id, market_id, cycle, player_name)
                     if history:
                         fig = plot_line_history(history)
-                        st.plotly_chart(fig, use_container_width=True)
+                        st.plotly_chart(fig, use_container_width=True, key=f"history_chart_{market_id}")
+    
+    with tab3:
+        st.header("Fair Odds")
+        
+        analyzed = load_board_analysis(tuple(events), cycle)
+        if analyzed.empty:
+            st.info("No lines on the board yet")
+        else:
+            market_names = {market_id: name.replace('_', ' ').title()
+                            for name, market_id in config.MARKET_CONFIG['game_lines'].items()}
+            market_names.update(config.MARKET_CONFIG['props'])
+            
+            st.subheader("Book Hold Across the Slate")
+            holds = book_holds(analyzed)
+            holds = holds.assign(
+                bookie=holds['bookie_id'].map(config.BOOKIE_MAP),
+                market=holds['market_id'].map(market_names)
+            ).pivot(index='bookie', columns='market', values='mean')
+            st.dataframe(holds.style.format("{:.2%}"), use_container_width=True)
+            
+            st.subheader(selected_event)
+            lines = analyzed[analyzed['event_id'] == event_id]
+            df = pd.DataFrame({
+                'Market': lines['market_id'].map(market_names),
+                'Player': lines['player_name'],
+                'Bookie': lines['bookie_id'].map(config.BOOKIE_MAP),
+                'Selection': lines['selection'],
+                'Line': lines['line_value'],
+                'Odds': lines['odds'].map(format_odds),
+                'Hold': lines['hold'].map(lambda hold: f"{hold:.2%}" if pd.notna(hold) else ""),
+                'Fair Odds': lines['fair_odds'].map(lambda odds: format_odds(int(odds)) if pd.notna(odds) else "")
+            })
+            st.dataframe(df, use_container_width=True)
+    
+    with tab4:
+        st.header("Season History")
+        
+        if duckdb is None:
+            st.info("Install duckdb to query the line archive")
+        else:
+            markets = {name.replace('_', ' ').title(): market_id
+                       for name, market_id in config.MARKET_CONFIG['game_lines'].items()}
+            markets.update({name: market_id for market_id, name in config.MARKET_CONFIG['props'].items()})
+            market_name = st.selectbox("Market", options=list(markets.keys()), key="archive_market")
+            season = st.number_input("Season", min_value=2000, value=datetime.utcnow().year, step=1)
+            player_name = st.text_input("Player", key="archive_player")
+            
+            history = load_season_history(markets[market_name], int(season), player_name)
+            if history.empty:
+                st.info("No archived lines for this market yet")
+            else:
+                history['bookie'] = history['bookie_id'].map(config.BOOKIE_MAP)
+                history['odds_move'] = history['close_odds'] - history['open_odds']
+                weekly = history.groupby(['week', 'bookie'], as_index=False)['odds_move'].mean()
+                fig = go.Figure()
+                for bookie, rows in weekly.groupby('bookie'):
+                    fig.add_trace(go.Scatter(x=rows['week'], y=rows['odds_move'], mode='lines+markers', name=bookie))
+                fig.update_layout(xaxis_title="Week", yaxis_title="Avg odds move (open to close)")
+                st.plotly_chart(fig, use_container_width=True, key="season_history_chart")
+                st.dataframe(history.drop(columns=['bookie_id', 'odds_move']), use_container_width=True)
     
     # Line Movement Alerts
     st.sidebar.header("Recent Line Movements")
-    movements = line_tracker.check_line_movements(event_id)
+    movements = load_movements(event_id, cycle)
     
     if movements:
         for move in movements:
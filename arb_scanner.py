@@ -0,0 +1,83 @@
+# arb_scanner.py
+import time
+import pandas as pd
+from typing import Dict, List
+from database import Database
+from odds_analytics import analyze_board, best_prices, book_holds, load_board
+
+# Best-priced legs are matched within the same event, market and player
+MATCHUP = ['event_id', 'market_id', 'player_name']
+
+def find_arbitrages(best: pd.DataFrame) -> pd.DataFrame:
+    """Opposing sides of the same line whose best prices sum to < 100% implied.
+
+    Expects one best-priced row per side and line (see best_prices), with a
+    pair_key column. Returns one row per leg with the arbitrage's edge.
+    """
+    legs = best.copy()
+    grouped = legs.groupby(MATCHUP + ['pair_key'], dropna=False)
+    legs['sides'] = grouped['selection'].transform('nunique')
+    legs['total_implied'] = grouped['implied_prob'].transform('sum')
+
+    arbs = legs[(legs['sides'] == 2) & (legs['total_implied'] < 1)].copy()
+    arbs['edge'] = 1 - arbs['total_implied']
+    return arbs.drop(columns=['sides']).sort_values('edge', ascending=False).reset_index(drop=True)
+
+def find_middles(best: pd.DataFrame) -> pd.DataFrame:
+    """Opposing sides at different lines that can both win.
+
+    Totals/props: an Over at a lower line than an Under (O 47.5 / U 48.5).
+    Spreads: two teams whose lines sum above zero (A +3.5 / B -2.5).
+    Returns one row per pair of legs with the middle's width.
+    """
+    columns = MATCHUP + ['selection', 'line_value', 'bookie_id', 'odds', 'implied_prob']
+    best = best[~best['is_moneyline'] & best['line_value'].notna()]
+
+    label = best['selection'].str.lower()
+    overs = best[~best['is_spread'] & label.str.startswith('over')][columns]
+    unders = best[~best['is_spread'] & label.str.startswith('under')][columns]
+    totals = overs.merge(unders, on=MATCHUP, suffixes=('_a', '_b'))
+    totals = totals[totals['line_value_a'] < totals['line_value_b']]
+    totals['width'] = totals['line_value_b'] - totals['line_value_a']
+
+    spreads = best[best['is_spread']]
+    first = spreads['selection'] == spreads.groupby(['event_id', 'market_id'])['selection'].transform('min')
+    pairs = spreads[first][columns].merge(spreads[~first][columns], on=MATCHUP, suffixes=('_a', '_b'))
+    pairs['width'] = pairs['line_value_a'] + pairs['line_value_b']
+    pairs = pairs[pairs['width'] > 0]
+
+    middles = pd.concat([totals, pairs], ignore_index=True)
+    middles['total_implied'] = middles['implied_prob_a'] + middles['implied_prob_b']
+    return middles.sort_values(['width', 'total_implied'], ascending=[False, True]).reset_index(drop=True)
+
+class ArbScanner:
+    """Scans the current board across every book for arbitrages and middles"""
+    def __init__(self, db: Database, bookie_map: Dict, market_config: Dict):
+        self.db = db
+        self.bookie_map = bookie_map
+        self.spread_market_ids = (market_config['game_lines']['spread'],)
+        self.moneyline_market_ids = (market_config['game_lines']['moneyline'],)
+        self.last_scan_seconds = None  # Latency of the most recent scan
+        self.last_scan_lines = 0
+
+    def scan(self, event_ids: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """Scan the current board, returning {'arbitrages': ..., 'middles': ...,
+        'holds': ...}, the last being each book's average hold per market"""
+        start = time.perf_counter()
+
+        board = analyze_board(load_board(self.db, event_ids, self.bookie_map), self.spread_market_ids)
+        board['is_spread'] = board['market_id'].isin(self.spread_market_ids)
+        board['is_moneyline'] = board['market_id'].isin(self.moneyline_market_ids)
+
+        best = best_prices(board)
+        results = {
+            'arbitrages': find_arbitrages(best),
+            'middles': find_middles(best),
+            'holds': book_holds(board)
+        }
+
+        self.last_scan_seconds = time.perf_counter() - start
+        self.last_scan_lines = len(board)
+        print(f"Scanned {len(board)} lines in {self.last_scan_seconds * 1000:.1f}ms: "
+              f"{len(results['arbitrages'])} arbitrage legs, {len(results['middles'])} middles")
+        return results
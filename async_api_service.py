@@ -0,0 +1,161 @@
+# async_api_service.py
+import asyncio
+import random
+import time
+import httpx
+from typing import Dict, List, Any
+from api_service import BaseAPIService, LineBatch
+from metrics import ERRORS, REQUESTS, STAGE_SECONDS
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every request in a polling cycle"""
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request token is available"""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Sleep without the lock so other waiters can refill and check too
+            await asyncio.sleep(wait)
+
+class AsyncAPIService(BaseAPIService):
+    """Async counterpart of APIService built on a pooled httpx client.
+
+    Use as an async context manager so one connection pool is shared by every
+    request in a polling cycle:
+
+        async with AsyncAPIService(...) as api:
+            events = await api.fetch_events()
+    """
+    def __init__(self, base_url: str, headers: Dict, bookie_map: Dict, page_limit: int = 100,
+                 timeout: float = 10, max_concurrency: int = 8, requests_per_second: float = 5,
+                 max_retries: int = 3, backoff_base: float = 0.5, skip_unchanged: bool = True):
+        super().__init__(base_url, headers, bookie_map, page_limit=page_limit, timeout=timeout,
+                         skip_unchanged=skip_unchanged)
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.client = None
+        self._semaphore = None
+        self._rate_limiter = None
+
+    async def __aenter__(self):
+        # Created inside the running loop; asyncio primitives are loop-bound
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_limiter = TokenBucket(self.requests_per_second)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
+        self.client = None
+
+    async def _get(self, path: str, params: Dict) -> Dict:
+        """Conditional GET with concurrency limit, rate limiting and retry with backoff on 429/5xx"""
+        key = self._request_key(path, params)
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._rate_limiter.acquire()
+                try:
+                    response = await self.client.get(
+                        f"{self.base_url}{path}",
+                        params=params,
+                        headers=self._conditional_headers(key)
+                    )
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    REQUESTS.inc(path=path, status=type(e).__name__)
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    print(f"Request to {path} failed ({e}), retrying in {delay:.1f}s")
+                else:
+                    REQUESTS.inc(path=path, status=response.status_code)
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        if response.status_code != 304:
+                            response.raise_for_status()
+                        return self._decode(key, response.status_code, response.headers, response.content)
+                    delay = self._retry_after(response) or self._backoff(attempt)
+                    print(f"Request to {path} returned {response.status_code}, retrying in {delay:.1f}s")
+            # Sleep outside the semaphore so waiting retries don't hold a slot
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter"""
+        return self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+
+    def _retry_after(self, response: httpx.Response) -> float:
+        """Seconds requested by a Retry-After header, if any"""
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    async def fetch_events(self, sport="NFL", week=18, season=2024) -> Dict[str, Any]:
+        """Fetch active events"""
+        params = {
+            "sport": sport,
+            "week": week,
+            "season": season
+        }
+        try:
+            data = await self._get("/events", params)
+            event_info = self._process_events(data.get('events', []))
+            print(f"Fetched {len(event_info)} events.")
+            return event_info
+        except Exception as e:
+            ERRORS.inc(stage='fetch')
+            print(f"Error fetching events: {e}")
+            return {}
+
+    async def fetch_market_odds(self, market_type: str, market_id: int, event_ids: List[str]) -> LineBatch:
+        """Fetch odds for a specific market across one or more events"""
+        if not event_ids:
+            return LineBatch()
+
+        try:
+            # Includes time queued behind the concurrency and rate limits
+            with STAGE_SECONDS.time(stage='fetch', market_id=market_id):
+                offers = await self._fetch_offers(market_id, event_ids)
+            return self._parse_offers(market_type, market_id, offers, event_ids)
+
+        except Exception as e:
+            ERRORS.inc(stage='fetch')
+            print(f"Error fetching market {market_id}: {e}")
+            return LineBatch()
+
+    async def _fetch_offers(self, market_id: int, event_ids: List[str]) -> List[Dict]:
+        """Fetch every page of offers for a market, following pagination"""
+        offers = []
+
+        for page in range(1, self.max_pages + 1):
+            data = await self._get("/offers", self._offer_params(market_id, event_ids, page))
+            page_offers = data.get("offers", [])
+            offers.extend(page_offers)
+            if self._is_last_page(data, page_offers, page):
+                break
+        else:
+            self._report_truncated(market_id, offers)
+
+        return offers
@@ -0,0 +1,80 @@
+# benchmarks/bench_parse.py
+"""Micro-benchmark for the /offers decode + parse path.
+
+    python benchmarks/bench_parse.py                      # synthetic prop payload
+    python benchmarks/bench_parse.py --payload offers.json  # recorded payload
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api_service import APIService, loads
+from config import Config
+
+def synthetic_props_payload(players: int = 400, lines_per_book: int = 2) -> bytes:
+    """A large prop payload shaped like /offers, one offer per player"""
+    offers = []
+    for i in range(players):
+        offers.append({
+            'event_id': 1000 + i % 16,
+            'market_id': 103,
+            'participants': [{'player': {'first_name': 'Player', 'last_name': str(i)}}],
+            'selections': [{
+                'label': label,
+                'books': [{
+                    'id': book_id,
+                    'lines': [{
+                        'active': True,
+                        'replaced': n > 0,
+                        'line': 200.5 + n,
+                        'cost': random.choice([-120, -115, -110, -105, 100])
+                    } for n in range(lines_per_book)]
+                } for book_id in Config.BOOKIE_MAP]
+            } for label in ('Over', 'Under')]
+        })
+    return json.dumps({'offers': offers}).encode()
+
+def bench(label: str, fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<28} {best * 1000:8.2f} ms")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payload', help="Recorded /offers response body (JSON)")
+    parser.add_argument('--players', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.payload:
+        with open(args.payload, 'rb') as f:
+            body = f.read()
+    else:
+        body = synthetic_props_payload(args.players)
+
+    api = APIService(Config.API_BASE_URL, Config.HEADERS, Config.BOOKIE_MAP, skip_unchanged=False)
+    hashing_api = APIService(Config.API_BASE_URL, Config.HEADERS, Config.BOOKIE_MAP)
+    offers = loads(body)['offers']
+    lines = api._process_offers('props', 103, offers)
+    print(f"Payload: {len(body) / 1024:.0f} KiB, {len(offers)} offers, {len(lines)} lines")
+
+    bench("json.loads", lambda: json.loads(body), args.repeat)
+    decode = bench(f"{loads.__module__}.loads", lambda: loads(body), args.repeat)
+    parse = bench("parse to LineRecord", lambda: api._process_offers('props', 103, offers), args.repeat)
+    hashing_api._process_offers('props', 103, offers)
+    bench("hash-skip unchanged offers", lambda: hashing_api._process_offers('props', 103, offers), args.repeat)
+    bench("render display (on demand)", lambda: [line.display for line in lines], args.repeat)
+
+    print(f"Decode + parse: {len(lines) / (decode + parse):,.0f} lines/sec")
+
+if __name__ == "__main__":
+    main()
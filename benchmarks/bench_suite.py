@@ -0,0 +1,227 @@
+# benchmarks/bench_suite.py
+"""End-to-end benchmark of the ingest, storage and query paths.
+
+Grows a database from a synthetic multi-week slate and reports, as JSON:
+parse throughput, save_lines rows/sec, get_line_history / get_current_lines /
+check_line_movements latency at each table-size checkpoint, and one full
+update_markets cycle against the local stand-in API.
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --rows 10000000 --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api_service import APIService
+from config import Config
+from database import Database
+from fetch_planner import FetchPlanner
+from line_tracker import LineTracker
+from scheduler import UpdateScheduler
+from standin_api import SyntheticSlate, make_server
+
+# Metrics where a larger value is better; everything else is a latency
+THROUGHPUT_METRICS = ('lines_per_sec', 'rows_per_sec')
+
+def latency(fn, args_list) -> dict:
+    """Median and p95 latency in ms of fn over each args tuple"""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'samples': len(timings)
+    }
+
+def checkpoints(max_rows: int) -> list:
+    """Table sizes to measure queries at: every power of ten from 10k, then max_rows"""
+    sizes = []
+    size = 10_000
+    while size < max_rows:
+        sizes.append(size)
+        size *= 10
+    return sizes + [max_rows]
+
+def fetch_cycle(api: APIService, slate: SyntheticSlate, markets: list, tick: int, taken_at: datetime) -> list:
+    """Parse one cycle of every market, stamped at a simulated time"""
+    lines = []
+    for market_type, market_id in markets:
+        batch = api._process_offers(market_type, market_id, slate.offers(market_id, tick))
+        lines.extend(line._replace(timestamp=taken_at) for line in batch)
+    return lines
+
+def bench_queries(db: Database, tracker: LineTracker, event_ids: list, market_ids: list, samples: int) -> dict:
+    rng = random.Random(0)
+    pairs = [(rng.choice(event_ids), rng.choice(market_ids)) for _ in range(samples)]
+
+    def uncached_current_lines(event_id, market_id):
+        db.board_cache.evict_event(event_id)
+        return db.get_current_lines(event_id, market_id)
+
+    return {
+        'get_line_history': latency(db.get_line_history, pairs),
+        'get_current_lines': latency(uncached_current_lines, pairs),
+        'check_line_movements': latency(tracker.check_line_movements, [(event_id,) for event_id, _ in pairs])
+    }
+
+def bench_update_cycle(db: Database, slate: SyntheticSlate) -> dict:
+    """One full update_markets cycle against a stand-in server on a free port"""
+    server = make_server(slate, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        api = APIService(f"http://{host}:{port}", Config.HEADERS, Config.BOOKIE_MAP,
+                         page_limit=Config.OFFERS_PAGE_LIMIT)
+        scheduler = UpdateScheduler(api, db, LineTracker(db))
+        start = time.perf_counter()
+        scheduler.update_markets()
+        return {'seconds': round(time.perf_counter() - start, 3)}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def run(args) -> dict:
+    slate = SyntheticSlate(events=16 * args.weeks, players=args.players, drift=args.drift, seed=args.seed)
+    api = APIService(Config.API_BASE_URL, Config.HEADERS, Config.BOOKIE_MAP, skip_unchanged=False)
+    markets = FetchPlanner(api, Config.MARKET_CONFIG).markets()
+    event_ids = [str(event['id']) for event in slate.events()]
+    market_ids = [market_id for _, market_id in markets]
+
+    # Parse throughput on one cycle of the whole slate
+    start = time.perf_counter()
+    parsed = sum(len(api._process_offers(market_type, market_id, slate.offers(market_id, 0)))
+                 for market_type, market_id in markets)
+    parse_seconds = time.perf_counter() - start
+    results = {'parse': {'lines': parsed, 'seconds': round(parse_seconds, 3),
+                         'lines_per_sec': round(parsed / parse_seconds)}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(f"sqlite:///{os.path.join(tmp, 'bench.db')}", storage_mode=args.storage_mode)
+        tracker = LineTracker(db)
+        db.save_events(list(api._process_events(slate.events()).values()))
+
+        # Spread cycles evenly over the simulated weeks, ending now. In
+        # 'changes' mode rows only grow with drift, so growth is capped.
+        cycles = max(1, -(-args.rows // parsed))
+        max_cycles = cycles if args.storage_mode == 'full' else cycles * 20
+        end = datetime.utcnow()
+        step = timedelta(weeks=args.weeks) / max_cycles
+        rows = 0
+        save_seconds = 0.0
+        results['queries'] = []
+        pending = checkpoints(args.rows)
+        tick = 0
+        while pending:
+            tick += 1
+            lines = fetch_cycle(api, slate, markets, tick, end - step * (max_cycles - tick))
+            start = time.perf_counter()
+            db.save_lines(lines)
+            save_seconds += time.perf_counter() - start
+            with db.engine.connect() as conn:
+                rows = conn.exec_driver_sql("SELECT COUNT(*) FROM betting_lines").scalar()
+            while pending and (rows >= pending[0] or tick >= max_cycles):
+                results['queries'].append({
+                    'checkpoint': pending.pop(0),
+                    'rows': rows,
+                    **bench_queries(db, tracker, event_ids, market_ids, args.samples)
+                })
+                print(f"{rows:,} rows: {results['queries'][-1]}", file=sys.stderr)
+
+        results['save_lines'] = {'rows': tick * parsed, 'seconds': round(save_seconds, 3),
+                                 'rows_per_sec': round(tick * parsed / save_seconds)}
+        results['update_markets'] = bench_update_cycle(db, slate)
+        db.engine.dispose()
+    return results
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    """Flatten results to {'queries.1000000.get_line_history.median_ms': value} for comparison"""
+    flat = {}
+    if isinstance(results, list):
+        results = {str(item['checkpoint']): item for item in results}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, (dict, list)):
+            flat.update(flatten(value, f"{name}."))
+        elif key not in ('checkpoint', 'rows', 'lines', 'samples'):
+            flat[name] = value
+    return flat
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Print metrics that moved more than `threshold` against a baseline run"""
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    print(f"Compared with {baseline.get('commit', 'baseline')}:", file=sys.stderr)
+    for name in sorted(now.keys() & before.keys()):
+        if not before[name]:
+            continue
+        change = now[name] / before[name] - 1
+        if abs(change) < threshold:
+            continue
+        better = change > 0 if name.rsplit('.', 1)[-1] in THROUGHPUT_METRICS else change < 0
+        print(f"  {'faster' if better else 'SLOWER'} {name}: {before[name]} -> {now[name]} ({change:+.0%})",
+              file=sys.stderr)
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Grow betting_lines to this many rows")
+    parser.add_argument('--weeks', type=int, default=4, help="Weeks of 16 events in the slate")
+    parser.add_argument('--players', type=int, default=8, help="Players per event and prop market")
+    parser.add_argument('--drift', type=float, default=0.05, help="Chance each price moves per cycle")
+    parser.add_argument('--storage-mode', choices=Database.STORAGE_MODES, default='full')
+    parser.add_argument('--samples', type=int, default=50, help="Queries timed per checkpoint")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write JSON results here instead of stdout")
+    parser.add_argument('--compare', help="Baseline JSON to report regressions against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Relative change worth reporting")
+    args = parser.parse_args()
+
+    # The code under test prints progress; keep stdout for the JSON report
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run(args)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f), args.threshold)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
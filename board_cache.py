@@ -0,0 +1,104 @@
+# board_cache.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class BoardLine(NamedTuple):
+    """A line on the current board"""
+    event_id: str
+    market_id: int
+    market_type: str
+    bookie_id: int
+    player_name: Optional[str]
+    selection: str
+    line_value: Optional[float]
+    odds: int
+    timestamp: datetime
+    snapshot_id: int
+
+    @property
+    def key(self) -> Tuple:
+        return (self.event_id, self.market_id, self.bookie_id, self.selection, self.player_name)
+
+def best_odds(lines: List[BoardLine]) -> Dict:
+    """Get best available odds for each (player, selection, line).
+
+    Props for different players, and alternate lines of one selection, are
+    separate outcomes, so their odds are never compared with each other.
+    """
+    best = {}
+    for line in lines:
+        outcome = (line.player_name, line.selection, line.line_value)
+        if outcome not in best or line.odds > best[outcome]['odds']:
+            best[outcome] = {
+                'bookie_id': line.bookie_id,
+                'odds': line.odds,
+                'line_value': line.line_value
+            }
+    return best
+
+class BoardCache:
+    """Process-level cache of the latest board for each event and market.
+
+    The ingest path writes boards as they are saved; those entries never
+    expire. Boards loaded from the database on a cache miss expire after
+    `ttl` seconds, since another process may be writing newer snapshots.
+    Events are kept in LRU order and the least recently used are evicted
+    beyond `max_events`.
+    """
+    def __init__(self, max_events: int = 64, ttl: float = 60):
+        self.max_events = max_events
+        self.ttl = ttl
+        self._events = OrderedDict()  # event_id -> {market_id: board}
+        self._lock = threading.Lock()
+
+    def set_board(self, event_id: str, market_id: int, lines: List[BoardLine], from_db: bool = False):
+        """Replace a market's board"""
+        board = {
+            'lines': {line.key: line for line in lines},
+            'best_odds': best_odds(lines),
+            'expires': time.monotonic() + self.ttl if from_db else None
+        }
+        with self._lock:
+            markets = self._events.setdefault(event_id, {})
+            markets[market_id] = board
+            self._events.move_to_end(event_id)
+            while len(self._events) > self.max_events:
+                self._events.popitem(last=False)
+
+    def _get_board(self, event_id: str, market_id: int) -> Optional[Dict]:
+        with self._lock:
+            markets = self._events.get(event_id)
+            board = markets.get(market_id) if markets else None
+            if board is None:
+                return None
+            if board['expires'] is not None and board['expires'] < time.monotonic():
+                del markets[market_id]
+                return None
+            self._events.move_to_end(event_id)
+            return board
+
+    def get_lines(self, event_id: str, market_id: int) -> Optional[List[BoardLine]]:
+        """Current lines for a market, or None on a cache miss"""
+        board = self._get_board(event_id, market_id)
+        return list(board['lines'].values()) if board else None
+
+    def get_line(self, event_id: str, market_id: int, bookie_id: int, selection: str,
+                 player_name: str = None) -> Optional[BoardLine]:
+        """A single current line, or None if it isn't cached"""
+        board = self._get_board(event_id, market_id)
+        if not board:
+            return None
+        return board['lines'].get((event_id, market_id, bookie_id, selection, player_name))
+
+    def get_best_odds(self, event_id: str, market_id: int) -> Optional[Dict]:
+        """Best odds per (player, selection, line) for a market, or None on a cache miss"""
+        board = self._get_board(event_id, market_id)
+        return dict(board['best_odds']) if board else None
+
+    def evict_event(self, event_id: str):
+        """Drop every board for an event, e.g. once it has finished"""
+        with self._lock:
+            self._events.pop(event_id, None)
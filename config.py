@@ -1,6 +1,9 @@
 # config.py
+import os
+
 class Config:
-    API_BASE_URL = "https://api.bettingpros.com/v3"
+    # Set BETTING_API_BASE_URL to point at a stand-in server (see standin_api.py)
+    API_BASE_URL = os.environ.get("BETTING_API_BASE_URL", "https://api.bettingpros.com/v3")
     API_KEY = "CHi8Hy5CEE4khd46XNYL23dCFX96oUdw6qOt1Dnh"
     
     HEADERS = {
@@ -38,3 +41,61 @@ class Config:
             253: "Fantasy Points",
         }
     }
+    
+    # Offer fetching
+    OFFERS_PAGE_LIMIT = 100         # Max offers returned per /offers page
+    MAX_EVENTS_PER_REQUEST = 16     # Event IDs joined into a single /offers request
+    SKIP_UNCHANGED_OFFERS = True    # ETags and per-book hashes skip unchanged payloads
+    
+    # Storage
+    DATABASE_URL = os.environ.get("BETTING_DATABASE_URL", "sqlite:///betting_lines.db")
+    LINE_STORAGE_MODE = "changes"   # 'full' writes every line each poll; 'changes' only writes moves
+    SQLITE_WAL = True               # WAL journal, tuned pragmas and a separate read-only pool
+    SQLITE_BUSY_TIMEOUT = 5         # Seconds to wait on a locked database before failing
+    SQLITE_CHECKPOINT_SECONDS = 300 # Passive WAL checkpoint interval
+    
+    # Adaptive polling: (hours to kickoff, poll interval in seconds), first match wins
+    ADAPTIVE_POLL_TIERS = [(1, 30), (6, 120), (24, 300), (72, 900)]
+    ADAPTIVE_POLL_MAX_INTERVAL = 3600   # Games further out than every tier
+    ADAPTIVE_POLL_MIN_INTERVAL = 30     # Floor after volatility speed-ups
+    EVENT_REFRESH_SECONDS = 600         # How often the event list is re-fetched
+    
+    # Dashboard cache TTLs (seconds)
+    DASHBOARD_EVENTS_TTL = 300
+    DASHBOARD_DATA_TTL = 60
+    DASHBOARD_HISTORY_HOURS = 24    # Line history chart window
+    DASHBOARD_HISTORY_POINTS = 300  # Max buckets per series on a chart
+    
+    # HTTP client
+    REQUEST_TIMEOUT = 10            # Seconds per request
+    MAX_CONCURRENT_REQUESTS = 8     # Concurrent requests in an async polling cycle
+    REQUESTS_PER_SECOND = 5         # Token-bucket rate limit budget
+    MAX_RETRIES = 3                 # Retries on 429/5xx and transport errors
+    
+    # Instrumentation
+    METRICS_PORT = 9108             # Prometheus /metrics endpoint; None disables it
+    PROFILE_EVERY_N_CYCLES = 0      # Dump a cProfile of every Nth cycle; 0 disables it
+    PROFILE_DIR = "profiles"
+    
+    # Sharded ingest
+    INGEST_WORKERS = 0              # Processes for fetch+parse (fixed scheduler only); 0 keeps ingest in-process
+    INGEST_SHARD_BY = "market"      # Pin shards to workers by 'market' or 'event'
+    WRITE_QUEUE_SIZE = 64           # Parsed batches buffered ahead of the single DB writer
+
+    # Archive
+    ARCHIVE_DIR = "archive"         # Parquet partitions of finished events' lines
+    ARCHIVE_AFTER_HOURS = 12        # Events this long past kickoff are archived even if not marked finished
+    ARCHIVE_RETENTION_DAYS = 14     # Raw rows of archived events older than this are dropped from the DB; None keeps them
+    ARCHIVE_INTERVAL_SECONDS = 3600  # How often the scheduler exports and compacts
+
+    # Movement stream
+    MOVEMENT_STREAM_PORT = 9109     # SSE /movements endpoint; None disables it
+    MOVEMENT_QUEUE_SIZE = 1000      # Movements buffered per subscriber before the oldest are dropped
+    MOVEMENT_HISTORY = 100          # Recent movements kept for late subscribers and resumes
+
+    # Service
+    SEASON = 2024                   # Season and weeks of events to poll
+    WEEKS = (18,)
+    SCHEDULER = "adaptive"          # 'adaptive' per-market clocks, or 'fixed' every POLL_INTERVAL_MINUTES
+    POLL_INTERVAL_MINUTES = 5
+    SHUTDOWN_TIMEOUT = 60           # Seconds to wait for the cycle in flight to drain on SIGTERM
\ No newline at end of file
@@ -1,12 +1,37 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, inspect, insert, select, update, bindparam, text, func, cast, case, extract, Column, Integer, String, Float, DateTime, ForeignKey, Index
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
+from sqlalchemy.orm import sessionmaker, relationship, synonym
+from datetime import datetime, timedelta, timezone
 import os
+import time
+from urllib.parse import quote
+from board_cache import BoardCache, BoardLine
+from dimension_cache import DimensionCache
 
 Base = declarative_base()
 
+FINISHED_STATUSES = ('complete', 'closed')
+
+# Indexes older versions created that no query uses since lines became
+# snapshot ranges; they only slowed inserts
+RETIRED_INDEXES = (
+    'ix_betting_lines_event_market_timestamp',
+    'ix_betting_lines_event_market_book_selection_timestamp',
+)
+# Names older versions stored on every line; the dimension tables hold them now
+RETIRED_COLUMNS = {'betting_lines': ('market_type', 'player_name', 'selection')}
+
+# Applied to every connection in WAL mode
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',    # Durable with WAL except for the last commits on power loss
+    'cache_size': -65536,       # 64 MiB page cache per connection
+    'mmap_size': 268435456,     # 256 MiB of memory-mapped reads
+    'temp_store': 'MEMORY'
+}
+
 class Event(Base):
     __tablename__ = 'events'
     
@@ -16,106 +41,943 @@ class Event(Base):
     away_team = Column(String)
     start_time = Column(DateTime)
     status = Column(String)
+    season = Column(Integer, nullable=True)  # Archive partitioning; derived from start_time if missing
+    week = Column(Integer, nullable=True)
     lines = relationship("BettingLine", back_populates="event")
 
-class BettingLine(Base):
-    __tablename__ = 'betting_lines'
+class Snapshot(Base):
+    """One fetch (poll cycle) of a market for an event"""
+    __tablename__ = 'snapshots'
     
     id = Column(Integer, primary_key=True)
     event_id = Column(String, ForeignKey('events.event_id'))
     market_id = Column(Integer)
+    taken_at = Column(DateTime, default=datetime.utcnow)
+    line_count = Column(Integer)
+    
+    __table_args__ = (
+        Index('ix_snapshots_event_market_taken', 'event_id', 'market_id', 'taken_at'),
+    )
+
+class Player(Base):
+    """A prop player, keyed by upstream participant ID when the API sends one"""
+    __tablename__ = 'players'
+    
+    id = Column(Integer, primary_key=True)
+    upstream_id = Column(String, unique=True, nullable=True)
+    name = Column(String, index=True)
+
+class Market(Base):
+    """A market, keyed by its upstream market ID"""
+    __tablename__ = 'markets'
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
     market_type = Column(String)  # 'game_lines' or 'props'
+    name = Column(String, nullable=True)
+
+class Bookie(Base):
+    __tablename__ = 'bookies'
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=True)
+
+class Selection(Base):
+    """A selection label: Over, Under or a team name"""
+    __tablename__ = 'selections'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True)
+
+class BettingLine(Base):
+    __tablename__ = 'betting_lines'
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, ForeignKey('events.event_id'))
+    market_id = Column(Integer)  # Market type and name are in markets
     bookie_id = Column(Integer)
-    player_name = Column(String, nullable=True)  # For props
-    selection = Column(String)
     line_value = Column(Float)
     odds = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    snapshot_id = Column(Integer, ForeignKey('snapshots.id'))
+    # In 'changes' storage mode a row covers every snapshot from snapshot_id to
+    # last_snapshot_id in which the price was unchanged; in 'full' mode they match
+    last_snapshot_id = Column(Integer)
+    last_seen = Column(DateTime)
+    first_seen = synonym('timestamp')
+    # Integer keys into the dimension tables, which hold the names; market_id
+    # and bookie_id are keys already
+    player_key = Column(Integer, ForeignKey('players.id'), nullable=True)  # For props
+    selection_key = Column(Integer, ForeignKey('selections.id'))
     
     event = relationship("Event", back_populates="lines")
+    
+    __table_args__ = (
+        # Board and history lookups: rows still live at or after a given snapshot
+        Index('ix_betting_lines_event_market_last_snapshot', 'event_id', 'market_id', 'last_snapshot_id'),
+        # Player lookups: a player's lines across events, per market and time window
+        Index('ix_betting_lines_player_market_last_seen', 'player_key', 'market_id', 'last_seen'),
+    )
+
+class LineMovement(Base):
+    """A significant move in a line, persisted when it is detected"""
+    __tablename__ = 'line_movements'
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, ForeignKey('events.event_id'))
+    market_id = Column(Integer)
+    bookie_id = Column(Integer)
+    player_name = Column(String, nullable=True)
+    selection = Column(String)
+    previous_odds = Column(Integer)
+    current_odds = Column(Integer)
+    odds_movement = Column(Integer)
+    abs_odds_movement = Column(Integer)  # Magnitude, so ordering by it can use an index
+    previous_line = Column(Float, nullable=True)
+    current_line = Column(Float, nullable=True)
+    line_movement = Column(Float)
+    detected_at = Column(DateTime)  # Fetch time of the line that moved
+    snapshot_id = Column(Integer, ForeignKey('snapshots.id'))  # Snapshot the new price landed in
+    
+    __table_args__ = (
+        # Recency, overall and within each filter
+        Index('ix_line_movements_detected_at', 'detected_at'),
+        Index('ix_line_movements_event_market_detected_at', 'event_id', 'market_id', 'detected_at'),
+        Index('ix_line_movements_bookie_detected_at', 'bookie_id', 'detected_at'),
+        Index('ix_line_movements_player_detected_at', 'player_name', 'detected_at'),
+        # Biggest moves, overall and per event
+        Index('ix_line_movements_magnitude', 'abs_odds_movement'),
+        Index('ix_line_movements_event_magnitude', 'event_id', 'abs_odds_movement'),
+    )
+
+class ArchivedEvent(Base):
+    """Watermark for the Parquet archive: an event whose lines have been exported"""
+    __tablename__ = 'archived_events'
+    
+    event_id = Column(String, ForeignKey('events.event_id'), primary_key=True)
+    season = Column(Integer)
+    week = Column(Integer)
+    row_count = Column(Integer)
+    archived_at = Column(DateTime)
+    last_snapshot_id = Column(Integer, nullable=True)  # Newest snapshot exported; newer ones are re-exported
+    compacted_at = Column(DateTime, nullable=True)  # Raw rows deleted from SQLite
 
 class Database:
-    def __init__(self, database_url="sqlite:///betting_lines.db"):
+    STORAGE_MODES = ('full', 'changes')
+    MOVEMENT_ORDERS = ('recent', 'magnitude')
+    LINE_COLUMNS = ('event_id', 'market_id', 'market_type', 'bookie_id', 'player_name',
+                    'selection', 'line_value', 'odds', 'player_key', 'selection_key')
+    NAME_COLUMNS = ('market_type', 'player_name', 'selection')  # Carried on line rows, stored by key
+    LINE_NAMES = (Market.market_type, Player.name.label('player_name'), Selection.name.label('selection'))
+    
+    def __init__(self, database_url="sqlite:///betting_lines.db", storage_mode="full", board_cache=None,
+                 wal=False, busy_timeout=5.0, checkpoint_interval=300, read_pool_size=5, dimension_cache=None):
+        """With `wal`, a file-backed SQLite database is opened in WAL mode with
+        tuned pragmas and a busy timeout, and queries go through a separate
+        read-only connection pool, so readers never block the writer (or the
+        other way round). The writer runs a passive WAL checkpoint at most
+        every `checkpoint_interval` seconds."""
+        if storage_mode not in self.STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        self.storage_mode = storage_mode  # 'changes' only writes rows when a price moves
+        self.board_cache = board_cache or BoardCache()  # Latest boards, updated as lines are saved
+        self.dimensions = dimension_cache or DimensionCache()  # Player/selection/market/book keys seen so far
         self.engine = create_engine(database_url)
+        self.wal = wal and self.engine.dialect.name == 'sqlite' and self.engine.url.database not in (None, '', ':memory:')
+        if self.wal:
+            self._tune_sqlite(self.engine, busy_timeout)
         self.SessionLocal = sessionmaker(bind=self.engine)
         Base.metadata.create_all(self.engine)
+        self._migrate()
+        
+        # Queries use the read engine; it is the writer itself unless in WAL mode
+        if self.wal:
+            path = os.path.abspath(self.engine.url.database)
+            # Built as a URL object: a URL string's path would be unquoted again before SQLite parses it
+            read_url = URL.create('sqlite', database=f"file:{quote(path)}", query={'mode': 'ro', 'uri': 'true'})
+            self.read_engine = create_engine(read_url, pool_size=read_pool_size)
+            self._tune_sqlite(self.read_engine, busy_timeout, read_only=True)
+        else:
+            self.read_engine = self.engine
+        self.ReadSession = sessionmaker(bind=self.read_engine)
+        self.checkpoint_interval = checkpoint_interval
+        self._next_checkpoint = time.monotonic() + checkpoint_interval
         
         # Make models available to other classes
         self.Event = Event
+        self.Snapshot = Snapshot
         self.BettingLine = BettingLine
+        self.ArchivedEvent = ArchivedEvent
+        self.LineMovement = LineMovement
+        self.Player = Player
+        self.Market = Market
+        self.Bookie = Bookie
+        self.Selection = Selection
+    
+    def _tune_sqlite(self, engine, busy_timeout, read_only=False):
+        """Set WAL mode and pragmas on each new connection"""
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if not read_only:
+                cursor.execute("PRAGMA journal_mode=WAL")  # Persists in the file; readers inherit it
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=1")
+            cursor.close()
+    
+    def checkpoint(self, mode='PASSIVE'):
+        """Copy WAL frames back into the database file.
+        
+        PASSIVE never waits on readers; TRUNCATE also resets the WAL file but
+        waits for readers to finish. Returns (busy, wal_frames, checkpointed).
+        """
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+        with self.engine.connect() as conn:
+            return tuple(conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").first())
+    
+    def _migrate(self):
+        """Bring a database created by an older version up to the current schema"""
+        inspector = inspect(self.engine)
+        added = set()
+        retired = []
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                # create_all() skips existing tables, so add any new columns...
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                retired.extend((table.name, name) for name in RETIRED_COLUMNS.get(table.name, ()) if name in existing)
+                for column in table.columns:
+                    if column.name not in existing:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                        added.add((table.name, column.name))
+                
+                # ...and any new indexes
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+            for name in RETIRED_INDEXES:
+                conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+            
+            if ('betting_lines', 'last_snapshot_id') in added:
+                self._backfill_snapshots(conn)
+            if ('betting_lines', 'player_key') in added:
+                self._backfill_dimensions(conn)
+            # Only once the backfills have read them
+            for table_name, name in retired:
+                conn.execute(text(f'ALTER TABLE {table_name} DROP COLUMN {name}'))
+    
+    def _backfill_snapshots(self, conn):
+        """Give rows written before snapshots and run-length storage a snapshot range"""
+        conn.execute(text("""
+            INSERT INTO snapshots (event_id, market_id, taken_at, line_count)
+            SELECT event_id, market_id, timestamp, COUNT(*) FROM betting_lines
+            WHERE snapshot_id IS NULL
+            GROUP BY event_id, market_id, timestamp
+        """))
+        conn.execute(text("""
+            UPDATE betting_lines SET snapshot_id = (
+                SELECT s.id FROM snapshots s
+                WHERE s.event_id = betting_lines.event_id
+                  AND s.market_id = betting_lines.market_id
+                  AND s.taken_at = betting_lines.timestamp
+            )
+            WHERE snapshot_id IS NULL
+        """))
+        conn.execute(text("""
+            UPDATE betting_lines SET last_snapshot_id = snapshot_id, last_seen = timestamp
+            WHERE last_snapshot_id IS NULL
+        """))
         
+    def _backfill_dimensions(self, conn):
+        """Build the dimension tables from rows written before them. Old rows
+        carry no upstream player IDs, so their players are keyed by name."""
+        conn.execute(text("""
+            INSERT INTO players (name)
+            SELECT DISTINCT player_name FROM betting_lines WHERE player_name IS NOT NULL
+        """))
+        conn.execute(text("""
+            INSERT INTO selections (name)
+            SELECT DISTINCT selection FROM betting_lines WHERE selection IS NOT NULL
+        """))
+        conn.execute(text("""
+            INSERT INTO markets (id, market_type)
+            SELECT market_id, MIN(market_type) FROM betting_lines GROUP BY market_id
+        """))
+        conn.execute(text("INSERT INTO bookies (id) SELECT DISTINCT bookie_id FROM betting_lines"))
+        conn.execute(text("""
+            UPDATE betting_lines SET
+                player_key = (SELECT p.id FROM players p
+                              WHERE p.name = betting_lines.player_name AND p.upstream_id IS NULL),
+                selection_key = (SELECT s.id FROM selections s WHERE s.name = betting_lines.selection)
+        """))
+    
+    def sync_reference_data(self, market_config, bookie_map):
+        """Upsert market and book names from the app config"""
+        markets = [{'id': market_id, 'market_type': 'game_lines', 'name': name}
+                   for name, market_id in market_config['game_lines'].items()]
+        markets.extend({'id': market_id, 'market_type': 'props', 'name': name}
+                       for market_id, name in market_config['props'].items())
+        bookies = [{'id': bookie_id, 'name': name} for bookie_id, name in bookie_map.items()]
+        
+        with self.engine.begin() as conn:
+            for table, rows, columns in ((Market.__table__, markets, ('market_type', 'name')),
+                                         (Bookie.__table__, bookies, ('name',))):
+                stmt = self._upsert(table).values(rows)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=['id'],
+                    set_={column: stmt.excluded[column] for column in columns}
+                ))
+        self.dimensions.update(markets=[row['id'] for row in markets], bookies=[row['id'] for row in bookies])
+    
     def save_event(self, event_data):
         """Save or update event information"""
-        with self.SessionLocal() as session:
-            existing = session.query(Event).filter_by(
-                event_id=event_data['event_id']
-            ).first()
+        self.save_events([event_data])
+    
+    def save_events(self, events):
+        """Upsert a batch of events in a single INSERT ... ON CONFLICT statement"""
+        rows = [{
+            'event_id': event_data['event_id'],
+            'home_team': event_data['home'],
+            'away_team': event_data['away'],
+            'start_time': datetime.fromisoformat(event_data['scheduled'].replace('Z', '+00:00')),
+            'status': event_data['status'],
+            'season': event_data.get('season'),
+            'week': event_data.get('week')
+        } for event_data in events]
+        if not rows:
+            return
+        
+        stmt = self._upsert(Event.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['event_id'],
+            set_={
+                'home_team': stmt.excluded.home_team,
+                'away_team': stmt.excluded.away_team,
+                'start_time': stmt.excluded.start_time,
+                'status': stmt.excluded.status,
+                'season': stmt.excluded.season,
+                'week': stmt.excluded.week
+            }
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+        
+        for row in rows:
+            if row['status'] in FINISHED_STATUSES:
+                self.board_cache.evict_event(row['event_id'])
+    
+    def _upsert(self, table):
+        """Dialect-specific INSERT supporting ON CONFLICT"""
+        if self.engine.dialect.name == 'postgresql':
+            return postgresql.insert(table)
+        return sqlite.insert(table)
+    
+    def _epoch_seconds(self, column):
+        """Dialect-specific whole Unix seconds of a naive UTC timestamp column"""
+        if self.engine.dialect.name == 'postgresql':
+            return cast(func.floor(extract('epoch', column)), Integer)
+        return cast(func.strftime('%s', column), Integer)
+    
+    def save_lines(self, lines, unchanged=None, movements=None):
+        """Save betting lines in one transaction using Core executemany statements.
+        
+        Each (event, market) in the batch gets its own snapshot. In 'full'
+        storage mode every line is inserted; in 'changes' mode lines whose
+        price matches the current board just extend the existing row.
+        
+        `unchanged` lists (event, market, player, book) offers the API skipped
+        because their payload hasn't changed; their current rows are carried
+        into the new snapshot as if they had been fetched again.
+        
+        `movements` detected in this batch are stored in the same transaction,
+        tagged with the snapshot their new price landed in.
+        """
+        rows = [{
+            'event_id': line.event_id,
+            'market_id': line.market_id,
+            'market_type': line.market_type,
+            'bookie_id': line.bookie_id,
+            'player_name': line.player_name,
+            'selection': line.selection,
+            'line_value': line.line_value,
+            'odds': line.odds,
+            'timestamp': line.timestamp
+        } for line in lines]
+        if not rows and not unchanged:
+            return 0
+        
+        groups = {}
+        snapshot_ids = {}
+        for row in rows:
+            group = groups.setdefault((row['event_id'], row['market_id']), {'rows': [], 'unchanged': set()})
+            group['rows'].append(row)
+            group.setdefault('taken_at', row['timestamp'])
+        for offer in unchanged or []:
+            group = groups.setdefault((offer.event_id, offer.market_id), {'rows': [], 'unchanged': set()})
+            group['unchanged'].add((offer.bookie_id, offer.player_name))
+            group.setdefault('taken_at', offer.timestamp)
+        
+        start = time.perf_counter()
+        new_rows = []
+        extended = []
+        carried = 0
+        boards = {}
+        with self.engine.begin() as conn:
+            added = self._resolve_dimensions(conn, lines, rows)
+            for (event_id, market_id), group in groups.items():
+                taken_at = group['taken_at']
+                if self.storage_mode == 'changes' or group['unchanged']:
+                    current = self._current_rows(conn, event_id, market_id)
+                else:
+                    current = []
+                
+                # Split the current board into rows carried over untouched and
+                # rows the fetched lines are diffed against
+                kept = [row for row in current if (row['bookie_id'], row['player_name']) in group['unchanged']]
+                previous = {}
+                if self.storage_mode == 'changes':
+                    for row in current:
+                        if (row['bookie_id'], row['player_name']) not in group['unchanged']:
+                            previous.setdefault(self._price_key(row), []).append(
+                                (row['id'], row['timestamp'], row['snapshot_id'])
+                            )
+                
+                result = conn.execute(insert(Snapshot.__table__).values(
+                    event_id=event_id,
+                    market_id=market_id,
+                    taken_at=taken_at,
+                    line_count=len(group['rows']) + len(kept)
+                ))
+                snapshot_id = snapshot_ids[(event_id, market_id)] = result.inserted_primary_key[0]
+                
+                board = boards[(event_id, market_id)] = []
+                for row in kept:
+                    if self.storage_mode == 'changes':
+                        extended.append({'row_id': row['id'], 'seen_snapshot_id': snapshot_id, 'seen_at': taken_at})
+                        board.append(self._board_line(row))
+                    else:
+                        row = {column: row[column] for column in self.LINE_COLUMNS}
+                        row.update(timestamp=taken_at, snapshot_id=snapshot_id, last_snapshot_id=snapshot_id,
+                                   last_seen=taken_at)
+                        new_rows.append(row)
+                        board.append(self._board_line(row))
+                carried += len(kept)
+                
+                for row in group['rows']:
+                    row_ids = previous.get(self._price_key(row))
+                    if row_ids:
+                        row_id, first_seen, first_snapshot_id = row_ids.pop()
+                        extended.append({'row_id': row_id, 'seen_snapshot_id': snapshot_id, 'seen_at': taken_at})
+                        board.append(self._board_line(row, timestamp=first_seen, snapshot_id=first_snapshot_id))
+                    else:
+                        row.update(snapshot_id=snapshot_id, last_snapshot_id=snapshot_id, last_seen=row['timestamp'])
+                        new_rows.append(row)
+                        board.append(self._board_line(row))
             
-            if existing:
-                existing.home_team = event_data['home']
-                existing.away_team = event_data['away']
-                existing.start_time = datetime.fromisoformat(event_data['scheduled'].replace('Z', '+00:00'))
-                existing.status = event_data['status']
-            else:
-                event = Event(
-                    event_id=event_data['event_id'],
-                    home_team=event_data['home'],
-                    away_team=event_data['away'],
-                    start_time=datetime.fromisoformat(event_data['scheduled'].replace('Z', '+00:00')),
-                    status=event_data['status']
+            if new_rows:
+                conn.execute(insert(BettingLine.__table__), [
+                    {column: value for column, value in row.items() if column not in self.NAME_COLUMNS}
+                    for row in new_rows
+                ])
+            if extended:
+                table = BettingLine.__table__
+                conn.execute(
+                    update(table).where(table.c.id == bindparam('row_id')).values(
+                        last_snapshot_id=bindparam('seen_snapshot_id'),
+                        last_seen=bindparam('seen_at')
+                    ),
+                    extended
                 )
-                session.add(event)
-            
-            session.commit()
-    
-    def save_lines(self, lines):
-        """Save betting lines to database"""
-        with self.SessionLocal() as session:
-            for line_data in lines:
-                line = BettingLine(
-                    event_id=line_data['event_id'],
-                    market_id=line_data['market_id'],
-                    market_type=line_data.get('market_type', 'game_lines'),
-                    bookie_id=line_data['bookie_id'],
-                    player_name=line_data.get('player_name'),
-                    selection=line_data['selection'],
-                    line_value=line_data['line_value'],
-                    odds=line_data['odds'],
-                    timestamp=datetime.fromisoformat(line_data['timestamp'])
+            if movements:
+                self._insert_movements(conn, movements, snapshot_ids)
+        elapsed = time.perf_counter() - start
+        self.dimensions.update(**added)
+        
+        for (event_id, market_id), board in boards.items():
+            self.board_cache.set_board(event_id, market_id, board)
+        if self.wal and time.monotonic() >= self._next_checkpoint:
+            self.checkpoint()
+        
+        total = len(rows) + carried
+        print(f"Saved {total} lines ({len(new_rows)} inserted, {len(extended)} unchanged, "
+              f"{carried} carried from unchanged offers) in {elapsed:.3f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec)")
+        return total
+    
+    def _resolve_dimensions(self, conn, lines, rows):
+        """Set player_key and selection_key on each line's row.
+        
+        Keys come from the dimension cache; only values it hasn't seen are
+        looked up, and inserted if new, with markets and books likewise.
+        Returns what was resolved from the database, for the cache once the
+        transaction has committed.
+        """
+        cache = self.dimensions
+        player_keys = {}     # (upstream ID, name) -> key, for this batch
+        selection_keys = {}
+        missing_players = {}
+        markets = {}
+        bookies = {}
+        for line in lines:
+            player = (line.player_id, line.player_name)
+            if line.player_name is not None and player not in player_keys:
+                player_keys[player] = cache.get_player(*player)
+            if line.selection not in selection_keys:
+                selection_keys[line.selection] = cache.get_selection(line.selection)
+            if not cache.has_market(line.market_id):
+                markets[line.market_id] = {'id': line.market_id, 'market_type': line.market_type}
+            if not cache.has_bookie(line.bookie_id):
+                bookies[line.bookie_id] = {'id': line.bookie_id, 'name': line.bookie}
+        for player, key in player_keys.items():
+            if key is None:
+                missing_players[DimensionCache.player_natural_key(*player)] = player
+        
+        added = {'players': {}, 'selections': {}, 'markets': list(markets), 'bookies': list(bookies)}
+        if missing_players:
+            table = Player.__table__
+            by_id = {upstream_id: {'upstream_id': upstream_id, 'name': name}
+                     for upstream_id, name in missing_players.values() if upstream_id}
+            by_name = {name: {'upstream_id': None, 'name': name}
+                       for upstream_id, name in missing_players.values() if not upstream_id}
+            if by_id:
+                # Players stored by name before their upstream ID was known take it over
+                conn.execute(
+                    update(table).where(
+                        table.c.upstream_id.is_(None),
+                        table.c.name == bindparam('claim_name')
+                    ).values(upstream_id=bindparam('claim_id')),
+                    [{'claim_id': upstream_id, 'claim_name': row['name']} for upstream_id, row in by_id.items()]
                 )
-                session.add(line)
-            session.commit()
+            for upstream_id, key in self._ensure_rows(conn, table, table.c.upstream_id, by_id).items():
+                added['players'][(upstream_id, None)] = key
+            for name, key in self._ensure_rows(conn, table, table.c.name, by_name,
+                                               table.c.upstream_id.is_(None)).items():
+                added['players'][(None, name)] = key
+            for player, key in player_keys.items():
+                if key is None:
+                    player_keys[player] = added['players'][DimensionCache.player_natural_key(*player)]
+        missing_selections = {name: {'name': name} for name, key in selection_keys.items() if key is None}
+        if missing_selections:
+            table = Selection.__table__
+            added['selections'] = self._ensure_rows(conn, table, table.c.name, missing_selections)
+            selection_keys.update(added['selections'])
+        if markets:
+            self._ensure_rows(conn, Market.__table__, Market.__table__.c.id, markets)
+        if bookies:
+            self._ensure_rows(conn, Bookie.__table__, Bookie.__table__.c.id, bookies)
+        
+        for row, line in zip(rows, lines):
+            row['player_key'] = player_keys.get((line.player_id, line.player_name))
+            row['selection_key'] = selection_keys[line.selection]
+        return added
+    
+    def _ensure_rows(self, conn, table, column, rows, *criteria):
+        """Keys of the rows whose `column` matches each value in `rows`
+        (value -> row to insert), inserting the missing ones"""
+        def existing():
+            return dict(conn.execute(
+                select(column, table.c.id).where(column.in_(list(rows)), *criteria)
+            ).all())
+        
+        keys = existing()
+        missing = [row for value, row in rows.items() if value not in keys]
+        if missing:
+            conn.execute(insert(table), missing)
+            keys = existing()
+        return keys
+    
+    def save_movements(self, movements):
+        """Store movements detected outside save_lines"""
+        if movements:
+            with self.engine.begin() as conn:
+                self._insert_movements(conn, movements)
+    
+    def _insert_movements(self, conn, movements, snapshot_ids=None):
+        conn.execute(insert(LineMovement.__table__), [{
+            'event_id': move['event_id'],
+            'market_id': move['market_id'],
+            'bookie_id': move['bookie_id'],
+            'player_name': move['player_name'],
+            'selection': move['selection'],
+            'previous_odds': move['previous_odds'],
+            'current_odds': move['current_odds'],
+            'odds_movement': move['odds_movement'],
+            'abs_odds_movement': abs(move['odds_movement']),
+            'previous_line': move['previous_line'],
+            'current_line': move['current_line'],
+            'line_movement': move['line_movement'],
+            'detected_at': move['timestamp'],
+            'snapshot_id': (snapshot_ids or {}).get((move['event_id'], move['market_id']))
+        } for move in movements])
+    
+    def _price_key(self, row):
+        """Identity of a price: unchanged rows share the same key between snapshots"""
+        return (row['bookie_id'], row['player_key'], row['selection_key'], row['line_value'], row['odds'])
+    
+    def _current_rows(self, conn, event_id, market_id):
+        """Rows on a market's current board, i.e. those seen in its latest snapshot"""
+        table = BettingLine.__table__
+        latest = conn.execute(
+            select(Snapshot.id).where(
+                Snapshot.event_id == event_id,
+                Snapshot.market_id == market_id
+            ).order_by(Snapshot.taken_at.desc()).limit(1)
+        ).first()
+        if not latest:
+            return []
+        
+        return [dict(row) for row in conn.execute(self._with_names(select(table, *self.LINE_NAMES)).where(
+            table.c.event_id == event_id,
+            table.c.market_id == market_id,
+            table.c.last_snapshot_id == latest[0]
+        )).mappings()]
+    
+    def _with_names(self, query):
+        """Join a query over betting_lines to the dimension tables, for LINE_NAMES"""
+        return query.outerjoin(Market, Market.id == BettingLine.market_id
+                   ).outerjoin(Player, Player.id == BettingLine.player_key
+                   ).outerjoin(Selection, Selection.id == BettingLine.selection_key)
+    
+    def _board_line(self, row, **overrides):
+        """Build a board cache entry from a line row or ORM object"""
+        values = dict(overrides)
+        for field in BoardLine._fields:
+            if field not in values:
+                values[field] = row[field] if isinstance(row, dict) else getattr(row, field)
+        return BoardLine(**values)
     
     def get_line_history(self, event_id, market_id, selection=None, hours=24):
-        """Get line history for a specific market"""
-        with self.SessionLocal() as session:
-            query = session.query(BettingLine).filter(
-                BettingLine.event_id == event_id,
-                BettingLine.market_id == market_id,
-                BettingLine.timestamp >= datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            )
-            
-            if selection:
-                query = query.filter(BettingLine.selection == selection)
-                
-            return query.order_by(BettingLine.timestamp).all()
+        """Get line history for a specific market.
+        
+        Returns one row per line per snapshot, with `timestamp` set to the
+        snapshot time, so run-length rows are expanded back into the full series.
+        """
+        with self.ReadSession() as session:
+            since = datetime.utcnow() - timedelta(hours=hours)
+            return self._line_history_query(session, event_id, market_id, since, selection).all()
+    
+    def get_line_history_buckets(self, event_id, market_id, start=None, end=None, resolution=None,
+                                 max_points=300, selection=None, player_name=None):
+        """Get downsampled line history, bucketed in SQL.
+        
+        Each series (bookie, selection, player) is reduced to open/close/min/max
+        odds per `resolution`-second bucket over [start, end). If no resolution
+        is given it is chosen so each series has at most `max_points` buckets.
+        Returns {(bookie_id, selection, player_name): {column: [values]}}.
+        """
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(hours=24)
+        if not resolution:
+            # Buckets are aligned to the epoch, so the range can straddle one more than it spans
+            span = int((end - start).total_seconds())
+            resolution = max(1, -(-span // max(1, max_points - 1)))
+        
+        query = self._line_history_buckets_query(event_id, market_id, start, end, resolution,
+                                                 selection, player_name)
+        
+        history = {}
+        with self.read_engine.connect() as conn:
+            for row in conn.execute(query):
+                columns = history.setdefault((row.bookie_id, row.selection, row.player_name), {
+                    'timestamp': [], 'open': [], 'close': [], 'min': [], 'max': []
+                })
+                columns['timestamp'].append(datetime.fromtimestamp(row.bucket, timezone.utc).replace(tzinfo=None))
+                columns['open'].append(row.open)
+                columns['close'].append(row.close)
+                columns['min'].append(row.min)
+                columns['max'].append(row.max)
+        return history
+    
+    def get_market_ids(self, event_id):
+        """Get every market that has been snapshotted for an event"""
+        with self.ReadSession() as session:
+            return [market_id for (market_id,) in self._market_ids_query(session, event_id).all()]
+    
+    def get_last_snapshot_id(self):
+        """Get the newest snapshot ID across all markets; changes whenever a poll lands"""
+        with self.ReadSession() as session:
+            return session.query(func.max(Snapshot.id)).scalar()
+    
+    def get_latest_snapshot_id(self, event_id, market_id):
+        """Get the most recent snapshot ID for a market"""
+        with self.ReadSession() as session:
+            latest = self._latest_snapshot_query(session, event_id, market_id).first()
+            return latest[0] if latest else None
+    
+    def get_baseline_snapshot_id(self, event_id, market_id, since):
+        """Get the earliest snapshot ID for a market taken at or after `since`"""
+        with self.ReadSession() as session:
+            earliest = self._baseline_snapshot_query(session, event_id, market_id, since).first()
+            return earliest[0] if earliest else None
+    
+    def get_snapshot_lines(self, event_id, market_id, snapshot_id):
+        """Get every line on a market's board as of a snapshot"""
+        with self.ReadSession() as session:
+            return self._snapshot_lines_query(session, event_id, market_id, snapshot_id).all()
     
     def get_current_lines(self, event_id, market_id):
-        """Get current lines for a specific market"""
-        with self.SessionLocal() as session:
-            # Get the most recent timestamp for this market
-            latest_time = session.query(BettingLine.timestamp).\
-                filter(BettingLine.event_id == event_id,
-                       BettingLine.market_id == market_id).\
-                order_by(BettingLine.timestamp.desc()).\
-                first()
-            
-            if not latest_time:
-                return []
-                
-            # Get all lines from that timestamp
-            return session.query(BettingLine).\
-                filter(BettingLine.event_id == event_id,
-                       BettingLine.market_id == market_id,
-                       BettingLine.timestamp == latest_time[0]).\
-                all()
+        """Get current lines for a specific market, served from the board cache when possible"""
+        cached = self.board_cache.get_lines(event_id, market_id)
+        if cached is not None:
+            return cached
+        
+        # Cold start: load the board from the database and warm the cache
+        snapshot_id = self.get_latest_snapshot_id(event_id, market_id)
+        if snapshot_id is None:
+            return []
+        lines = [self._board_line(line) for line in self.get_snapshot_lines(event_id, market_id, snapshot_id)]
+        self.board_cache.set_board(event_id, market_id, lines, from_db=True)
+        return lines
+    
+    def get_current_board(self, event_ids=None):
+        """Get the current lines for every market of every event (or of `event_ids`) in one query"""
+        query = self._current_board_query(event_ids)
+        with self.read_engine.connect() as conn:
+            return conn.execute(query).all()
+    
+    def get_movements(self, event_id=None, market_id=None, bookie_id=None, player_name=None,
+                      since=None, until=None, order_by='recent', limit=100, cursor=None):
+        """Get stored movements, newest or biggest first, one page at a time.
+        
+        Returns (movements, next_cursor). Pass next_cursor back to get the
+        following page; it is None on the last page. Pages are keyed on the
+        sort column, so they stay stable while new movements are stored.
+        """
+        if order_by not in self.MOVEMENT_ORDERS:
+            raise ValueError(f"Unknown movement order: {order_by}")
+        with self.ReadSession() as session:
+            rows = self._movements_query(
+                session, event_id, market_id, bookie_id, player_name, since, until, order_by, cursor
+            ).limit(limit + 1).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        movements = [{
+            'event_id': row.event_id,
+            'market_id': row.market_id,
+            'bookie_id': row.bookie_id,
+            'selection': row.selection,
+            'player_name': row.player_name,
+            'previous_odds': row.previous_odds,
+            'current_odds': row.current_odds,
+            'odds_movement': row.odds_movement,
+            'previous_line': row.previous_line,
+            'current_line': row.current_line,
+            'line_movement': row.line_movement,
+            'timestamp': row.detected_at
+        } for row in rows]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = (last.detected_at if order_by == 'recent' else last.abs_odds_movement, last.id)
+        return movements, next_cursor
+    
+    def get_players(self, name=None):
+        """Get players, optionally those whose name contains `name`"""
+        with self.ReadSession() as session:
+            query = session.query(Player)
+            if name:
+                query = query.filter(Player.name.contains(name))
+            return query.order_by(Player.name).all()
+    
+    def get_player_lines(self, player_name=None, upstream_id=None, market_id=None, hours=24):
+        """Get a player's lines across every event, with market and book names.
+        
+        Identify the player by upstream participant ID or by name. Returns
+        every row live within the last `hours`, oldest first per market.
+        """
+        if player_name is None and upstream_id is None:
+            raise ValueError("Pass a player_name or an upstream_id")
+        since = datetime.utcnow() - timedelta(hours=hours)
+        with self.ReadSession() as session:
+            return self._player_lines_query(session, player_name, upstream_id, market_id, since).all()
+    
+    # Hot query builders, shared by the methods above and the query plan check
+    
+    def _line_history_query(self, session, event_id, market_id, since, selection=None):
+        # Expand each row across the snapshots it was live for
+        query = session.query(
+            BettingLine.event_id,
+            BettingLine.market_id,
+            BettingLine.bookie_id,
+            Player.name.label('player_name'),
+            Selection.name.label('selection'),
+            BettingLine.line_value,
+            BettingLine.odds,
+            Snapshot.id.label('snapshot_id'),
+            Snapshot.taken_at.label('timestamp')
+        ).join(Snapshot, (Snapshot.event_id == BettingLine.event_id) &
+                         (Snapshot.market_id == BettingLine.market_id) &
+                         (Snapshot.id >= BettingLine.snapshot_id) &
+                         (Snapshot.id <= BettingLine.last_snapshot_id)
+        ).outerjoin(Player, Player.id == BettingLine.player_key
+        ).outerjoin(Selection, Selection.id == BettingLine.selection_key
+        ).filter(
+            Snapshot.event_id == event_id,
+            Snapshot.market_id == market_id,
+            Snapshot.taken_at >= since
+        )
+        if selection:
+            query = query.filter(Selection.name == selection)
+        return query.order_by(Snapshot.taken_at)
+    
+    def _market_ids_query(self, session, event_id):
+        return session.query(Snapshot.market_id).filter(
+            Snapshot.event_id == event_id
+        ).distinct()
+    
+    def _latest_snapshot_query(self, session, event_id, market_id):
+        return session.query(Snapshot.id).filter(
+            Snapshot.event_id == event_id,
+            Snapshot.market_id == market_id
+        ).order_by(Snapshot.taken_at.desc())
+    
+    def _baseline_snapshot_query(self, session, event_id, market_id, since):
+        return session.query(Snapshot.id).filter(
+            Snapshot.event_id == event_id,
+            Snapshot.market_id == market_id,
+            Snapshot.taken_at >= since
+        ).order_by(Snapshot.taken_at)
+    
+    def _snapshot_lines_query(self, session, event_id, market_id, snapshot_id):
+        return self._with_names(session.query(*BettingLine.__table__.c, *self.LINE_NAMES)).filter(
+            BettingLine.event_id == event_id,
+            BettingLine.market_id == market_id,
+            BettingLine.last_snapshot_id >= snapshot_id,
+            BettingLine.snapshot_id <= snapshot_id
+        )
+    
+    def _current_board_query(self, event_ids=None):
+        latest = select(
+            Snapshot.event_id,
+            Snapshot.market_id,
+            func.max(Snapshot.id).label('snapshot_id')
+        ).group_by(Snapshot.event_id, Snapshot.market_id)
+        if event_ids is not None:
+            latest = latest.where(Snapshot.event_id.in_(list(event_ids)))
+        latest = latest.subquery()
+        
+        return self._with_names(select(
+            BettingLine.event_id,
+            BettingLine.market_id,
+            Market.market_type,
+            BettingLine.bookie_id,
+            Player.name.label('player_name'),
+            Selection.name.label('selection'),
+            BettingLine.line_value,
+            BettingLine.odds,
+            latest.c.snapshot_id
+        ).select_from(BettingLine).join(latest, (BettingLine.event_id == latest.c.event_id) &
+                                                (BettingLine.market_id == latest.c.market_id) &
+                                                (BettingLine.snapshot_id <= latest.c.snapshot_id) &
+                                                (BettingLine.last_snapshot_id >= latest.c.snapshot_id)))
+    
+    def _line_history_buckets_query(self, event_id, market_id, start, end, resolution,
+                                    selection=None, player_name=None):
+        epoch = self._epoch_seconds(Snapshot.taken_at)
+        bucket = (epoch - epoch % resolution).label('bucket')
+        series = (BettingLine.bookie_id, BettingLine.selection_key, BettingLine.player_key, bucket)
+        points = select(
+            BettingLine.bookie_id,
+            Selection.name.label('selection'),
+            Player.name.label('player_name'),
+            BettingLine.selection_key,
+            BettingLine.player_key,
+            BettingLine.odds,
+            bucket,
+            func.row_number().over(partition_by=series, order_by=Snapshot.taken_at).label('first_rank'),
+            func.row_number().over(partition_by=series, order_by=Snapshot.taken_at.desc()).label('last_rank')
+        ).join(BettingLine, (BettingLine.event_id == Snapshot.event_id) &
+                            (BettingLine.market_id == Snapshot.market_id) &
+                            (BettingLine.snapshot_id <= Snapshot.id) &
+                            (BettingLine.last_snapshot_id >= Snapshot.id)
+        ).outerjoin(Player, Player.id == BettingLine.player_key
+        ).outerjoin(Selection, Selection.id == BettingLine.selection_key
+        ).where(
+            Snapshot.event_id == event_id,
+            Snapshot.market_id == market_id,
+            Snapshot.taken_at >= start,
+            Snapshot.taken_at < end
+        )
+        if selection:
+            points = points.where(Selection.name == selection)
+        if player_name:
+            points = points.where(Player.name == player_name)
+        points = points.subquery()
+        
+        return select(
+            points.c.bookie_id,
+            points.c.selection,
+            points.c.player_name,
+            points.c.bucket,
+            func.max(case((points.c.first_rank == 1, points.c.odds))).label('open'),
+            func.max(case((points.c.last_rank == 1, points.c.odds))).label('close'),
+            func.min(points.c.odds).label('min'),
+            func.max(points.c.odds).label('max')
+        ).group_by(
+            points.c.bookie_id, points.c.selection_key, points.c.player_key, points.c.bucket,
+            points.c.selection, points.c.player_name
+        ).order_by(
+            points.c.bookie_id, points.c.selection, points.c.player_name, points.c.bucket
+        )
+    
+    def _player_lines_query(self, session, player_name=None, upstream_id=None, market_id=None, since=None):
+        # Resolve the player first, then walk their lines on the player index
+        query = session.query(
+            Player.upstream_id,
+            Player.name.label('player_name'),
+            BettingLine.event_id,
+            BettingLine.market_id,
+            Market.name.label('market_name'),
+            BettingLine.bookie_id,
+            Bookie.name.label('bookie'),
+            Selection.name.label('selection'),
+            BettingLine.line_value,
+            BettingLine.odds,
+            BettingLine.timestamp,
+            BettingLine.last_seen
+        ).join(BettingLine, BettingLine.player_key == Player.id
+        ).join(Selection, Selection.id == BettingLine.selection_key
+        ).outerjoin(Market, Market.id == BettingLine.market_id
+        ).outerjoin(Bookie, Bookie.id == BettingLine.bookie_id)
+        if upstream_id is not None:
+            query = query.filter(Player.upstream_id == upstream_id)
+        else:
+            query = query.filter(Player.name == player_name)
+        if market_id is not None:
+            query = query.filter(BettingLine.market_id == market_id)
+        if since is not None:
+            query = query.filter(BettingLine.last_seen >= since)
+        return query.order_by(BettingLine.market_id, BettingLine.event_id, BettingLine.timestamp)
+    
+    def _movements_query(self, session, event_id=None, market_id=None, bookie_id=None, player_name=None,
+                         since=None, until=None, order_by='recent', cursor=None):
+        query = session.query(LineMovement)
+        for column, value in ((LineMovement.event_id, event_id), (LineMovement.market_id, market_id),
+                              (LineMovement.bookie_id, bookie_id), (LineMovement.player_name, player_name)):
+            if value is not None:
+                query = query.filter(column == value)
+        if since is not None:
+            query = query.filter(LineMovement.detected_at >= since)
+        if until is not None:
+            query = query.filter(LineMovement.detected_at < until)
+        
+        key = LineMovement.detected_at if order_by == 'recent' else LineMovement.abs_odds_movement
+        if cursor is not None:
+            # Rows after the cursor in (key, id) descending order
+            query = query.filter((key < cursor[0]) | ((key == cursor[0]) & (LineMovement.id < cursor[1])))
+        return query.order_by(key.desc(), LineMovement.id.desc())
+    
+    def explain_query_plan(self, query):
+        """Return SQLite's EXPLAIN QUERY PLAN detail lines for an ORM query or Core select"""
+        compiled = getattr(query, 'statement', query).compile(
+            dialect=self.engine.dialect, compile_kwargs={'render_postcompile': True}  # Expand IN lists
+        )
+        # Parameter values don't affect the plan shape; stringify datetimes for the driver
+        params = tuple(
+            value.isoformat(' ') if isinstance(value, datetime) else value
+            for value in (compiled.params[name] for name in compiled.positiontup)
+        )
+        with self.read_engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows]
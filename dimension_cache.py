@@ -0,0 +1,52 @@
+# dimension_cache.py
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+class DimensionCache:
+    """Process-level map from natural keys to dimension table keys.
+
+    Ingest resolves every line's player and selection to an integer key, and
+    checks its market and book exist, from here, so normalizing adds no query
+    per line; only values never seen before go to the database. Only keys of
+    committed rows may be added, so a rolled-back insert can't leave a key
+    pointing nowhere.
+    """
+    def __init__(self):
+        self._players = {}      # (upstream ID, or None and name) -> player key
+        self._selections = {}   # selection label -> selection key
+        self._markets = set()   # market IDs in the markets table
+        self._bookies = set()   # bookie IDs in the bookies table
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def player_natural_key(upstream_id: Optional[str], name: str) -> Tuple:
+        """Players are identified by upstream ID when the API sends one, else by name"""
+        return (upstream_id, None) if upstream_id else (None, name)
+
+    def get_player(self, upstream_id: Optional[str], name: str) -> Optional[int]:
+        return self._players.get(self.player_natural_key(upstream_id, name))
+
+    def get_selection(self, name: str) -> Optional[int]:
+        return self._selections.get(name)
+
+    def has_market(self, market_id: int) -> bool:
+        return market_id in self._markets
+
+    def has_bookie(self, bookie_id: int) -> bool:
+        return bookie_id in self._bookies
+
+    def update(self, players: Dict[Tuple, int] = None, selections: Dict[str, int] = None,
+               markets: Iterable[int] = (), bookies: Iterable[int] = ()):
+        """Add keys of rows that are committed"""
+        with self._lock:
+            self._players.update(players or {})
+            self._selections.update(selections or {})
+            self._markets.update(markets)
+            self._bookies.update(bookies)
+
+    def clear(self):
+        with self._lock:
+            self._players.clear()
+            self._selections.clear()
+            self._markets.clear()
+            self._bookies.clear()
@@ -0,0 +1,68 @@
+# fetch_planner.py
+import asyncio
+from typing import Dict, List, Tuple
+from api_service import BaseAPIService, LineBatch
+
+class FetchPlanner:
+    """Plans slate-wide market fetches.
+
+    Instead of one /offers request per event and market, every event for a
+    market is joined into as few requests as possible and the resulting lines
+    are fanned back out per event.
+    """
+    def __init__(self, api_service: BaseAPIService, market_config: Dict, max_events_per_request: int = 16):
+        self.api_service = api_service
+        self.market_config = market_config
+        self.max_events_per_request = max_events_per_request
+    
+    def markets(self) -> List[Tuple[str, int]]:
+        """List every (market_type, market_id) pair in the market config"""
+        markets = [('game_lines', market_id) for market_id in self.market_config['game_lines'].values()]
+        markets.extend(('props', market_id) for market_id in self.market_config['props'].keys())
+        return markets
+    
+    def plan(self, event_ids: List[str], markets: List[Tuple[str, int]] = None) -> List[Tuple[str, int, List[str]]]:
+        """Build the list of (market_type, market_id, event_ids) requests for a slate"""
+        if markets is None:
+            markets = self.markets()
+        
+        batches = []
+        for market_type, market_id in markets:
+            for i in range(0, len(event_ids), self.max_events_per_request):
+                batches.append((market_type, market_id, event_ids[i:i + self.max_events_per_request]))
+        return batches
+    
+    def execute(self, event_ids: List[str], markets: List[Tuple[str, int]] = None) -> Dict[int, Dict[str, LineBatch]]:
+        """Run the plan and fan lines back out as {market_id: {event_id: lines}}"""
+        results = {}
+        for market_type, market_id, chunk in self.plan(event_ids, markets):
+            lines = self.api_service.fetch_market_odds(market_type, market_id, chunk)
+            self._fan_out(results, market_id, lines)
+        return results
+    
+    async def execute_async(self, event_ids: List[str], markets: List[Tuple[str, int]] = None) -> Dict[int, Dict[str, LineBatch]]:
+        """Run the plan concurrently against an AsyncAPIService"""
+        batches = self.plan(event_ids, markets)
+        all_lines = await asyncio.gather(*[
+            self.api_service.fetch_market_odds(market_type, market_id, chunk)
+            for market_type, market_id, chunk in batches
+        ])
+        
+        results = {}
+        for (market_type, market_id, chunk), lines in zip(batches, all_lines):
+            self._fan_out(results, market_id, lines)
+        return results
+    
+    def _fan_out(self, results: Dict, market_id: int, lines: LineBatch):
+        """Group a market's lines, and the offers skipped as unchanged, by event"""
+        by_event = results.setdefault(market_id, {})
+        for line in lines:
+            self._event_batch(by_event, line.event_id, lines).append(line)
+        for offer in lines.unchanged:
+            self._event_batch(by_event, offer.event_id, lines).unchanged.append(offer)
+    
+    def _event_batch(self, by_event: Dict[str, LineBatch], event_id: str, lines: LineBatch) -> LineBatch:
+        batch = by_event.get(event_id)
+        if batch is None:
+            batch = by_event[event_id] = LineBatch(fetched_at=lines.fetched_at)
+        return batch
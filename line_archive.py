@@ -0,0 +1,285 @@
+# line_archive.py
+"""Columnar archive of betting lines: Parquet partitioned by season/week/market, queried with DuckDB.
+
+Lines of finished events are exported event by event into
+    <root>/season=<s>/week=<w>/market_id=<m>/event-<event_id>.parquet
+with the archived_events table as the watermark: an event polled again after
+it was exported has snapshots newer than its watermark, and is exported again.
+compact() then deletes archived events' raw rows from SQLite once they're
+older than the retention window; the archive remains the source for
+season-scale history.
+
+    python line_archive.py export
+    python line_archive.py compact --retention-days 14
+    python line_archive.py movement 103 --season 2024
+"""
+import argparse
+import glob
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+import pandas as pd
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+
+from config import Config
+from database import Database, ArchivedEvent, BettingLine, Event, LineMovement, Snapshot, FINISHED_STATUSES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Export needs pyarrow; the rest of the app doesn't
+    pa = pq = None
+
+try:
+    import duckdb
+except ImportError:  # Queries need duckdb
+    duckdb = None
+
+# Columns written to each file; season, week and market_id come from the path
+ARCHIVE_COLUMNS = ['id', 'event_id', 'market_type', 'bookie_id', 'player_name', 'selection',
+                   'line_value', 'odds', 'first_seen', 'last_seen', 'snapshot_id', 'last_snapshot_id']
+
+def nfl_season_week(start_time: datetime) -> Tuple[int, int]:
+    """Season and week of a kickoff, for events the API didn't label.
+
+    Week 1 starts on the Thursday after Labor Day (the first Monday in
+    September); preseason games fall in week 0.
+    """
+    season = start_time.year if start_time.month >= 3 else start_time.year - 1
+    labor_day = date(season, 9, 1) + timedelta(days=(7 - date(season, 9, 1).weekday()) % 7)
+    kickoff = labor_day + timedelta(days=3)
+    return season, max(0, (start_time.date() - kickoff).days // 7 + 1)
+
+class LineArchive:
+    def __init__(self, db: Database, root: str = "archive", archive_after_hours: float = 12):
+        self.db = db
+        self.root = root
+        self.archive_after = timedelta(hours=archive_after_hours)  # Events older than this count as finished
+
+    # Export
+
+    def pending_events(self, now: datetime = None) -> List[Event]:
+        """Finished events whose lines haven't been exported yet, or have changed since"""
+        cutoff = (now or datetime.utcnow()) - self.archive_after
+        archived = select(ArchivedEvent.event_id)
+        stale = select(ArchivedEvent.event_id).where(ArchivedEvent.compacted_at.is_(None), self._newer_snapshots())
+        with self.db.ReadSession() as session:
+            return session.query(Event).filter(or_(
+                and_(Event.status.in_(FINISHED_STATUSES) | (Event.start_time < cutoff), Event.event_id.not_in(archived)),
+                Event.event_id.in_(stale)
+            )).order_by(Event.start_time).all()
+    
+    def _newer_snapshots(self):
+        """Whether an archived event has snapshots its export doesn't cover"""
+        return exists().where(
+            Snapshot.event_id == ArchivedEvent.event_id,
+            Snapshot.id > func.coalesce(ArchivedEvent.last_snapshot_id, 0)
+        )
+
+    def export(self, now: datetime = None) -> int:
+        """Export every pending event's lines; returns the number of rows written"""
+        if pq is None:
+            raise RuntimeError("Exporting the line archive requires pyarrow")
+
+        now = now or datetime.utcnow()
+        total = 0
+        for event in self.pending_events(now):
+            season, week = event.season, event.week
+            if season is None or week is None:
+                season, week = nfl_season_week(event.start_time)
+
+            # Read before the rows, so a snapshot saved in between is exported again next time
+            with self.db.ReadSession() as session:
+                last_snapshot_id = session.query(func.max(Snapshot.id)).filter(
+                    Snapshot.event_id == event.event_id
+                ).scalar()
+            rows = self._event_lines(event.event_id)
+            # Rewrites the files of an event exported before
+            for market_id, market_rows in rows.groupby('market_id'):
+                directory = os.path.join(self.root, f"season={season}", f"week={week}", f"market_id={market_id}")
+                self._write(market_rows[ARCHIVE_COLUMNS], directory, f"event-{event.event_id}.parquet")
+
+            watermark = {
+                'season': season,
+                'week': week,
+                'row_count': len(rows),
+                'archived_at': now,
+                'last_snapshot_id': last_snapshot_id
+            }
+            with self.db.engine.begin() as conn:
+                conn.execute(self.db._upsert(ArchivedEvent.__table__).values(
+                    event_id=event.event_id, **watermark
+                ).on_conflict_do_update(index_elements=['event_id'], set_=watermark))
+            total += len(rows)
+            print(f"Archived {len(rows)} lines for event {event.event_id} (season {season}, week {week})")
+        return total
+
+    def _event_lines(self, event_id: str) -> pd.DataFrame:
+        table = BettingLine.__table__
+        # Archived files stay denormalized, with names rather than dimension keys
+        query = self.db._with_names(select(
+            table.c.id, table.c.event_id, table.c.market_id, *self.db.LINE_NAMES, table.c.bookie_id,
+            table.c.line_value, table.c.odds,
+            table.c.timestamp.label('first_seen'), table.c.last_seen, table.c.snapshot_id, table.c.last_snapshot_id
+        )).where(table.c.event_id == event_id)
+        with self.db.read_engine.connect() as conn:
+            rows = pd.read_sql(query, conn, parse_dates=['first_seen', 'last_seen'])
+        # Rows written before run-length storage have no last_seen
+        rows['last_seen'] = rows['last_seen'].fillna(rows['first_seen'])
+        return rows
+
+    def _write(self, rows: pd.DataFrame, directory: str, filename: str):
+        """Write one Parquet file atomically, so readers never see a partial file"""
+        os.makedirs(directory, exist_ok=True)
+        schema = pa.schema([
+            ('id', pa.int64()), ('event_id', pa.string()), ('market_type', pa.string()),
+            ('bookie_id', pa.int32()), ('player_name', pa.string()), ('selection', pa.string()),
+            ('line_value', pa.float64()), ('odds', pa.int32()),
+            ('first_seen', pa.timestamp('us')), ('last_seen', pa.timestamp('us')),
+            ('snapshot_id', pa.int64()), ('last_snapshot_id', pa.int64())
+        ])
+        path = os.path.join(directory, filename)
+        pq.write_table(pa.Table.from_pandas(rows, schema=schema, preserve_index=False), f"{path}.tmp",
+                       compression='zstd')
+        os.replace(f"{path}.tmp", path)
+
+    # Retention
+
+    def compact(self, retention_days: float, now: datetime = None) -> int:
+        """Delete raw rows of archived events that started more than `retention_days` ago.
+        Events with lines newer than their export wait for export() to run again.
+        Their line movements are kept."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=retention_days)
+        with self.db.ReadSession() as session:
+            event_ids = [event_id for (event_id,) in session.query(ArchivedEvent.event_id).join(
+                Event, Event.event_id == ArchivedEvent.event_id
+            ).filter(
+                ArchivedEvent.compacted_at.is_(None),
+                Event.start_time < cutoff,
+                ~self._newer_snapshots()
+            )]
+        if not event_ids:
+            return 0
+
+        with self.db.engine.begin() as conn:
+            deleted = conn.execute(delete(BettingLine.__table__).where(
+                BettingLine.__table__.c.event_id.in_(event_ids)
+            )).rowcount
+            # Movements are kept as history; only their link to the deleted snapshots goes
+            conn.execute(update(LineMovement.__table__).where(
+                LineMovement.__table__.c.event_id.in_(event_ids)
+            ).values(snapshot_id=None))
+            conn.execute(delete(Snapshot.__table__).where(Snapshot.__table__.c.event_id.in_(event_ids)))
+            conn.execute(update(ArchivedEvent.__table__).where(
+                ArchivedEvent.__table__.c.event_id.in_(event_ids)
+            ).values(compacted_at=now))
+        for event_id in event_ids:
+            self.db.board_cache.evict_event(event_id)
+        print(f"Compacted {deleted} archived lines for {len(event_ids)} events out of the database")
+        return deleted
+
+    def run(self, retention_days: float = None):
+        """Export pending events, then compact anything past retention"""
+        self.export()
+        if retention_days is not None:
+            self.compact(retention_days)
+
+    # Queries
+
+    def connect(self):
+        """A DuckDB connection with a `lines` view over the whole archive"""
+        if duckdb is None:
+            raise RuntimeError("Querying the line archive requires duckdb")
+        con = duckdb.connect()
+        pattern = os.path.join(self.root, '*', '*', '*', '*.parquet')
+        if glob.glob(pattern):
+            con.execute(f"CREATE VIEW lines AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)")
+        else:
+            # Empty archive: same columns, no rows
+            con.execute("""
+                CREATE VIEW lines AS SELECT
+                    NULL::BIGINT AS id, NULL::VARCHAR AS event_id, NULL::VARCHAR AS market_type,
+                    NULL::INTEGER AS bookie_id, NULL::VARCHAR AS player_name, NULL::VARCHAR AS selection,
+                    NULL::DOUBLE AS line_value, NULL::INTEGER AS odds, NULL::TIMESTAMP AS first_seen,
+                    NULL::TIMESTAMP AS last_seen, NULL::BIGINT AS snapshot_id, NULL::BIGINT AS last_snapshot_id,
+                    NULL::BIGINT AS season, NULL::BIGINT AS week, NULL::BIGINT AS market_id
+                WHERE false
+            """)
+        return con
+
+    def query(self, sql: str, params: list = None) -> pd.DataFrame:
+        """Run SQL against the `lines` view"""
+        con = self.connect()
+        try:
+            return con.execute(sql, params or []).df()
+        finally:
+            con.close()
+
+    def market_movement(self, market_id: int, season: int = None, week: int = None,
+                        player_name: str = None) -> pd.DataFrame:
+        """Open/close/range of odds and lines per event, player, book and selection for a market.
+
+        price_changes counts moves after the opening price. Rows are compared
+        with the one before, since 'full' storage mode writes a row per poll
+        rather than per price.
+        """
+        filters, params = ["market_id = ?"], [market_id]
+        for column, value in (('season', season), ('week', week), ('player_name', player_name)):
+            if value is not None:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        return self.query(f"""
+            WITH prices AS (
+                SELECT *,
+                       lag(odds) OVER series AS previous_odds,
+                       lag(line_value) OVER series AS previous_line
+                FROM lines
+                WHERE {' AND '.join(filters)}
+                WINDOW series AS (PARTITION BY season, week, event_id, player_name, bookie_id, selection
+                                  ORDER BY first_seen, id)
+            )
+            SELECT season, week, event_id, player_name, bookie_id, selection,
+                   arg_min(odds, first_seen) AS open_odds,
+                   arg_max(odds, first_seen) AS close_odds,
+                   min(odds) AS min_odds,
+                   max(odds) AS max_odds,
+                   arg_min(line_value, first_seen) AS open_line,
+                   arg_max(line_value, first_seen) AS close_line,
+                   count(*) FILTER (WHERE previous_odds IS NOT NULL AND (
+                       odds <> previous_odds OR line_value IS DISTINCT FROM previous_line
+                   )) AS price_changes,
+                   min(first_seen) AS first_seen,
+                   max(last_seen) AS last_seen
+            FROM prices
+            GROUP BY season, week, event_id, player_name, bookie_id, selection
+            ORDER BY season, week, event_id, player_name, bookie_id, selection
+        """, params)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=Config.DATABASE_URL)
+    parser.add_argument('--root', default=Config.ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('export', help="Export finished events not yet archived")
+    compact = commands.add_parser('compact', help="Delete archived raw rows past retention")
+    compact.add_argument('--retention-days', type=float, default=Config.ARCHIVE_RETENTION_DAYS)
+    movement = commands.add_parser('movement', help="Print a market's movement from the archive")
+    movement.add_argument('market_id', type=int)
+    movement.add_argument('--season', type=int)
+    movement.add_argument('--week', type=int)
+    movement.add_argument('--player')
+    args = parser.parse_args()
+
+    db = Database(args.database, wal=Config.SQLITE_WAL, busy_timeout=Config.SQLITE_BUSY_TIMEOUT)
+    archive = LineArchive(db, args.root, Config.ARCHIVE_AFTER_HOURS)
+    if args.command == 'export':
+        archive.export()
+    elif args.command == 'compact':
+        archive.compact(args.retention_days)
+    else:
+        print(archive.market_movement(args.market_id, args.season, args.week, args.player).to_string())
+
+if __name__ == "__main__":
+    main()
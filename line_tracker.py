@@ -1,199 +1,182 @@
 # line_tracker.py
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from typing import List, Dict
 
 class LineTracker:
-    def __init__(self, db, significant_move: int = 15):
+    """Detects significant moves as lines arrive.
+
+    Each line is compared with its baseline: the price in effect at the start
+    of the last `lookback_hours`, or the price of the last reported move if
+    that is more recent. A slow drift (-110, -115, -120, -125) is reported
+    once it adds up to `significant_move`, not missed poll by poll.
+
+    detect_movements() only stages the new prices; call commit() once the
+    batch is saved, or rollback() if saving failed so the same moves are
+    reported again on the retry.
+    """
+    def __init__(self, db, significant_move: int = 15, lookback_hours: float = 1):
         self.db = db
         self.significant_move = significant_move  # Threshold for significant moves in odds points
+        self.lookback = timedelta(hours=lookback_hours)
+        # (event_id, market_id) -> {(bookie_id, player_name, selection): prices since the baseline, oldest first}
+        self._last_prices = {}
+        # (event_id, market_id) -> monotonic times of recent significant moves
+        self._recent_moves = {}
+        # Prices and moves of detected batches that aren't saved yet
+        self._pending_prices = {}
+        self._pending_moves = []
     
-    def check_line_movements(self, event_id: str, lookback_hours: int = 1) -> List[Dict]:
-        """Check for significant line movements in the past hour"""
+    def detect_movements(self, lines: List) -> List[Dict]:
+        """Diff an incoming batch against each line's baseline price.
+        
+        Call before the batch is saved. Cost is O(new lines): a board is only
+        read from the database (through the board cache) the first time a
+        market is seen.
+        """
         movements = []
+        staged = {}
         
-        with self.db.SessionLocal() as session:
-            # Get unique market IDs for this event
-            markets = session.query(self.db.BettingLine.market_id).filter(
-                self.db.BettingLine.event_id == event_id
-            ).distinct().all()
+        for line in lines:
+            event_id, market_id = line.event_id, line.market_id
+            board = self._last_prices.get((event_id, market_id))
+            if board is None:
+                board = self._prime(event_id, market_id)
             
-            for (market_id,) in markets:
-                # Get lines from last update
-                recent_lines = session.query(self.db.BettingLine).filter(
-                    self.db.BettingLine.event_id == event_id,
-                    self.db.BettingLine.market_id == market_id,
-                    self.db.BettingLine.timestamp >= datetime.utcnow() - timedelta(hours=lookback_hours)
-                ).order_by(self.db.BettingLine.timestamp.desc()).all()
-                
-                if not recent_lines:
-                    continue
-                
-                # Group by bookie and selection
-                latest_timestamp = recent_lines[0].timestamp
-                latest_lines = {
-                    f"{l.bookie_id}-{l.selection}": l 
-                    for l in recent_lines 
-                    if l.timestamp == latest_timestamp
-                }
-                
-                previous_lines = {
-                    f"{l.bookie_id}-{l.selection}": l 
-                    for l in recent_lines 
-                    if l.timestamp < latest_timestamp
-                }
-                
-                # Check for movements
-                for key, latest in latest_lines.items():
-                    if key in previous_lines:
-                        prev = previous_lines[key]
-                        odds_move = latest.odds - prev.odds
-                        line_move = latest.line_value - prev.line_value if latest.line_value and prev.line_value else 0
-                        
-                        if abs(odds_move) >= self.significant_move:
-                            movements.append({
-                                'event_id': event_id,
-                                'market_id': market_id,
-                                'bookie_id': latest.bookie_id,
-                                'selection': latest.selection,
-                                'player_name': latest.player_name,
-                                'previous_odds': prev.odds,
-                                'current_odds': latest.odds,
-                                'odds_movement': odds_move,
-                                'previous_line': prev.line_value,
-                                'current_line': latest.line_value,
-                                'line_movement': line_move,
-                                'timestamp': latest.timestamp
-                            })
-        
-        return movements
-    
-    def get_best_odds(self, event_id: str, market_id: int) -> Dict:
-        """Get best available odds for each selection"""
-        with self.db.SessionLocal() as session:
-            latest_time = session.query(self.db.BettingLine.timestamp).\
-                filter(self.db.BettingLine.event_id == event_id,
-                       self.db.BettingLine.market_id == market_id).\
-                order_by(self.db.BettingLine.timestamp.desc()).\
-                first()
-            
-            if not latest_time:
-                return {}
+            key = (line.bookie_id, line.player_name, line.selection)
+            prices = board.get(key)
+            if not prices:
+                staged[(event_id, market_id, key)] = [line]
+                continue
             
-            current_lines = session.query(self.db.BettingLine).\
-                filter(self.db.BettingLine.event_id == event_id,
-                       self.db.BettingLine.market_id == market_id,
-                       self.db.BettingLine.timestamp == latest_time[0]).\
-                all()
+            # Skip prices that were replaced before the window opened
+            cutoff = line.timestamp - self.lookback
+            start = 0
+            while start + 1 < len(prices) and prices[start + 1].timestamp <= cutoff:
+                start += 1
+            baseline, last = prices[start], prices[-1]
             
-            best_odds = {}
-            for line in current_lines:
-                selection = line.selection
-                if selection not in best_odds or \
-                   (line.odds > 0 and line.odds > best_odds[selection]['odds']) or \
-                   (line.odds < 0 and line.odds > best_odds[selection]['odds']):
-                    best_odds[selection] = {
-                        'bookie_id': line.bookie_id,
-                        'odds': line.odds,
-                        'line_value': line.line_value
-                    }
+            odds_move = line.odds - baseline.odds
+            line_move = line.line_value - baseline.line_value if line.line_value and baseline.line_value else 0
             
-            return best_odds# line_tracker.py
-from datetime import datetime, timedelta
-from typing import List, Dict
-
-class LineTracker:
-    def __init__(self, db, significant_move: int = 15):
-        self.db = db
-        self.significant_move = significant_move  # Threshold for significant moves in odds points
+            if abs(odds_move) >= self.significant_move:
+                movements.append({
+                    'event_id': event_id,
+                    'market_id': market_id,
+                    'bookie_id': line.bookie_id,
+                    'selection': line.selection,
+                    'player_name': line.player_name,
+                    'previous_odds': baseline.odds,
+                    'current_odds': line.odds,
+                    'odds_movement': odds_move,
+                    'previous_line': baseline.line_value,
+                    'current_line': line.line_value,
+                    'line_movement': line_move,
+                    'timestamp': line.timestamp
+                })
+                staged[(event_id, market_id, key)] = [line]  # The move is the next baseline
+            elif (line.odds, line.line_value) != (last.odds, last.line_value):
+                staged[(event_id, market_id, key)] = prices[start:] + [line]
+            elif start:
+                staged[(event_id, market_id, key)] = prices[start:]
+        
+        self._pending_prices.update(staged)
+        self._pending_moves.extend((move['event_id'], move['market_id']) for move in movements)
+        return movements
+    
+    def commit(self):
+        """Make the prices of detected batches the new last known prices"""
+        for (event_id, market_id, key), prices in self._pending_prices.items():
+            board = self._last_prices.get((event_id, market_id))
+            if board is not None:  # Unless the event was forgotten meanwhile
+                board[key] = prices
+        now = time.monotonic()
+        for market in self._pending_moves:
+            self._recent_moves.setdefault(market, deque(maxlen=100)).append(now)
+        self.rollback()
+    
+    def rollback(self):
+        """Drop the prices of detected batches that weren't saved"""
+        self._pending_prices = {}
+        self._pending_moves = []
+    
+    def volatility(self, event_id: str, market_id: int, window_minutes: int = 60) -> int:
+        """Number of significant moves detected for a market within the window"""
+        moves = self._recent_moves.get((event_id, market_id))
+        if not moves:
+            return 0
+        cutoff = time.monotonic() - window_minutes * 60
+        return sum(1 for moved_at in moves if moved_at >= cutoff)
+    
+    def _prime(self, event_id: str, market_id: int) -> Dict:
+        """Seed last known prices for a market from its current board"""
+        board = self._last_prices[(event_id, market_id)] = {
+            (line.bookie_id, line.player_name, line.selection): [line]
+            for line in self.db.get_current_lines(event_id, market_id)
+        }
+        return board
+    
+    def forget_event(self, event_id: str):
+        """Drop tracked prices for an event, e.g. once it has finished"""
+        for key in [key for key in self._last_prices if key[0] == event_id]:
+            del self._last_prices[key]
+        for key in [key for key in self._recent_moves if key[0] == event_id]:
+            del self._recent_moves[key]
     
     def check_line_movements(self, event_id: str, lookback_hours: int = 1) -> List[Dict]:
         """Check for significant line movements in the past hour"""
         movements = []
+        since = datetime.utcnow() - timedelta(hours=lookback_hours)
         
-        with self.db.SessionLocal() as session:
-            # Get unique market IDs for this event
-            markets = session.query(self.db.BettingLine.market_id).filter(
-                self.db.BettingLine.event_id == event_id
-            ).distinct().all()
+        for market_id in self.db.get_market_ids(event_id):
+            # Compare the latest snapshot against the earliest one in the lookback window
+            latest_id = self.db.get_latest_snapshot_id(event_id, market_id)
+            baseline_id = self.db.get_baseline_snapshot_id(event_id, market_id, since)
+            if latest_id is None or baseline_id is None or baseline_id == latest_id:
+                continue
+            
+            # Group by bookie, player and selection
+            latest_lines = {
+                (l.bookie_id, l.player_name, l.selection): l
+                for l in self.db.get_snapshot_lines(event_id, market_id, latest_id)
+            }
+            previous_lines = {
+                (l.bookie_id, l.player_name, l.selection): l
+                for l in self.db.get_snapshot_lines(event_id, market_id, baseline_id)
+            }
             
-            for (market_id,) in markets:
-                # Get lines from last update
-                recent_lines = session.query(self.db.BettingLine).filter(
-                    self.db.BettingLine.event_id == event_id,
-                    self.db.BettingLine.market_id == market_id,
-                    self.db.BettingLine.timestamp >= datetime.utcnow() - timedelta(hours=lookback_hours)
-                ).order_by(self.db.BettingLine.timestamp.desc()).all()
-                
-                if not recent_lines:
-                    continue
-                
-                # Group by bookie and selection
-                latest_timestamp = recent_lines[0].timestamp
-                latest_lines = {
-                    f"{l.bookie_id}-{l.selection}": l 
-                    for l in recent_lines 
-                    if l.timestamp == latest_timestamp
-                }
-                
-                previous_lines = {
-                    f"{l.bookie_id}-{l.selection}": l 
-                    for l in recent_lines 
-                    if l.timestamp < latest_timestamp
-                }
-                
-                # Check for movements
-                for key, latest in latest_lines.items():
-                    if key in previous_lines:
-                        prev = previous_lines[key]
-                        odds_move = latest.odds - prev.odds
-                        line_move = latest.line_value - prev.line_value if latest.line_value and prev.line_value else 0
-                        
-                        if abs(odds_move) >= self.significant_move:
-                            movements.append({
-                                'event_id': event_id,
-                                'market_id': market_id,
-                                'bookie_id': latest.bookie_id,
-                                'selection': latest.selection,
-                                'player_name': latest.player_name,
-                                'previous_odds': prev.odds,
-                                'current_odds': latest.odds,
-                                'odds_movement': odds_move,
-                                'previous_line': prev.line_value,
-                                'current_line': latest.line_value,
-                                'line_movement': line_move,
-                                'timestamp': latest.timestamp
-                            })
+            # Check for movements
+            for key, latest in latest_lines.items():
+                if key in previous_lines:
+                    prev = previous_lines[key]
+                    odds_move = latest.odds - prev.odds
+                    line_move = latest.line_value - prev.line_value if latest.line_value and prev.line_value else 0
+                    
+                    if abs(odds_move) >= self.significant_move:
+                        movements.append({
+                            'event_id': event_id,
+                            'market_id': market_id,
+                            'bookie_id': latest.bookie_id,
+                            'selection': latest.selection,
+                            'player_name': latest.player_name,
+                            'previous_odds': prev.odds,
+                            'current_odds': latest.odds,
+                            'odds_movement': odds_move,
+                            'previous_line': prev.line_value,
+                            'current_line': latest.line_value,
+                            'line_movement': line_move,
+                            'timestamp': latest.timestamp
+                        })
         
         return movements
     
     def get_best_odds(self, event_id: str, market_id: int) -> Dict:
-        """Get best available odds for each selection"""
-        with self.db.SessionLocal() as session:
-            latest_time = session.query(self.db.BettingLine.timestamp).\
-                filter(self.db.BettingLine.event_id == event_id,
-                       self.db.BettingLine.market_id == market_id).\
-                order_by(self.db.BettingLine.timestamp.desc()).\
-                first()
-            
-            if not latest_time:
-                return {}
-            
-            current_lines = session.query(self.db.BettingLine).\
-                filter(self.db.BettingLine.event_id == event_id,
-                       self.db.BettingLine.market_id == market_id,
-                       self.db.BettingLine.timestamp == latest_time[0]).\
-                all()
-            
-            best_odds = {}
-            for line in current_lines:
-                selection = line.selection
-                if selection not in best_odds or \
-                   (line.odds > 0 and line.odds > best_odds[selection]['odds']) or \
-                   (line.odds < 0 and line.odds > best_odds[selection]['odds']):
-                    best_odds[selection] = {
-                        'bookie_id': line.bookie_id,
-                        'odds': line.odds,
-                        'line_value': line.line_value
-                    }
-            
-            return best_odds
+        """Get best available odds for each (player, selection, line)"""
+        best_odds = self.db.board_cache.get_best_odds(event_id, market_id)
+        if best_odds is None:
+            # Cold start: loading the board from the database warms the cache
+            self.db.get_current_lines(event_id, market_id)
+            best_odds = self.db.board_cache.get_best_odds(event_id, market_id) or {}
+        
+        return best_odds
\ No newline at end of file
@@ -1,48 +1,211 @@
 # main.py
+"""Long-running odds poller.
+
+    python main.py run --weeks 17,18 --markets 1,3,102 --scheduler fixed --interval 2
+    python main.py smoke      # Fetch, store and print one event's markets
+    python main.py status     # Cycle lag and state of a running poller
+
+One process holds one set of components: the API clients, the database, the
+line tracker, the movement bus and the scheduler. SIGINT/SIGTERM let the
+cycle in flight finish and its writes commit before the process exits.
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+from urllib.request import urlopen
+
 from config import Config
-from api_service import APIService
+from api_service import APIService, LineRecord
+from async_api_service import AsyncAPIService
 from database import Database
+from line_archive import LineArchive
 from line_tracker import LineTracker
-from scheduler import UpdateScheduler
-import threading
-from typing import Dict, List
-from datetime import datetime
-import time
-from pprint import pprint
+from metrics import start_metrics_server
+from movement_bus import MovementBus, start_movement_server
+from scheduler import AdaptiveScheduler, UpdateScheduler
+from sharded_ingest import ShardedScheduler
+
+SCHEDULERS = ('adaptive', 'fixed')
 
-def format_market_data(lines: List[Dict]) -> Dict[str, Dict]:
+def format_market_data(lines: List[LineRecord]) -> Dict[str, Dict]:
     """Format market data by bookie for display"""
     formatted = {}
     for line in lines:
-        bookie = line['bookie']
+        bookie = line.bookie
         if bookie not in formatted:
             formatted[bookie] = {}
-        formatted[bookie][line['selection']] = line['display']
+        formatted[bookie][line.selection] = line.display
     return formatted
 
-def test_markets():
+def parse_markets(value: str) -> List[Tuple[str, int]]:
+    """'1,3,102' -> [('game_lines', 1), ('game_lines', 3), ('props', 102)]"""
+    game_lines = set(Config.MARKET_CONFIG['game_lines'].values())
+    markets = []
+    for market_id in (int(part) for part in value.split(',') if part.strip()):
+        if market_id in game_lines:
+            markets.append(('game_lines', market_id))
+        elif market_id in Config.MARKET_CONFIG['props']:
+            markets.append(('props', market_id))
+        else:
+            raise argparse.ArgumentTypeError(f"Unknown market ID: {market_id}")
+    return markets
+
+def parse_weeks(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+class PollerService:
+    """The poller's components, built once and shared by everything in the process"""
+    def __init__(self, database_url: str = None, markets: List[Tuple[str, int]] = None, season: int = None,
+                 weeks: List[int] = None, scheduler: str = None, interval_minutes: float = None,
+                 workers: int = None):
+        config = self.config = Config()
+        scheduler = scheduler or config.SCHEDULER
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
+        workers = config.INGEST_WORKERS if workers is None else workers
+        if workers and scheduler != 'fixed':
+            # Sharded ingest runs whole fixed-interval cycles; it has no per-market clocks
+            raise ValueError(f"Ingest workers need the fixed scheduler, not '{scheduler}'")
+        self.interval_minutes = interval_minutes or config.POLL_INTERVAL_MINUTES
+        
+        self.api_service = APIService(
+            base_url=config.API_BASE_URL,
+            headers=config.HEADERS,
+            bookie_map=config.BOOKIE_MAP,
+            page_limit=config.OFFERS_PAGE_LIMIT,
+            timeout=config.REQUEST_TIMEOUT,
+            skip_unchanged=config.SKIP_UNCHANGED_OFFERS
+        )
+        self.async_api_service = AsyncAPIService(
+            base_url=config.API_BASE_URL,
+            headers=config.HEADERS,
+            bookie_map=config.BOOKIE_MAP,
+            page_limit=config.OFFERS_PAGE_LIMIT,
+            timeout=config.REQUEST_TIMEOUT,
+            max_concurrency=config.MAX_CONCURRENT_REQUESTS,
+            requests_per_second=config.REQUESTS_PER_SECOND,
+            max_retries=config.MAX_RETRIES,
+            skip_unchanged=config.SKIP_UNCHANGED_OFFERS
+        )
+        self.db = Database(
+            database_url or config.DATABASE_URL,
+            storage_mode=config.LINE_STORAGE_MODE,
+            wal=config.SQLITE_WAL,
+            busy_timeout=config.SQLITE_BUSY_TIMEOUT,
+            checkpoint_interval=config.SQLITE_CHECKPOINT_SECONDS
+        )
+        self.db.sync_reference_data(config.MARKET_CONFIG, config.BOOKIE_MAP)
+        self.line_tracker = LineTracker(self.db)
+        self.archive = LineArchive(self.db, config.ARCHIVE_DIR, config.ARCHIVE_AFTER_HOURS)
+        self.movement_bus = MovementBus(config.MOVEMENT_HISTORY)
+        
+        shared = dict(markets=markets, archive=self.archive, movement_bus=self.movement_bus,
+                      season=season, weeks=weeks)
+        if workers:
+            self.scheduler = ShardedScheduler(
+                self.api_service, self.db, self.line_tracker,
+                workers=workers,
+                shard_by=config.INGEST_SHARD_BY,
+                queue_size=config.WRITE_QUEUE_SIZE,
+                **shared
+            )
+        elif scheduler == 'fixed':
+            self.scheduler = UpdateScheduler(self.api_service, self.db, self.line_tracker,
+                                             async_api_service=self.async_api_service, **shared)
+        else:
+            self.scheduler = AdaptiveScheduler(self.api_service, self.db, self.line_tracker,
+                                               async_api_service=self.async_api_service, **shared)
+        
+        self.started_at = datetime.utcnow()
+        self.servers = []
+        self._signals = 0
+    
+    def status(self) -> Dict:
+        """Service state, cycle lag and backlog, as served on /status"""
+        status = self.scheduler.status()
+        status.update(
+            started_at=self.started_at.isoformat(timespec='seconds') + 'Z',
+            uptime_seconds=round((datetime.utcnow() - self.started_at).total_seconds()),
+            database=self.db.engine.url.render_as_string(hide_password=True),
+            recent_movements=len(self.movement_bus.recent())
+        )
+        return status
+    
+    def run(self) -> int:
+        """Poll until SIGINT/SIGTERM, then drain and close.
+        
+        Returns the process exit status: 1 if polling died on its own, 2 if
+        the cycle in flight outlasted SHUTDOWN_TIMEOUT and was abandoned.
+        """
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.shutdown)
+        if self.config.METRICS_PORT:
+            self.servers.append(start_metrics_server(self.config.METRICS_PORT, status=self.status))
+        if self.config.MOVEMENT_STREAM_PORT:
+            self.servers.append(start_movement_server(
+                self.movement_bus, self.config.MOVEMENT_STREAM_PORT, queue_size=self.config.MOVEMENT_QUEUE_SIZE
+            ))
+        
+        # Polling runs off the main thread so signals are handled promptly even mid-cycle
+        poller = threading.Thread(target=self.scheduler.start, args=(self.interval_minutes,),
+                                  name='poller', daemon=True)
+        poller.start()
+        while poller.is_alive() and not self.scheduler.stopping.is_set():
+            poller.join(1)
+        
+        poller.join(self.config.SHUTDOWN_TIMEOUT)
+        if poller.is_alive():
+            # Uncommitted writes roll back when the process exits
+            print(f"Cycle still running after {self.config.SHUTDOWN_TIMEOUT}s; exiting without it")
+            return 2
+        crashed = not self.scheduler.stopping.is_set()
+        if crashed:
+            print("Poller thread exited unexpectedly; shutting down")
+        self.close()
+        return 1 if crashed else 0
+    
+    def shutdown(self, signum=None, frame=None):
+        """Signal handler: stop after the cycle in flight; a second signal exits at once"""
+        self._signals += 1
+        if self._signals > 1:
+            print("\nExiting without draining")
+            sys.exit(1)
+        print("\nStopping after the current cycle (signal again to exit now)...")
+        self.scheduler.stop()
+    
+    def close(self):
+        """Flush queued writes, stop the servers and release the database"""
+        self.scheduler.close()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        if self.db.wal:
+            self.db.checkpoint('TRUNCATE')
+        self.db.read_engine.dispose()
+        self.db.engine.dispose()
+        print("Poller stopped")
+
+def test_markets(service: PollerService):
     """Test market fetching and display functionality"""
-    # Initialize components
-    config = Config()
-    api_service = APIService(
-        base_url=config.API_BASE_URL,
-        headers=config.HEADERS,
-        bookie_map=config.BOOKIE_MAP
-    )
-    db = Database()
-    line_tracker = LineTracker(db)
+    config = service.config
+    api_service = service.api_service
+    db = service.db
+    line_tracker = service.line_tracker
     
     # Fetch and store events
     print("\nFetching events...")
-    events = api_service.fetch_events()
+    events = service.scheduler.fetch_events()
     
     if not events:
         print("No events found")
         return
         
     # Store events in database
-    for event_data in events.values():
-        db.save_event(event_data)
+    db.save_events(list(events.values()))
     
     # Print available events
     print("\nAvailable Events:")
@@ -69,7 +232,7 @@ def test_markets():
         lines = api_service.fetch_market_odds(market_type, market_id, [test_event_id])
         
         # Store lines in database
-        db.save_lines(lines)
+        db.save_lines(lines, lines.unchanged)
         
         # Display lines
         formatted = format_market_data(lines)
@@ -96,7 +259,7 @@ def test_markets():
     print("-" * 40)
     
     lines = api_service.fetch_market_odds('props', 102, [test_event_id])
-    db.save_lines(lines)
+    db.save_lines(lines, lines.unchanged)
     
     formatted = format_market_data(lines)
     for bookie, offerings in formatted.items():
@@ -106,50 +269,47 @@ def test_markets():
             
     return events, line_tracker
 
-def run_scheduler():
-    """Run the scheduler in a separate thread"""
-    config = Config()
-    api_service = APIService(
-        base_url=config.API_BASE_URL,
-        headers=config.HEADERS,
-        bookie_map=config.BOOKIE_MAP
-    )
-    db = Database()
-    line_tracker = LineTracker(db)
-    
-    scheduler = UpdateScheduler(api_service, db, line_tracker)
-    scheduler.start(interval_minutes=5)
-
 def main():
-    try:
-        # Test market functionality first
-        print("Testing market functionality...")
-        events, line_tracker = test_markets()
-        
-        print("\nStarting continuous updates...")
-        
-        # Start scheduler in a separate thread
-        scheduler_thread = threading.Thread(target=run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        # Keep the main thread alive and occasionally check movements
-        while True:
-            time.sleep(60)  # Check every minute
-            for event_id in events.keys():
-                movements = line_tracker.check_line_movements(event_id)
-                if movements:
-                    print("\nNew Line Movements Detected:")
-                    for move in movements:
-                        print(f"  {move['selection']}: {move['previous_odds']} → {move['current_odds']}")
-    
-    except KeyboardInterrupt:
-        print("\nStopping...")
-    except Exception as e:
-        print(f"Error in main: {e}")
-        raise
-    finally:
-        print("Exiting...")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', help="Poll continuously (the default)")
+    smoke = commands.add_parser('smoke', help="Fetch, store and print one event's markets")
+    for command in (run, smoke):
+        command.add_argument('--database', help="SQLAlchemy URL (default: Config.DATABASE_URL)")
+        command.add_argument('--season', type=int, default=Config.SEASON)
+        command.add_argument('--weeks', type=parse_weeks, default=list(Config.WEEKS), help="e.g. 17,18")
+    run.add_argument('--markets', type=parse_markets, help="Market IDs to poll, e.g. 1,3,102 (default: all)")
+    run.add_argument('--scheduler', choices=SCHEDULERS, default=Config.SCHEDULER)
+    run.add_argument('--interval', type=float, default=Config.POLL_INTERVAL_MINUTES,
+                     help="Minutes between cycles for the fixed scheduler")
+    run.add_argument('--workers', type=int, default=Config.INGEST_WORKERS,
+                     help="Fetch+parse processes; needs --scheduler fixed")
+    status = commands.add_parser('status', help="Print a running poller's status")
+    status.add_argument('--port', type=int, default=Config.METRICS_PORT)
+    
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in commands.choices and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv  # Bare options run the poller, as before there were subcommands
+    args = parser.parse_args(argv)
+    
+    if args.command == 'status':
+        with urlopen(f"http://127.0.0.1:{args.port}/status", timeout=5) as response:
+            print(json.dumps(json.load(response), indent=2))
+        return
+    
+    if args.command == 'smoke':
+        service = PollerService(args.database, season=args.season, weeks=args.weeks)
+        try:
+            test_markets(service)
+        finally:
+            service.close()
+        return
+    
+    if args.workers and args.scheduler != 'fixed':
+        parser.error(f"--workers needs --scheduler fixed, not {args.scheduler}")
+    service = PollerService(args.database, markets=args.markets, season=args.season, weeks=args.weeks,
+                            scheduler=args.scheduler, interval_minutes=args.interval, workers=args.workers)
+    sys.exit(service.run())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,240 @@
+# metrics.py
+"""Poller instrumentation: counters, gauges and histograms in Prometheus text format.
+
+Metrics live in a process-wide registry and are served on /metrics by
+start_metrics_server(), along with the service's /status as JSON when one is
+given. CycleProfiler dumps a cProfile of every Nth cycle.
+"""
+import cProfile
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    """A named metric with a fixed set of label names"""
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(key, value))
+        return '\n'.join(lines)
+
+    def _samples(self, key: Tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+    def drain(self) -> Dict[Tuple, object]:
+        """Every value recorded since the last drain, clearing them"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple, object]):
+        """Fold in values drained from the same metric in another process"""
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._combine(self._values.get(key), value)
+
+    def _combine(self, current, value):
+        return value
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _combine(self, current, value):
+        return (current or 0) + value
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _combine(self, current, value):
+        if current is None:
+            return value
+        return ([a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2])
+
+    def _samples(self, key: Tuple, value) -> list:
+        counts, total, count = value
+        buckets = list(zip(self.buckets, counts)) + [('+Inf', count)]
+        samples = []
+        for bound, bucket_count in buckets:
+            le = f'le="{bound}"'
+            samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+        samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def drain(self) -> Dict[str, Dict]:
+        """Values recorded since the last drain, by metric name, for merge() in another process"""
+        drained = {}
+        for metric in self.metrics:
+            values = metric.drain()
+            if values:
+                drained[metric.name] = values
+        return drained
+
+    def merge(self, drained: Dict[str, Dict]):
+        """Fold in drain() output; metrics this registry doesn't have are ignored"""
+        by_name = {metric.name: metric for metric in self.metrics}
+        for name, values in drained.items():
+            if name in by_name:
+                by_name[name].merge(values)
+
+    def render(self) -> str:
+        """Every metric in Prometheus text exposition format"""
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+REGISTRY = Registry()
+
+# Stages: fetch and parse are per market; save, detect, scan and archive per cycle (market_id="all")
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'poller_stage_seconds', 'Time spent in each stage of a polling cycle', ['stage', 'market_id']
+))
+CYCLE_SECONDS = REGISTRY.register(Histogram(
+    'poller_cycle_seconds', 'Duration of a whole polling cycle'
+))
+CYCLE_LAG_SECONDS = REGISTRY.register(Gauge(
+    'poller_cycle_lag_seconds', 'How far behind schedule the last cycle ran; negative is headroom'
+))
+POLL_INTERVAL_SECONDS = REGISTRY.register(Gauge(
+    'poller_poll_interval_seconds', 'Configured interval between fixed-interval cycles'
+))
+REQUESTS = REGISTRY.register(Counter(
+    'poller_requests_total', 'HTTP responses from the odds API', ['path', 'status']
+))
+LINES = REGISTRY.register(Counter(
+    'poller_lines_total', 'Lines by outcome: parsed, unchanged (skipped by hash) or saved', ['kind', 'market_id']
+))
+MOVEMENTS = REGISTRY.register(Counter(
+    'poller_movements_total', 'Significant line movements detected'
+))
+ERRORS = REGISTRY.register(Counter(
+    'poller_errors_total', 'Errors by stage', ['stage']
+))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = self.server.registry.render().encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/status' and self.server.status:
+            body = json.dumps(self.server.status(), default=str).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would drown out the poller's own output
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY,
+                         status: Callable[[], Dict] = None) -> ThreadingHTTPServer:
+    """Serve /metrics, and /status from the `status` callable, from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.registry = registry
+    server.status = status
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+class CycleProfiler:
+    """Dumps a cProfile of every `every`-th cycle into `directory`; every=0 disables it"""
+    def __init__(self, every: int = 0, directory: str = 'profiles'):
+        self.every = every
+        self.directory = directory
+        self.cycles = 0
+
+    @contextlib.contextmanager
+    def cycle(self):
+        self.cycles += 1
+        if not self.every or self.cycles % self.every:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"cycle_{self.cycles}_{datetime.utcnow():%Y%m%dT%H%M%S}.prof")
+            profiler.dump_stats(path)
+            print(f"Wrote cycle profile to {path}")
@@ -0,0 +1,279 @@
+# movement_bus.py
+"""In-process pub/sub for line movements, and a Server-Sent Events stream of it.
+
+The ingest path publishes movements as it detects them; consumers subscribe
+instead of re-scanning the database. Each subscriber gets a bounded queue:
+with overflow='drop_oldest' a slow subscriber loses its oldest movements
+(counted in poller_movements_dropped_total) and ingest never waits, with
+overflow='block' the publisher waits up to `block_timeout` for it first.
+
+start_movement_server() serves the bus on /movements as text/event-stream,
+and /movements/recent as JSON, for consumers in other processes (the
+dashboard); MovementFeed is the client side.
+"""
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+from metrics import REGISTRY, Counter, Gauge
+
+OVERFLOW_POLICIES = ('drop_oldest', 'block')
+
+SUBSCRIBERS = REGISTRY.register(Gauge(
+    'poller_movement_subscribers', 'Subscribers attached to the movement bus'
+))
+DROPPED = REGISTRY.register(Counter(
+    'poller_movements_dropped_total', 'Movements dropped because a subscriber fell behind'
+))
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+def encode_movement(movement: Dict) -> str:
+    return json.dumps(movement, default=_json_default)
+
+class Subscription:
+    """One subscriber's bounded queue of (seq, movement)"""
+    def __init__(self, bus: 'MovementBus', maxsize: int, overflow: str, event_ids=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflow = overflow
+        self.event_ids = set(event_ids) if event_ids else None  # None means every event
+        self.dropped = 0
+        self.closed = False
+
+    def wants(self, movement: Dict) -> bool:
+        return self.event_ids is None or movement['event_id'] in self.event_ids
+
+    def offer(self, item, block_timeout: float):
+        """Queue a movement, applying the overflow policy when full"""
+        if self.overflow == 'block':
+            try:
+                self.queue.put(item, timeout=block_timeout)
+                return
+            except queue.Full:
+                pass
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                    DROPPED.inc()
+                except queue.Empty:
+                    pass
+
+    def get_item(self, timeout: float = None) -> Optional[tuple]:
+        """Next (seq, movement), or None on timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get(self, timeout: float = None) -> Optional[Dict]:
+        """Next movement, or None on timeout"""
+        item = self.get_item(timeout)
+        return item[1] if item else None
+
+    def drain(self) -> List[Dict]:
+        """Every movement queued right now, without waiting"""
+        movements = []
+        while True:
+            try:
+                movements.append(self.queue.get_nowait()[1])
+            except queue.Empty:
+                return movements
+
+    def __iter__(self) -> Iterator[Dict]:
+        while not self.closed:
+            movement = self.get(timeout=1)
+            if movement is not None:
+                yield movement
+
+    def close(self):
+        self.closed = True
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class MovementBus:
+    """Fan-out of published movements to every subscriber, plus a ring
+    buffer of the most recent ones for late joiners"""
+    def __init__(self, history: int = 100, block_timeout: float = 1.0):
+        self.block_timeout = block_timeout
+        self._recent = deque(maxlen=history)  # (seq, movement)
+        self._subscribers = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxsize: int = 1000, overflow: str = 'drop_oldest', event_ids=None,
+                  after: int = None) -> Subscription:
+        """Attach a subscriber. With `after`, movements still in the ring
+        buffer with a higher sequence number are replayed first."""
+        subscription = Subscription(self, maxsize, overflow, event_ids)
+        with self._lock:
+            if after is not None:
+                for item in self._recent:
+                    if item[0] > after and subscription.wants(item[1]):
+                        subscription.offer(item, 0)
+            self._subscribers.append(subscription)
+            SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            SUBSCRIBERS.set(len(self._subscribers))
+
+    def publish(self, movements: List[Dict]):
+        """Deliver movements to every interested subscriber"""
+        if not movements:
+            return
+        with self._lock:
+            items = [(next(self._seq), movement) for movement in movements]
+            self._recent.extend(items)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for item in items:
+                if subscription.wants(item[1]):
+                    subscription.offer(item, self.block_timeout)
+
+    def recent(self, event_id: str = None) -> List[Dict]:
+        """Most recent movements, oldest first"""
+        with self._lock:
+            items = list(self._recent)
+        return [movement for _, movement in items if event_id is None or movement['event_id'] == event_id]
+
+class MovementStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        event_ids = params.get('event_id')
+        if url.path == '/movements':
+            self._stream(event_ids)
+        elif url.path == '/movements/recent':
+            movements = [movement for movement in self.server.bus.recent()
+                         if not event_ids or movement['event_id'] in event_ids]
+            body = f"[{','.join(encode_movement(movement) for movement in movements)}]".encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _stream(self, event_ids):
+        """Push each movement as an SSE message; resumes after Last-Event-ID"""
+        last_id = self.headers.get('Last-Event-ID')
+        after = int(last_id) if last_id and last_id.isdigit() else None
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        with self.server.bus.subscribe(self.server.queue_size, event_ids=event_ids, after=after) as subscription:
+            try:
+                self.wfile.write(b"retry: 2000\n\n")
+                self.wfile.flush()
+                while not self.server.stopping:
+                    item = subscription.get_item(timeout=self.server.heartbeat)
+                    if item is None:
+                        self.wfile.write(b": keepalive\n\n")  # Also detects disconnected clients
+                    else:
+                        seq, movement = item
+                        self.wfile.write(f"id: {seq}\nevent: movement\ndata: {encode_movement(movement)}\n\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_movement_server(bus: MovementBus, port: int, host: str = '127.0.0.1', queue_size: int = 1000,
+                          heartbeat: float = 15) -> ThreadingHTTPServer:
+    """Serve the bus on /movements (SSE) and /movements/recent from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), MovementStreamHandler)
+    server.daemon_threads = True
+    server.bus = bus
+    server.queue_size = queue_size
+    server.heartbeat = heartbeat
+    server.stopping = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Streaming movements on http://{host}:{server.server_address[1]}/movements")
+    return server
+
+def read_events(response) -> Iterator[tuple]:
+    """(id, event, data) for each message in an SSE response"""
+    fields = {}
+    for raw in response:
+        line = raw.decode().rstrip('\r\n')
+        if not line:
+            if 'data' in fields:
+                yield fields.get('id'), fields.get('event', 'message'), fields['data']
+            fields = {}
+        elif not line.startswith(':'):
+            name, _, value = line.partition(':')
+            fields[name] = value[1:] if value.startswith(' ') else value
+
+class MovementFeed:
+    """Client of a movement stream in another process. A daemon thread keeps
+    the last `history` movements, starting with those the server already
+    holds, reconnecting and resuming on errors."""
+    def __init__(self, url: str, history: int = 100, reconnect_seconds: float = 2):
+        self.url = url
+        self.reconnect_seconds = reconnect_seconds
+        self.connected = False
+        self._recent = deque(maxlen=history)
+        self._last_id = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='movement-feed', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # Resume after the last movement seen; on the first connect, 0
+                # replays everything still in the server's ring buffer
+                request = Request(self.url, headers={'Accept': 'text/event-stream',
+                                                     'Last-Event-ID': self._last_id or '0'})
+                with urlopen(request, timeout=60) as response:
+                    self.connected = True
+                    for event_id, event, data in read_events(response):
+                        if event != 'movement':
+                            continue
+                        with self._lock:
+                            self._recent.append(json.loads(data))
+                            self._last_id = event_id
+            except OSError:
+                pass
+            self.connected = False
+            time.sleep(self.reconnect_seconds)
+
+    def recent(self, event_id: str = None) -> List[Dict]:
+        with self._lock:
+            movements = list(self._recent)
+        return [movement for movement in movements if event_id is None or movement['event_id'] == event_id]
@@ -0,0 +1,91 @@
+# odds_analytics.py
+import numpy as np
+import pandas as pd
+from typing import List
+from database import Database
+
+BOARD_COLUMNS = ['event_id', 'market_id', 'market_type', 'bookie_id', 'player_name',
+                 'selection', 'line_value', 'odds', 'snapshot_id']
+
+# A priced market at one book: both sides of the same line for the same player
+BOOK_MARKET = ['event_id', 'market_id', 'bookie_id', 'player_name', 'pair_key']
+# The same side of the same line, compared across books
+SIDE = ['event_id', 'market_id', 'player_name', 'selection', 'line_value']
+
+def load_board(db: Database, event_ids: List[str] = None, bookie_map: dict = None) -> pd.DataFrame:
+    """Load the current board for the whole slate as a DataFrame"""
+    board = pd.DataFrame(db.get_current_board(event_ids), columns=BOARD_COLUMNS)
+    if bookie_map is not None:
+        board = board[board['bookie_id'].isin(list(bookie_map))]
+    return board.reset_index(drop=True)
+
+def implied_probability(odds) -> np.ndarray:
+    """Implied probability of American odds"""
+    odds = np.asarray(odds, dtype=float)
+    # np.where evaluates both branches; silence the one that doesn't apply
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(odds > 0, 100 / (odds + 100), -odds / (100 - odds))
+
+def decimal_odds(odds) -> np.ndarray:
+    """Decimal odds of American odds"""
+    odds = np.asarray(odds, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(odds > 0, 1 + odds / 100, 1 + 100 / -odds)
+
+def american_odds(probability) -> np.ndarray:
+    """American odds for a probability"""
+    probability = np.asarray(probability, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(
+            probability >= 0.5,
+            -100 * probability / (1 - probability),
+            100 * (1 - probability) / probability
+        )
+
+def pair_key(board: pd.DataFrame, spread_market_ids=(3,)) -> pd.Series:
+    """Key that is equal for the two opposing sides of the same line.
+    
+    Over/Under share their line value. Spread sides have opposite signs, so
+    one team's line is negated: A -3.5 pairs with B +3.5 but not B -3.5.
+    """
+    line_value = pd.to_numeric(board['line_value'], errors='coerce')
+    first_side = board.groupby(['event_id', 'market_id'])['selection'].transform('min')
+    sign = np.where(board['selection'] == first_side, 1, -1)
+    spread = board['market_id'].isin(list(spread_market_ids))
+    return line_value.where(~spread, line_value * sign).fillna(0)
+
+def analyze_board(board: pd.DataFrame, spread_market_ids=(3,)) -> pd.DataFrame:
+    """Add implied probability, per-book hold and no-vig fair odds to every line.
+    
+    Vig is removed proportionally across the opposing sides of each line
+    (see pair_key); markets where a book prices only one side get NaN.
+    """
+    board = board.copy()
+    board['line_value'] = pd.to_numeric(board['line_value'], errors='coerce')
+    board['pair_key'] = pair_key(board, spread_market_ids)
+    board['implied_prob'] = implied_probability(board['odds'])
+    board['decimal_odds'] = decimal_odds(board['odds'])
+    
+    grouped = board.groupby(BOOK_MARKET, dropna=False)
+    overround = grouped['implied_prob'].transform('sum')
+    sides = grouped['selection'].transform('nunique')
+    overround = overround.where(sides >= 2)
+    
+    board['hold'] = overround - 1
+    board['fair_prob'] = board['implied_prob'] / overround
+    board['fair_odds'] = american_odds(board['fair_prob']).round()
+    return board
+
+def best_prices(board: pd.DataFrame) -> pd.DataFrame:
+    """Best price for each side at each line value across books"""
+    if board.empty:
+        return board
+    if 'decimal_odds' not in board:
+        board = board.assign(decimal_odds=decimal_odds(board['odds']))
+    best = board.loc[board.groupby(SIDE, dropna=False)['decimal_odds'].idxmax()]
+    return best.reset_index(drop=True)
+
+def book_holds(analyzed: pd.DataFrame) -> pd.DataFrame:
+    """Average hold per book and market across the slate"""
+    markets = analyzed.drop_duplicates(BOOK_MARKET).dropna(subset=['hold'])
+    return markets.groupby(['bookie_id', 'market_id'])['hold'].agg(['mean', 'count']).reset_index()
@@ -0,0 +1,60 @@
+# query_plans.py
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List
+from config import Config
+from database import Database
+
+# Tables that must always be reached through an index on the hot paths
+INDEXED_TABLES = ('betting_lines', 'snapshots', 'line_movements', 'players', 'selections', 'markets')
+
+def hot_queries(db: Database, session) -> Dict:
+    """Build the hot read queries with representative parameters"""
+    since = datetime.utcnow() - timedelta(hours=1)
+    return {
+        'get_line_history': db._line_history_query(session, '1', 1, since),
+        'get_line_history (selection)': db._line_history_query(session, '1', 1, since, selection='Over'),
+        'get_market_ids': db._market_ids_query(session, '1'),
+        'get_latest_snapshot_id': db._latest_snapshot_query(session, '1', 1),
+        'get_baseline_snapshot_id': db._baseline_snapshot_query(session, '1', 1, since),
+        'get_snapshot_lines': db._snapshot_lines_query(session, '1', 1, 1),
+        # Unfiltered, the board reads every market ever stored; callers pass the slate
+        'get_current_board': db._current_board_query(['1', '2']),
+        'get_line_history_buckets': db._line_history_buckets_query('1', 1, since, since + timedelta(hours=1), 60),
+        'get_line_history_buckets (player)': db._line_history_buckets_query(
+            '1', 1, since, since + timedelta(hours=1), 60, selection='Over', player_name='Player'),
+        'get_player_lines': db._player_lines_query(session, 'Player', since=since),
+        'get_player_lines (upstream ID, market)': db._player_lines_query(session, upstream_id='1', market_id=1,
+                                                                         since=since),
+        'get_movements': db._movements_query(session, since=since),
+        'get_movements (event, market)': db._movements_query(session, '1', 1, since=since),
+        'get_movements (bookie)': db._movements_query(session, bookie_id=1, cursor=(since, 1)),
+        'get_movements (player)': db._movements_query(session, player_name='Player'),
+        'get_movements (event, magnitude)': db._movements_query(session, '1', order_by='magnitude'),
+    }
+
+def check_query_plans(db: Database) -> List[str]:
+    """Return a description of every hot query whose plan scans a table"""
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    
+    problems = []
+    with db.SessionLocal() as session:
+        for name, query in hot_queries(db, session).items():
+            for detail in db.explain_query_plan(query):
+                if any(detail.startswith(f"SCAN {table}") for table in INDEXED_TABLES):
+                    problems.append(f"{name}: {detail}")
+    return problems
+
+def main():
+    database_url = sys.argv[1] if len(sys.argv) > 1 else Config.DATABASE_URL
+    problems = check_query_plans(Database(database_url))
+    if problems:
+        print("Hot queries regressed to table scans:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("All hot queries use indexes.")
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,423 @@
 # scheduler.py
+import asyncio
+import heapq
+import itertools
 import schedule
+import threading
 import time
-from datetime import datetime
-from api_service import APIService
-from database import Database
+from datetime import datetime, timezone
+from config import Config
+from api_service import APIService, BaseAPIService, LineBatch
+from arb_scanner import ArbScanner
+from async_api_service import AsyncAPIService
+from database import Database, FINISHED_STATUSES
+from fetch_planner import FetchPlanner
+from line_archive import LineArchive
 from line_tracker import LineTracker
-from typing import List, Dict
+from movement_bus import MovementBus
+from metrics import (CYCLE_LAG_SECONDS, CYCLE_SECONDS, ERRORS, LINES, MOVEMENTS,
+                     POLL_INTERVAL_SECONDS, STAGE_SECONDS, CycleProfiler)
+from typing import List, Dict, Tuple
 
 class UpdateScheduler:
-    def __init__(self, api_service: APIService, db: Database, line_tracker: LineTracker):
+    def __init__(self, api_service: APIService, db: Database, line_tracker: LineTracker,
+                 markets: List[Tuple[str, int]] = None, async_api_service: AsyncAPIService = None,
+                 archive: LineArchive = None, movement_bus: MovementBus = None,
+                 season: int = None, weeks: List[int] = None):
         self.api_service = api_service
+        self.async_api_service = async_api_service
         self.db = db
         self.line_tracker = line_tracker
-        self.movements = []  # Store recent movements
+        self.planner = FetchPlanner(
+            api_service,
+            Config.MARKET_CONFIG,
+            max_events_per_request=Config.MAX_EVENTS_PER_REQUEST
+        )
+        self.async_planner = FetchPlanner(
+            async_api_service,
+            Config.MARKET_CONFIG,
+            max_events_per_request=Config.MAX_EVENTS_PER_REQUEST
+        ) if async_api_service else None
+        self.markets = markets or self.planner.markets()
+        self.arb_scanner = ArbScanner(db, Config.BOOKIE_MAP, Config.MARKET_CONFIG)
+        self.movement_bus = movement_bus or MovementBus(Config.MOVEMENT_HISTORY)
+        self.opportunities = {}  # Latest arbitrages and middles
+        self.interval_seconds = None  # Set by start()
+        self.profiler = CycleProfiler(Config.PROFILE_EVERY_N_CYCLES, Config.PROFILE_DIR)
+        self.archive = archive  # Exports finished events and compacts the DB between cycles
+        self._next_archive = 0
+        self.season = season or Config.SEASON
+        self.weeks = list(weeks or Config.WEEKS)  # Every week's events are polled together
+        
+        # Set by stop(); loops finish the cycle in flight, then return
+        self.stopping = threading.Event()
+        self._schedule = schedule.Scheduler()
+        self.state = 'idle'
+        self.cycles = 0
+        self.last_cycle_at = None
+        self.last_cycle_seconds = None
+        self.lag_seconds = None
         
     def update_markets(self):
         """Update all markets and check for movements"""
+        start = time.perf_counter()
+        self.state = 'polling'
+        with self.profiler.cycle():
+            if self.async_api_service:
+                asyncio.run(self.update_markets_async())
+            else:
+                self.update_markets_sync()
+        self._report_hit_rates()
+        
+        duration = time.perf_counter() - start
+        self._record_cycle(duration, duration - self.interval_seconds if self.interval_seconds else None)
+        self.archive_due()
+        if not self.stopping.is_set():  # stop() during the cycle leaves it 'draining'
+            self.state = 'idle'
+    
+    def _record_cycle(self, duration: float, lag: float = None):
+        """Publish a finished cycle's duration and lag to metrics and status()"""
+        CYCLE_SECONDS.observe(duration)
+        if lag is not None:
+            CYCLE_LAG_SECONDS.set(lag)
+        self.cycles += 1
+        self.last_cycle_at = datetime.utcnow()
+        self.last_cycle_seconds = duration
+        self.lag_seconds = lag
+    
+    def fetch_events(self) -> Dict[str, Dict]:
+        """Events of every polled week"""
+        events = {}
+        for week in self.weeks:
+            events.update(self.api_service.fetch_events(week=week, season=self.season))
+        return events
+    
+    async def fetch_events_async(self) -> Dict[str, Dict]:
+        events = {}
+        for week_events in await asyncio.gather(*[
+            self.async_api_service.fetch_events(week=week, season=self.season) for week in self.weeks
+        ]):
+            events.update(week_events)
+        return events
+    
+    def update_markets_sync(self):
+        """Run a whole polling cycle through the blocking API service"""
         try:
             print(f"\nUpdating markets at {datetime.now()}")
             
             # Fetch and store events
-            events = self.api_service.fetch_events()
-            for event_data in events.values():
-                self.db.save_event(event_data)
+            events = self.fetch_events()
+            self.db.save_events(list(events.values()))
+            self._forget_finished(events)
+            
+            # Fetch every market for the whole slate in batched requests
+            event_ids = list(events.keys())
+            results = self.planner.execute(event_ids, self.markets)
+            self._process_results(results)
+            self._scan_opportunities(event_ids)
+        
+        except Exception as e:
+            ERRORS.inc(stage='cycle')
+            print(f"Error in update: {e}")
+    
+    async def update_markets_async(self):
+        """Run a whole polling cycle concurrently through the async API service"""
+        try:
+            print(f"\nUpdating markets at {datetime.now()}")
             
-            for event_id in events.keys():
-                # Update game lines
-                for market_type, market_id in [
-                    ('game_lines', 1),  # Moneyline
-                    ('game_lines', 2),  # Total
-                    ('game_lines', 3),  # Spread
-                    ('props', 102),     # Passing TDs
-                    ('props', 103),     # Passing Yards
-                    # Add other markets as needed
-                ]:
-                    lines = self.api_service.fetch_market_odds(
-                        market_type, market_id, [event_id]
-                    )
-                    if lines:
-                        self.db.save_lines(lines)
+            async with self.async_api_service:
+                events = await self.fetch_events_async()
+                self.db.save_events(list(events.values()))
+                self._forget_finished(events)
                 
-                # Check for movements
-                new_movements = self.line_tracker.check_line_movements(event_id)
-                if new_movements:
-                    print(f"\nFound {len(new_movements)} significant line movements!")
-                    self.movements.extend(new_movements)
-                    # Keep only recent movements (last 100)
-                    self.movements = self.movements[-100:]
+                event_ids = list(events.keys())
+                results = await self.async_planner.execute_async(event_ids, self.markets)
+            
+            self._process_results(results)
+            self._scan_opportunities(event_ids)
         
         except Exception as e:
+            ERRORS.inc(stage='cycle')
             print(f"Error in update: {e}")
     
+    def _process_results(self, results: Dict[int, Dict[str, LineBatch]]):
+        """Detect movements in fetched lines, then save them.
+        
+        Offers the API skipped as unchanged can't have moved, so they bypass
+        movement detection and are only carried forward on the board.
+        """
+        lines = []
+        unchanged = []
+        for lines_by_event in results.values():
+            for event_lines in lines_by_event.values():
+                lines.extend(event_lines)
+                unchanged.extend(event_lines.unchanged)
+        if not lines and not unchanged:
+            return
+        
+        # Diff against the last known prices before the new board is saved
+        with STAGE_SECONDS.time(stage='detect', market_id='all'):
+            new_movements = self.line_tracker.detect_movements(lines) if lines else []
+        
+        # Persist the whole cycle's lines and movements in a single transaction
+        try:
+            with STAGE_SECONDS.time(stage='save', market_id='all'):
+                saved = self.db.save_lines(lines, unchanged, new_movements)
+        except Exception:
+            ERRORS.inc(stage='save')
+            # Nothing was saved, so nothing may be skipped as unchanged next
+            # cycle, and the same moves must be detected again
+            self.line_tracker.rollback()
+            self._reset_hashes()
+            raise
+        self.line_tracker.commit()
+        LINES.inc(saved, kind='saved', market_id='all')
+        MOVEMENTS.inc(len(new_movements))
+        
+        if new_movements:
+            print(f"\nFound {len(new_movements)} significant line movements!")
+            # Published once saved, so subscribers reading the board see the new prices
+            self.movement_bus.publish(new_movements)
+    
+    def archive_due(self):
+        """Export finished events and compact the DB if ARCHIVE_INTERVAL_SECONDS have passed"""
+        if not self.archive or time.monotonic() < self._next_archive:
+            return
+        self._next_archive = time.monotonic() + Config.ARCHIVE_INTERVAL_SECONDS
+        try:
+            with STAGE_SECONDS.time(stage='archive', market_id='all'):
+                self.archive.run(Config.ARCHIVE_RETENTION_DAYS)
+        except Exception as e:
+            ERRORS.inc(stage='archive')
+            print(f"Error archiving lines: {e}")
+    
+    def _fetching_service(self) -> BaseAPIService:
+        return self.async_api_service or self.api_service
+    
+    def _reset_hashes(self):
+        self._fetching_service().reset_hashes()
+    
+    def _report_hit_rates(self):
+        """Print how much fetch, parse and save work unchanged payloads saved this cycle"""
+        api_service = self._fetching_service()
+        rates = api_service.hit_rates()
+        stats = api_service.stats
+        print(f"Unchanged: {rates['not_modified']:.0%} of {stats['requests']} requests (304), "
+              f"{rates['books_unchanged']:.0%} of {stats['books']} book offers (hash)")
+        api_service.reset_stats()
+    
+    def _scan_opportunities(self, event_ids: List[str]):
+        """Scan the fresh board for arbitrages and middles"""
+        with STAGE_SECONDS.time(stage='scan', market_id='all'):
+            self.opportunities = self.arb_scanner.scan(event_ids)
+        arbitrages = self.opportunities['arbitrages']
+        if not arbitrages.empty:
+            print(f"\nFound arbitrage with {arbitrages['edge'].max():.2%} edge!")
+    
+    def _forget_finished(self, events: Dict[str, Dict]):
+        """Stop tracking prices for events that have finished"""
+        for event_id, event_data in events.items():
+            if event_data['status'] in FINISHED_STATUSES:
+                self.line_tracker.forget_event(event_id)
+    
     def start(self, interval_minutes: int = 5):
-        """Start the scheduler"""
+        """Run the scheduler until stop() is called"""
         print(f"Starting scheduler with {interval_minutes} minute interval")
+        self.interval_seconds = interval_minutes * 60
+        POLL_INTERVAL_SECONDS.set(self.interval_seconds)
         
         # Run initial update
         self.update_markets()
         
         # Schedule regular updates
-        schedule.every(interval_minutes).minutes.do(self.update_markets)
+        self._schedule.every(interval_minutes).minutes.do(self.update_markets)
         
         # Run the scheduler
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        while not self.stopping.is_set():
+            self._schedule.run_pending()
+            self.stopping.wait(1)
+        self._schedule.clear()
+    
+    def stop(self):
+        """Ask start() to return once the cycle in flight has finished; safe from a signal handler"""
+        self.state = 'draining'
+        self.stopping.set()
+    
+    def close(self):
+        """Release anything start() left running"""
+        self.state = 'stopped'
+    
+    def status(self) -> Dict:
+        """Where the scheduler is and how far behind it's running"""
+        return {
+            'scheduler': type(self).__name__,
+            'state': self.state,
+            'cycles': self.cycles,
+            'last_cycle_at': self.last_cycle_at.isoformat(timespec='seconds') + 'Z' if self.last_cycle_at else None,
+            'last_cycle_seconds': round(self.last_cycle_seconds, 3) if self.last_cycle_seconds is not None else None,
+            'lag_seconds': round(self.lag_seconds, 3) if self.lag_seconds is not None else None,
+            'interval_seconds': self.interval_seconds,
+            'season': self.season,
+            'weeks': self.weeks,
+            'markets': len(self.markets)
+        }
+    
+    def get_recent_movements(self, **filters) -> List[Dict]:
+        """Get recent line movements; with filters (see Database.get_movements) they come from the database"""
+        if not filters:
+            return self.movement_bus.recent()
+        movements, _ = self.db.get_movements(**filters)
+        return movements
+    
+    def get_opportunities(self) -> Dict:
+        """Get arbitrages and middles from the latest cycle"""
+        return self.opportunities
+
+
+class AdaptiveScheduler(UpdateScheduler):
+    """Polls each (event, market) on its own clock instead of a fixed interval.
+
+    Jobs sit in a priority queue keyed by next poll time. Each job's interval
+    comes from Config.ADAPTIVE_POLL_TIERS by time to kickoff and is shortened
+    when the tracker has recently seen significant moves in that market.
+    Finished events drop out of the queue.
+    """
+    def __init__(self, api_service: APIService, db: Database, line_tracker: LineTracker,
+                 markets: List[Tuple[str, int]] = None, async_api_service: AsyncAPIService = None,
+                 archive: LineArchive = None, movement_bus: MovementBus = None,
+                 season: int = None, weeks: List[int] = None):
+        super().__init__(api_service, db, line_tracker, markets=markets, async_api_service=async_api_service,
+                         archive=archive, movement_bus=movement_bus, season=season, weeks=weeks)
+        self.events = {}
+        self.jobs = []  # Heap of (next_poll, seq, event_id, market_type, market_id)
+        self._queued = set()
+        self._seq = itertools.count()
+        self._next_event_refresh = 0
+    
+    def poll_interval(self, event_id: str, market_id: int) -> float:
+        """Seconds until a market should be polled again, or None once the event is finished"""
+        event = self.events.get(event_id)
+        if not event or event['status'] in FINISHED_STATUSES:
+            return None
+        
+        kickoff = datetime.fromisoformat(event['scheduled'].replace('Z', '+00:00'))
+        if kickoff.tzinfo is None:
+            kickoff = kickoff.replace(tzinfo=timezone.utc)
+        hours_to_kickoff = (kickoff - datetime.now(timezone.utc)).total_seconds() / 3600
+        
+        interval = Config.ADAPTIVE_POLL_MAX_INTERVAL
+        for max_hours, tier_interval in Config.ADAPTIVE_POLL_TIERS:
+            if hours_to_kickoff <= max_hours:
+                interval = tier_interval
+                break
+        
+        # Volatile markets are polled proportionally faster
+        interval /= 1 + self.line_tracker.volatility(event_id, market_id)
+        return max(Config.ADAPTIVE_POLL_MIN_INTERVAL, interval)
+    
+    def refresh_events(self):
+        """Re-fetch events and queue a job for every market of any new event"""
+        events = self.fetch_events()
+        if not events:
+            return
+        self.events = events
+        self.db.save_events(list(events.values()))
+        self._forget_finished(events)
+        
+        now = time.monotonic()
+        for event_id, event_data in events.items():
+            if event_data['status'] in FINISHED_STATUSES:
+                continue
+            for market_type, market_id in self.markets:
+                if (event_id, market_id) not in self._queued:
+                    self._queued.add((event_id, market_id))
+                    heapq.heappush(self.jobs, (now, next(self._seq), event_id, market_type, market_id))
+    
+    def run_pending(self):
+        """Poll every job that is due, batched per market, then reschedule it"""
+        now = time.monotonic()
+        if now >= self._next_event_refresh:
+            self._next_event_refresh = now + Config.EVENT_REFRESH_SECONDS
+            try:
+                self.refresh_events()
+            except Exception as e:
+                ERRORS.inc(stage='events')
+                print(f"Error refreshing events: {e}")
+                # Jobs already queued keep polling; retry the refresh soon
+                self._next_event_refresh = now + Config.ADAPTIVE_POLL_MIN_INTERVAL
+            now = time.monotonic()
+        
+        due = {}
+        lag = 0.0
+        while self.jobs and self.jobs[0][0] <= now:
+            next_poll, _, event_id, market_type, market_id = heapq.heappop(self.jobs)
+            lag = max(lag, now - next_poll)
+            if self.poll_interval(event_id, market_id) is None:
+                # Finished or no longer listed
+                self._queued.discard((event_id, market_id))
+                continue
+            due.setdefault((market_type, market_id), []).append(event_id)
+        if not due:
+            return
+        
+        start = time.perf_counter()
+        self.state = 'polling'
+        with self.profiler.cycle():
+            try:
+                results = self._fetch_due(due)
+                self._process_results(results)
+                self._scan_opportunities(list(self.events.keys()))
+            except Exception as e:
+                ERRORS.inc(stage='cycle')
+                print(f"Error in update: {e}")
+        self._report_hit_rates()
+        # Lag here is how late the most overdue job was picked up
+        self._record_cycle(time.perf_counter() - start, lag)
+        self.archive_due()
+        if not self.stopping.is_set():
+            self.state = 'idle'
+        
+        # Reschedule after processing so volatility reflects this poll
+        now = time.monotonic()
+        for (market_type, market_id), event_ids in due.items():
+            for event_id in event_ids:
+                interval = self.poll_interval(event_id, market_id)
+                if interval is None:
+                    self._queued.discard((event_id, market_id))
+                    continue
+                heapq.heappush(self.jobs, (now + interval, next(self._seq), event_id, market_type, market_id))
+    
+    def _fetch_due(self, due: Dict[Tuple[str, int], List[str]]) -> Dict[int, Dict[str, LineBatch]]:
+        """Fetch every due market, joining its due events into batched requests"""
+        if self.async_api_service:
+            return asyncio.run(self._fetch_due_async(due))
+        
+        results = {}
+        for (market_type, market_id), event_ids in due.items():
+            results.update(self.planner.execute(event_ids, [(market_type, market_id)]))
+        return results
+    
+    async def _fetch_due_async(self, due: Dict[Tuple[str, int], List[str]]) -> Dict[int, Dict[str, LineBatch]]:
+        async with self.async_api_service:
+            batches = await asyncio.gather(*[
+                self.async_planner.execute_async(event_ids, [(market_type, market_id)])
+                for (market_type, market_id), event_ids in due.items()
+            ])
+        results = {}
+        for batch in batches:
+            results.update(batch)
+        return results
+    
+    def start(self, interval_minutes: int = None):
+        """Run the scheduler until stop() is called; interval_minutes is ignored, each job sets its own"""
+        print("Starting adaptive scheduler")
+        while not self.stopping.is_set():
+            self.run_pending()
+            self.stopping.wait(1)
     
-    def get_recent_movements(self) -> List[Dict]:
-        """Get recent line movements"""
-        return self.movements
+    def status(self) -> Dict:
+        status = super().status()
+        status['jobs'] = len(self.jobs)
+        if self.jobs:
+            status['next_poll_in_seconds'] = round(max(0.0, self.jobs[0][0] - time.monotonic()), 1)
+        return status
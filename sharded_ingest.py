@@ -0,0 +1,190 @@
+# sharded_ingest.py
+"""Multi-process ingest: fetch+parse sharded across worker processes, one DB writer.
+
+Each shard (a market, or a fixed group of events) is pinned to one
+single-process pool, so a worker sees the same offers every cycle and its
+ETag and offer-hash caches stay effective. Parsed batches are queued to a
+single writer thread that runs movement detection and save_lines, matching
+SQLite's one-writer model, while workers are already parsing the next shards.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from api_service import APIService, LineBatch
+from database import Database
+from line_archive import LineArchive
+from line_tracker import LineTracker
+from metrics import ERRORS, REGISTRY, STAGE_SECONDS
+from movement_bus import MovementBus
+from scheduler import UpdateScheduler
+
+SHARD_MODES = ('market', 'event')
+
+_worker_api = None  # Per-process APIService, created by _init_worker
+
+def _init_worker(api_kwargs: Dict):
+    global _worker_api
+    _worker_api = APIService(**api_kwargs)
+
+def _fetch_shard(market_type: str, market_id: int, event_ids: List[str]) -> Tuple[LineBatch, Dict, Dict, float]:
+    """Fetch and parse one request's worth of offers in a worker process.
+
+    Returns the lines, the APIService stats and the metrics recorded doing
+    it, both as deltas for the parent to add to its own, and the time taken.
+    """
+    start = time.perf_counter()
+    lines = _worker_api.fetch_market_odds(market_type, market_id, event_ids)
+    stats = dict(_worker_api.stats)
+    _worker_api.reset_stats()
+    return lines, stats, REGISTRY.drain(), time.perf_counter() - start
+
+def _reset_worker_hashes():
+    _worker_api.reset_hashes()
+
+def shard_of(key, shards: int) -> int:
+    """Stable shard for a market ID or event ID; hash() is salted per process"""
+    return zlib.crc32(str(key).encode()) % shards
+
+class ShardedScheduler(UpdateScheduler):
+    """Fixed-interval scheduler whose fetch+parse runs on a pool of processes.
+
+    `shard_by` is 'market' (each market pinned to a worker) or 'event' (each
+    event pinned to a worker, so every market for it is fetched there).
+    Call close() to stop the workers and the writer thread.
+    """
+    def __init__(self, api_service: APIService, db: Database, line_tracker: LineTracker,
+                 markets: List[Tuple[str, int]] = None, workers: int = None, shard_by: str = 'market',
+                 queue_size: int = 64, archive: LineArchive = None, movement_bus: MovementBus = None,
+                 season: int = None, weeks: List[int] = None):
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        super().__init__(api_service, db, line_tracker, markets=markets, archive=archive,
+                         movement_bus=movement_bus, season=season, weeks=weeks)
+        self.shard_by = shard_by
+        self.workers = workers or multiprocessing.cpu_count()
+
+        # Spawned rather than forked: the parent runs writer and metrics threads
+        context = multiprocessing.get_context('spawn')
+        api_kwargs = {
+            'base_url': api_service.base_url,
+            'headers': api_service.headers,
+            'bookie_map': api_service.bookie_map,
+            'page_limit': api_service.page_limit,
+            'timeout': api_service.timeout,
+            'skip_unchanged': api_service.skip_unchanged
+        }
+        self.pools = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_worker, initargs=(api_kwargs,))
+            for _ in range(self.workers)
+        ]
+
+        # Bounded, so workers outpacing the writer block instead of piling up batches
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self._write_errors = []
+        self._writer = threading.Thread(target=self._write_loop, name='line-writer', daemon=True)
+        self._writer.start()
+
+    def update_markets_sync(self):
+        """Run a polling cycle: events in-process, offers across the worker pool"""
+        try:
+            print(f"\nUpdating markets at {datetime.now()}")
+
+            events = self.fetch_events()
+            self.db.save_events(list(events.values()))
+            self._forget_finished(events)
+
+            event_ids = list(events.keys())
+            self.ingest(event_ids, self.markets)
+            self._scan_opportunities(event_ids)
+
+        except Exception as e:
+            ERRORS.inc(stage='cycle')
+            print(f"Error in update: {e}")
+
+    def ingest(self, event_ids: List[str], markets: List[Tuple[str, int]] = None):
+        """Fetch and parse every shard on the pool and save each batch as it lands"""
+        futures = {}
+        for market_type, market_id, chunk in self.plan(event_ids, markets):
+            key = market_id if self.shard_by == 'market' else chunk[0]
+            pool = self.pools[shard_of(key, self.workers)]
+            futures[pool.submit(_fetch_shard, market_type, market_id, chunk)] = market_id
+
+        for future in as_completed(futures):
+            market_id = futures[future]
+            lines, stats, metrics, elapsed = future.result()
+            STAGE_SECONDS.observe(elapsed, stage='fetch_parse', market_id=market_id)
+            REGISTRY.merge(metrics)
+            for name, value in stats.items():
+                self.api_service.stats[name] += value
+
+            results = {}
+            self.planner._fan_out(results, market_id, lines)
+            self.write_queue.put(results)
+
+        # Wait for the writer so the cycle's scan sees every batch
+        self.write_queue.join()
+        if self._write_errors:
+            errors, self._write_errors = self._write_errors, []
+            raise errors[0]
+
+    def plan(self, event_ids: List[str], markets: List[Tuple[str, int]] = None) -> List[Tuple[str, int, List[str]]]:
+        """Request batches; when sharding by event, no request spans two shards"""
+        if self.shard_by == 'market':
+            return self.planner.plan(event_ids, markets)
+
+        groups = {}
+        for event_id in event_ids:
+            groups.setdefault(shard_of(event_id, self.workers), []).append(event_id)
+        return [batch for group in groups.values() for batch in self.planner.plan(group, markets)]
+
+    def _write_loop(self):
+        """The only thread that writes lines. Batches already waiting in the
+        queue are merged so they're saved in one transaction."""
+        while True:
+            batches = [self.write_queue.get()]
+            while len(batches) < self.write_queue.maxsize:
+                try:
+                    batches.append(self.write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            results = {}
+            for batch in batches:
+                # Shards never share an (event, market), so merging can't clobber lines
+                for market_id, lines_by_event in (batch or {}).items():
+                    results.setdefault(market_id, {}).update(lines_by_event)
+            try:
+                self._process_results(results)
+            except Exception as e:
+                print(f"Error writing lines: {e}")
+                self._write_errors.append(e)
+            finally:
+                for _ in batches:
+                    self.write_queue.task_done()
+            if None in batches:
+                return
+
+    def _reset_hashes(self):
+        """Unsaved lines were parsed in the workers, so their caches are dropped too"""
+        super()._reset_hashes()
+        for pool in self.pools:
+            pool.submit(_reset_worker_hashes).result()
+
+    def status(self) -> Dict:
+        status = super().status()
+        status.update(workers=self.workers, shard_by=self.shard_by, write_queue=self.write_queue.qsize())
+        return status
+
+    def close(self):
+        """Stop the writer after it drains, then the worker processes"""
+        self.write_queue.put(None)
+        self._writer.join()
+        for pool in self.pools:
+            pool.shutdown()
+        super().close()
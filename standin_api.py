@@ -0,0 +1,321 @@
+# standin_api.py
+"""Local stand-in for the odds API, for offline testing and load tests.
+
+Record fixtures from the live API, then serve them (or a synthetic slate)
+on /events and /offers with the same pagination and ETags as upstream:
+
+    python standin_api.py record fixtures/week18 --cycles 5 --interval 60
+    python standin_api.py serve --fixtures fixtures/week18
+    python standin_api.py serve --events 16 --scale 10 --drift 0.05
+
+Point the app at it by setting BETTING_API_BASE_URL, e.g.
+
+    BETTING_API_BASE_URL=http://127.0.0.1:8000 python main.py
+"""
+import argparse
+import glob
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from api_service import APIService, dumps, loads
+from config import Config
+from fetch_planner import FetchPlanner
+
+# Typical prop line per market, so synthetic props look plausible
+PROP_LINES = {102: 1.5, 103: 245.5, 333: 34.5, 100: 22.5, 101: 0.5, 106: 14.5,
+              107: 55.5, 104: 4.5, 105: 50.5, 253: 15.5}
+
+def encode(data) -> bytes:
+    body = dumps(data)
+    return body if isinstance(body, bytes) else body.encode()
+
+class FixtureSlate:
+    """Replays recorded cycles, advancing one cycle every `tick` seconds and
+    holding on the last one"""
+    def __init__(self, path: str, tick: float = 60):
+        self.tick = tick
+        with open(os.path.join(path, 'events.json'), 'rb') as f:
+            self._events = loads(f.read())['events']
+        self._cycles = []
+        for cycle_dir in sorted(glob.glob(os.path.join(path, 'cycle_*'))):
+            offers = {}
+            for market_file in glob.glob(os.path.join(cycle_dir, 'market_*.json')):
+                market_id = int(os.path.basename(market_file)[len('market_'):-len('.json')])
+                with open(market_file, 'rb') as f:
+                    offers[market_id] = loads(f.read())['offers']
+            self._cycles.append(offers)
+        if not self._cycles:
+            raise ValueError(f"No recorded cycles in {path}")
+        self._started = time.monotonic()
+
+    def events(self) -> List[Dict]:
+        return self._events
+
+    def offers(self, market_id: int) -> List[Dict]:
+        cycle = int((time.monotonic() - self._started) // self.tick)
+        return self._cycles[min(cycle, len(self._cycles) - 1)].get(market_id, [])
+
+class SyntheticSlate:
+    """Generates a slate of events whose odds drift over time.
+
+    Every `tick` seconds each price moves with probability `drift`, and one in
+    five of those moves also shifts the line. Between ticks payloads are
+    identical, like the real feed between updates. Prices are generated
+    lazily per (event, market) from `seed`, so large slates start instantly.
+    """
+    def __init__(self, events: int = 16, players: int = 8, markets: Dict = None, bookie_ids: List[int] = None,
+                 drift: float = 0.05, tick: float = 30, seed: int = 0):
+        self.players = players
+        self.markets = markets or Config.MARKET_CONFIG
+        self.bookie_ids = bookie_ids or list(Config.BOOKIE_MAP)
+        self.drift = drift
+        self.tick = tick
+        self.seed = seed
+        self._started = time.monotonic()
+        self._prices = {}  # (event_id, market_id) -> (tick, {offer_key: {bookie_id: price}})
+        self._lock = threading.Lock()
+
+        # Kickoffs spread over the coming week so every poll tier is exercised
+        now = datetime.utcnow()
+        self._events = [{
+            'id': 10000 + i,
+            'participants': [{'name': f"Away {i}"}, {'name': f"Home {i}"}],
+            'scheduled': (now + timedelta(hours=1 + 168 * i / max(events, 1))).isoformat(timespec='seconds') + 'Z',
+            'status': 'scheduled'
+        } for i in range(events)]
+        self._spreads = {self.markets['game_lines']['spread']}
+        self._totals = {self.markets['game_lines']['total']}
+        self._moneylines = {self.markets['game_lines']['moneyline']}
+
+    def events(self) -> List[Dict]:
+        return self._events
+
+    def offers(self, market_id: int, tick: int = None) -> List[Dict]:
+        """Every offer for a market, as of `tick` (default: the current tick)"""
+        if tick is None:
+            tick = int((time.monotonic() - self._started) // self.tick)
+        offers = []
+        with self._lock:
+            for event in self._events:
+                offers.extend(self._event_offers(event, market_id, tick))
+        return offers
+
+    def _event_offers(self, event: Dict, market_id: int, tick: int) -> List[Dict]:
+        key = (event['id'], market_id)
+        if key not in self._prices:
+            self._prices[key] = (tick, self._initial_prices(event, market_id))
+        last_tick, prices = self._prices[key]
+        if tick > last_tick:
+            rng = random.Random(hash((self.seed, key, tick)))
+            # Catch up at most a few ticks for markets nobody polled in a while
+            for _ in range(min(tick - last_tick, 5)):
+                self._move(prices, market_id, rng)
+            self._prices[key] = (tick, prices)
+        return [self._render(event, market_id, offer_key, books) for offer_key, books in prices.items()]
+
+    def _initial_prices(self, event: Dict, market_id: int) -> Dict:
+        rng = random.Random(hash((self.seed, event['id'], market_id)))
+        if market_id in self._moneylines:
+            favourite = rng.choice([-110, -130, -150, -200, -280])
+            underdog = -favourite - 20 if favourite <= -120 else -110
+            return {None: {book: {'line': None, 'costs': {'away': favourite + rng.choice([-5, 0, 5]),
+                                                          'home': underdog}}
+                           for book in self.bookie_ids}}
+        if market_id in self._spreads:
+            spread = rng.choice([1.5, 2.5, 3.5, 6.5, 7.5, 10.5])
+            return {None: {book: {'line': spread + rng.choice([-0.5, 0, 0.5]), 'costs': {'away': -110, 'home': -110}}
+                           for book in self.bookie_ids}}
+        if market_id in self._totals:
+            total = rng.choice([38.5, 41.5, 44.5, 47.5, 51.5])
+            return {None: {book: {'line': total + rng.choice([-0.5, 0, 0.5]), 'costs': {'Over': -110, 'Under': -110}}
+                           for book in self.bookie_ids}}
+
+        base = PROP_LINES.get(market_id, 10.5)
+        return {
+            player: {book: {'line': base + rng.choice([-1, 0, 0, 1]),
+                            'costs': {'Over': rng.choice([-120, -115, -110]), 'Under': rng.choice([-110, -105, 100])}}
+                     for book in self.bookie_ids}
+            for player in range(self.players)
+        }
+
+    def _move(self, prices: Dict, market_id: int, rng: random.Random):
+        step = 1 if market_id in self._spreads or market_id in self._totals else 0.5
+        for books in prices.values():
+            for price in books.values():
+                if rng.random() >= self.drift:
+                    continue
+                for side, cost in price['costs'].items():
+                    price['costs'][side] = self._shift_odds(cost, rng.choice([-10, -5, 5, 10]))
+                if price['line'] is not None and rng.random() < 0.2:
+                    price['line'] += rng.choice([-step, step])
+
+    def _shift_odds(self, odds: int, delta: int) -> int:
+        """Move American odds, jumping the gap between -100 and +100"""
+        moved = odds + delta
+        if -100 < moved < 100:
+            moved += 200 if delta > 0 else -200
+        return moved
+
+    def _render(self, event: Dict, market_id: int, offer_key, books: Dict) -> Dict:
+        """An offer shaped like the upstream /offers payload"""
+        offer = {'event_id': event['id'], 'market_id': market_id}
+        if offer_key is not None:
+            offer['participants'] = [{'id': str(event['id'] * 100 + offer_key), 'type': 'person',
+                                      'player': {'first_name': 'Player', 'last_name': f"{event['id']}-{offer_key}"}}]
+
+        sides = list(next(iter(books.values()))['costs'])
+        selections = []
+        for side in sides:
+            if side in ('away', 'home'):
+                label = event['participants'][0 if side == 'away' else 1]['name']
+            else:
+                label = side
+            selection_books = []
+            for bookie_id, price in books.items():
+                line = price['line']
+                if line is not None and market_id in self._spreads and side == 'home':
+                    line = -line
+                selection_books.append({
+                    'id': bookie_id,
+                    'lines': [{'active': True, 'replaced': False, 'line': line, 'cost': price['costs'][side]}]
+                })
+            selections.append({'label': label, 'books': selection_books})
+        offer['selections'] = selections
+        return offer
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves /events and paginated /offers from the server's slate"""
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/').rsplit('/', 1)[-1]
+        if path == 'events':
+            self._respond({'events': self.server.slate.events()})
+        elif path == 'offers':
+            self._respond(self._offers_page(params))
+        else:
+            self.send_error(404)
+
+    def _offers_page(self, params: Dict) -> Dict:
+        market_id = int(params.get('market_id', 0))
+        event_ids = set(params['event_id'].split(',')) if params.get('event_id') else None
+        limit = int(params.get('limit', 100))
+        page = int(params.get('page', 1))
+
+        offers = self.server.slate.offers(market_id)
+        if event_ids is not None:
+            offers = [offer for offer in offers if str(offer['event_id']) in event_ids]
+        return {
+            'offers': offers[(page - 1) * limit:page * limit],
+            '_pagination': {
+                'page': page,
+                'limit': limit,
+                'total_items': len(offers),
+                'total_pages': max(1, math.ceil(len(offers) / limit))
+            }
+        }
+
+    def _respond(self, data: Dict):
+        body = encode(data)
+        etag = f'"{hash(body) & 0xffffffffffff:x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(slate, host: str = '127.0.0.1', port: int = 8000, verbose: bool = False) -> ThreadingHTTPServer:
+    """Build a stand-in server for a FixtureSlate or SyntheticSlate; call serve_forever() to run it"""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.slate = slate
+    server.verbose = verbose
+    return server
+
+def record(path: str, cycles: int = 1, interval: float = 60):
+    """Record /events and every market's /offers from Config.API_BASE_URL into `path`"""
+    api_service = APIService(
+        base_url=Config.API_BASE_URL,
+        headers=Config.HEADERS,
+        bookie_map=Config.BOOKIE_MAP,
+        page_limit=Config.OFFERS_PAGE_LIMIT,
+        timeout=Config.REQUEST_TIMEOUT,
+        skip_unchanged=False
+    )
+    planner = FetchPlanner(api_service, Config.MARKET_CONFIG, max_events_per_request=Config.MAX_EVENTS_PER_REQUEST)
+
+    os.makedirs(path, exist_ok=True)
+    events = api_service._get("/events", {"sport": "NFL", "week": 18, "season": 2024})
+    with open(os.path.join(path, 'events.json'), 'wb') as f:
+        f.write(encode(events))
+    event_ids = [str(event['id']) for event in events.get('events', [])]
+
+    for cycle in range(cycles):
+        cycle_dir = os.path.join(path, f"cycle_{cycle:03d}")
+        os.makedirs(cycle_dir, exist_ok=True)
+        offers = {}
+        for market_type, market_id, chunk in planner.plan(event_ids):
+            offers.setdefault(market_id, []).extend(api_service._fetch_offers(market_id, chunk))
+        for market_id, market_offers in offers.items():
+            with open(os.path.join(cycle_dir, f"market_{market_id}.json"), 'wb') as f:
+                f.write(encode({'offers': market_offers}))
+        print(f"Recorded cycle {cycle + 1}/{cycles}: {sum(map(len, offers.values()))} offers")
+        if cycle + 1 < cycles:
+            time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rec = commands.add_parser('record', help="Record live responses into a fixtures directory")
+    rec.add_argument('path')
+    rec.add_argument('--cycles', type=int, default=1)
+    rec.add_argument('--interval', type=float, default=60, help="Seconds between recorded cycles")
+
+    serve = commands.add_parser('serve', help="Serve recorded fixtures or a synthetic slate")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--fixtures', help="Replay this fixtures directory instead of synthesizing")
+    serve.add_argument('--events', type=int, default=16, help="Events in a realistic slate")
+    serve.add_argument('--players', type=int, default=8, help="Players per event and prop market")
+    serve.add_argument('--scale', type=int, default=1, help="Multiply the slate size, e.g. 10 or 100")
+    serve.add_argument('--drift', type=float, default=0.05, help="Chance each price moves per tick")
+    serve.add_argument('--tick', type=float, default=30, help="Seconds between odds updates")
+    serve.add_argument('--seed', type=int, default=0)
+    serve.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.path, args.cycles, args.interval)
+        return
+
+    if args.fixtures:
+        slate = FixtureSlate(args.fixtures, tick=args.tick)
+    else:
+        slate = SyntheticSlate(events=args.events * args.scale, players=args.players,
+                               drift=args.drift, tick=args.tick, seed=args.seed)
+    server = make_server(slate, args.host, args.port, args.verbose)
+    print(f"Serving {len(slate.events())} events on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
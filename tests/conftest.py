@@ -0,0 +1,59 @@
+# tests/conftest.py
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from api_service import APIService, LineRecord
+from config import Config
+from database import Database
+from standin_api import SyntheticSlate, make_server
+
+KICKOFF = datetime(2024, 12, 29, 18, 0)
+
+def make_line(event_id='1', market_id=103, bookie_id=10, player_name='Player A', selection='Over',
+              line_value=245.5, odds=-110, timestamp=KICKOFF, player_id=None, market_type='props') -> LineRecord:
+    """A parsed line with defaults for everything a test doesn't care about"""
+    return LineRecord(event_id, market_id, market_type, bookie_id, Config.BOOKIE_MAP.get(bookie_id, 'Book'),
+                      player_name, selection, line_value, odds, timestamp, player_id)
+
+def poll(minutes, **overrides) -> LineRecord:
+    """A line fetched `minutes` after kickoff"""
+    return make_line(timestamp=KICKOFF + timedelta(minutes=minutes), **overrides)
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh file-backed database in run-length ('changes') storage mode"""
+    database = Database(f"sqlite:///{tmp_path / 'lines.db'}", storage_mode='changes')
+    yield database
+    database.engine.dispose()
+
+@pytest.fixture
+def full_db(tmp_path):
+    """A fresh database storing every polled line ('full' mode)"""
+    database = Database(f"sqlite:///{tmp_path / 'full.db'}", storage_mode='full')
+    yield database
+    database.engine.dispose()
+
+@pytest.fixture
+def slate():
+    """A small synthetic slate that only moves when a test says so"""
+    return SyntheticSlate(events=2, players=2, drift=0, tick=3600)
+
+@pytest.fixture
+def standin(slate):
+    """The stand-in API serving `slate` on a free local port"""
+    server = make_server(slate, port=0)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def api_service(standin):
+    return APIService(
+        base_url=f"http://127.0.0.1:{standin.server_address[1]}",
+        headers={},
+        bookie_map=Config.BOOKIE_MAP,
+        page_limit=Config.OFFERS_PAGE_LIMIT
+    )
@@ -0,0 +1,65 @@
+# tests/test_adaptive_scheduler.py
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config import Config
+from line_tracker import LineTracker
+from metrics import ERRORS
+from scheduler import AdaptiveScheduler
+
+@pytest.fixture
+def scheduler(db, api_service):
+    return AdaptiveScheduler(api_service, db, LineTracker(db), markets=[('props', 103)])
+
+def kickoff_in(hours):
+    return (datetime.now(timezone.utc) + timedelta(hours=hours)).isoformat()
+
+@pytest.mark.parametrize('hours, interval', [
+    (0.5, 30), (-1, 30), (3, 120), (12, 300), (48, 900), (200, Config.ADAPTIVE_POLL_MAX_INTERVAL)
+])
+def test_interval_follows_the_kickoff_tiers(scheduler, hours, interval):
+    scheduler.events = {'1': {'scheduled': kickoff_in(hours), 'status': 'scheduled'}}
+    assert scheduler.poll_interval('1', 103) == interval
+
+def test_finished_and_unknown_events_are_not_polled(scheduler):
+    scheduler.events = {'1': {'scheduled': kickoff_in(-3), 'status': 'closed'}}
+    assert scheduler.poll_interval('1', 103) is None
+    assert scheduler.poll_interval('2', 103) is None
+
+def test_volatile_markets_are_polled_faster_down_to_the_floor(scheduler, monkeypatch):
+    scheduler.events = {'1': {'scheduled': kickoff_in(12), 'status': 'scheduled'}}
+    monkeypatch.setattr(scheduler.line_tracker, 'volatility', lambda event_id, market_id: 2)
+    assert scheduler.poll_interval('1', 103) == 100
+    monkeypatch.setattr(scheduler.line_tracker, 'volatility', lambda event_id, market_id: 50)
+    assert scheduler.poll_interval('1', 103) == Config.ADAPTIVE_POLL_MIN_INTERVAL
+
+def test_due_jobs_are_polled_and_rescheduled(scheduler, db):
+    scheduler.run_pending()
+
+    assert scheduler.cycles == 1
+    assert scheduler.state == 'idle'
+    assert {job[2] for job in scheduler.jobs} == {'10000', '10001'}
+    assert all(job[0] > time.monotonic() for job in scheduler.jobs)
+    assert db.get_latest_snapshot_id('10000', 103) is not None
+
+    # Nothing is due again straight away
+    scheduler.run_pending()
+    assert scheduler.cycles == 1
+
+def test_a_failed_event_refresh_is_counted_and_retried(scheduler, db, monkeypatch):
+    def fail(events):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db, 'save_events', fail)
+    errors = ERRORS._values.get(('events',), 0)
+
+    scheduler.run_pending()
+    assert ERRORS._values[('events',)] == errors + 1
+    assert scheduler.jobs == []
+    assert scheduler._next_event_refresh - time.monotonic() <= Config.ADAPTIVE_POLL_MIN_INTERVAL
+
+    monkeypatch.undo()
+    scheduler._next_event_refresh = 0
+    scheduler.run_pending()
+    assert len(scheduler.jobs) == 2
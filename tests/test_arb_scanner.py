@@ -0,0 +1,64 @@
+# tests/test_arb_scanner.py
+import pytest
+
+from arb_scanner import ArbScanner
+from config import Config
+from tests.conftest import make_line
+
+TOTAL, SPREAD, MONEYLINE = 2, 3, 1
+
+def game_line(market_id, bookie_id, selection, line_value, odds):
+    return make_line(market_id=market_id, market_type='game_lines', bookie_id=bookie_id, player_name=None,
+                     selection=selection, line_value=line_value, odds=odds)
+
+@pytest.fixture
+def scanner(db):
+    return ArbScanner(db, Config.BOOKIE_MAP, Config.MARKET_CONFIG)
+
+def test_arbitrage_across_books(db, scanner):
+    db.save_lines([
+        game_line(TOTAL, 10, 'Over', 47.5, 105), game_line(TOTAL, 10, 'Under', 47.5, -125),
+        game_line(TOTAL, 12, 'Over', 47.5, -125), game_line(TOTAL, 12, 'Under', 47.5, 105)
+    ])
+    arbitrages = scanner.scan(['1'])['arbitrages']
+
+    assert sorted(zip(arbitrages['selection'], arbitrages['bookie_id'])) == [('Over', 10), ('Under', 12)]
+    assert arbitrages['edge'].iloc[0] == pytest.approx(1 - 2 * 100 / 205)
+
+def test_no_arbitrage_when_the_best_prices_carry_vig(db, scanner):
+    db.save_lines([game_line(TOTAL, 10, 'Over', 47.5, -105), game_line(TOTAL, 12, 'Under', 47.5, -105)])
+    assert scanner.scan(['1'])['arbitrages'].empty
+
+def test_spread_sides_pair_on_opposite_lines(db, scanner):
+    db.save_lines([game_line(SPREAD, 10, 'Away 1', 3.5, 110), game_line(SPREAD, 12, 'Home 1', -3.5, 110),
+                   game_line(SPREAD, 13, 'Home 1', 3.5, 300)])
+    arbitrages = scanner.scan(['1'])['arbitrages']
+    assert sorted(arbitrages['bookie_id']) == [10, 12]
+
+def test_total_and_spread_middles(db, scanner):
+    db.save_lines([
+        game_line(TOTAL, 10, 'Over', 47.5, -110), game_line(TOTAL, 12, 'Under', 48.5, -110),
+        game_line(TOTAL, 13, 'Over', 49.5, -110),
+        game_line(SPREAD, 10, 'Away 1', 3.5, -110), game_line(SPREAD, 12, 'Home 1', -2.5, -110),
+        game_line(MONEYLINE, 10, 'Away 1', None, 150)
+    ])
+    middles = scanner.scan(['1'])['middles']
+
+    rows = {(row.market_id, row.line_value_a, row.line_value_b): row.width for row in middles.itertuples()}
+    assert rows == {(TOTAL, 47.5, 48.5): 1.0, (SPREAD, 3.5, -2.5): 1.0}
+
+def test_props_are_matched_per_player(db, scanner):
+    db.save_lines([make_line(bookie_id=10, selection='Over', odds=105),
+                   make_line(bookie_id=12, player_name='Player B', selection='Under', odds=105)])
+    assert scanner.scan(['1'])['arbitrages'].empty
+
+def test_scan_reports_book_holds(db, scanner):
+    db.save_lines([game_line(TOTAL, 10, 'Over', 47.5, -110), game_line(TOTAL, 10, 'Under', 47.5, -110),
+                   game_line(TOTAL, 12, 'Over', 47.5, -105), game_line(TOTAL, 12, 'Under', 47.5, -115)])
+    holds = scanner.scan(['1'])['holds']
+    assert holds['bookie_id'].tolist() == [10, 12]
+    assert holds['mean'].tolist() == pytest.approx([220 / 210 - 1, 105 / 205 + 115 / 215 - 1])
+
+def test_empty_board(scanner):
+    results = scanner.scan([])
+    assert results['arbitrages'].empty and results['middles'].empty and results['holds'].empty
@@ -0,0 +1,72 @@
+# tests/test_async_api_service.py
+import asyncio
+import time
+
+from api_service import APIService
+from async_api_service import AsyncAPIService, TokenBucket
+from config import Config
+from fetch_planner import FetchPlanner
+
+EVENT_IDS = ['10000', '10001']
+
+def make_async_service(standin, **kwargs):
+    return AsyncAPIService(f"http://127.0.0.1:{standin.server_address[1]}", {}, Config.BOOKIE_MAP, **kwargs)
+
+def test_async_service_is_not_a_sync_service(standin):
+    service = make_async_service(standin)
+    assert not isinstance(service, APIService)
+    assert not hasattr(service, 'session')
+
+def test_async_fetch_matches_the_sync_service(standin, api_service):
+    async def fetch():
+        async with make_async_service(standin) as service:
+            events = await service.fetch_events()
+            lines = await service.fetch_market_odds('props', 103, EVENT_IDS)
+            again = await service.fetch_market_odds('props', 103, EVENT_IDS)
+            return events, lines, again, service.stats
+    events, lines, again, stats = asyncio.run(fetch())
+
+    assert events == api_service.fetch_events()
+    expected = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert sorted(line[:9] for line in lines) == sorted(line[:9] for line in expected)
+    assert len(again) == 0 and len(again.unchanged) == len(expected.unchanged) + 2 * 2 * len(Config.BOOKIE_MAP)
+    assert stats['not_modified'] == 1
+
+def test_planner_runs_concurrently_against_the_async_service(standin):
+    async def execute():
+        async with make_async_service(standin, requests_per_second=100) as service:
+            planner = FetchPlanner(service, Config.MARKET_CONFIG)
+            return await planner.execute_async(EVENT_IDS, [('props', 103), ('game_lines', 2)])
+    results = asyncio.run(execute())
+    assert set(results) == {103, 2}
+    assert set(results[103]) == set(EVENT_IDS)
+
+def test_token_bucket_limits_the_request_rate():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        await asyncio.gather(*[bucket.acquire() for _ in range(5)])
+        return time.monotonic() - start
+    assert 0.15 < asyncio.run(run()) < 1
+
+def test_token_bucket_does_not_hold_its_lock_while_waiting():
+    async def run():
+        bucket = TokenBucket(rate=2, capacity=1)
+        await bucket.acquire()
+        waiter = asyncio.ensure_future(bucket.acquire())
+        await asyncio.sleep(0.05)
+        locked = bucket._lock.locked()
+        waiter.cancel()
+        return locked
+    assert asyncio.run(run()) is False
+
+def test_async_fetch_reports_hitting_the_page_cap(standin, capsys):
+    async def fetch():
+        async with make_async_service(standin, page_limit=1) as service:
+            service.max_pages = 2
+            return await service.fetch_market_odds('props', 103, EVENT_IDS), service.stats
+    lines, stats = asyncio.run(fetch())
+
+    assert stats['requests'] == 2
+    assert len(lines) == 2 * 2 * len(Config.BOOKIE_MAP)
+    assert "more than 2 pages" in capsys.readouterr().out
@@ -0,0 +1,40 @@
+# tests/test_board_cache.py
+from board_cache import BoardCache, BoardLine, best_odds
+from tests.conftest import KICKOFF
+
+def board_line(bookie_id, odds, player_name='Player A', selection='Over', line_value=245.5):
+    return BoardLine('1', 103, 'props', bookie_id, player_name, selection, line_value, odds, KICKOFF, 1)
+
+def test_best_odds_are_per_player_selection_and_line():
+    best = best_odds([
+        board_line(10, -110), board_line(12, -105),
+        board_line(13, +150, player_name='Player B'),
+        board_line(19, +120, line_value=260.5),
+        board_line(10, -115, selection='Under')
+    ])
+    assert best[('Player A', 'Over', 245.5)] == {'bookie_id': 12, 'odds': -105, 'line_value': 245.5}
+    assert best[('Player B', 'Over', 245.5)]['odds'] == 150
+    assert best[('Player A', 'Over', 260.5)]['bookie_id'] == 19
+    assert best[('Player A', 'Under', 245.5)]['odds'] == -115
+    assert len(best) == 4
+
+def test_cache_serves_boards_and_best_odds():
+    cache = BoardCache()
+    assert cache.get_lines('1', 103) is None
+    cache.set_board('1', 103, [board_line(10, -110), board_line(12, -105)])
+
+    assert len(cache.get_lines('1', 103)) == 2
+    assert cache.get_line('1', 103, 12, 'Over', 'Player A').odds == -105
+    assert cache.get_best_odds('1', 103)[('Player A', 'Over', 245.5)]['bookie_id'] == 12
+
+def test_boards_loaded_from_the_database_expire():
+    cache = BoardCache(ttl=-1)
+    cache.set_board('1', 103, [board_line(10, -110)], from_db=True)
+    assert cache.get_lines('1', 103) is None
+
+def test_least_recently_used_events_are_evicted():
+    cache = BoardCache(max_events=2)
+    for event_id in ('1', '2', '3'):
+        cache.set_board(event_id, 103, [])
+    assert cache.get_lines('1', 103) is None
+    assert cache.get_lines('3', 103) == []
@@ -0,0 +1,65 @@
+# tests/test_dashboard.py
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('plotly')
+
+import app
+from database import Database
+from tests.conftest import poll
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    """The dashboard module, configured for a fresh database"""
+    monkeypatch.setattr(app.config, 'DATABASE_URL', f"sqlite:///{tmp_path / 'lines.db'}")
+    monkeypatch.setattr(app.config, 'LINE_STORAGE_MODE', 'changes')
+    monkeypatch.setattr(app.config, 'SQLITE_WAL', False)
+    app.get_components.clear()
+    app.load_events.clear()
+    app.load_current_lines.clear()
+    app.load_board_analysis.clear()
+    yield app
+    _, db, _ = app.get_components()
+    db.engine.dispose()
+    app.get_components.clear()
+
+def test_dashboard_reads_the_configured_database(dashboard, tmp_path):
+    _, db, _ = dashboard.get_components()
+    assert db.engine.url.database == str(tmp_path / 'lines.db')
+
+def test_events_cover_every_configured_week(dashboard, monkeypatch):
+    monkeypatch.setattr(dashboard.config, 'SEASON', 2025)
+    monkeypatch.setattr(dashboard.config, 'WEEKS', (1, 2))
+    api_service, _, _ = dashboard.get_components()
+    calls = []
+
+    def fetch_events(week, season):
+        calls.append((week, season))
+        return {str(week): {'week': week}}
+    monkeypatch.setattr(api_service, 'fetch_events', fetch_events)
+
+    assert dashboard.load_events() == {'1': {'week': 1}, '2': {'week': 2}}
+    assert calls == [(1, 2025), (2, 2025)]
+
+def test_current_lines_follow_each_new_cycle(dashboard, tmp_path):
+    # The poller is another process writing the same file
+    poller = Database(f"sqlite:///{tmp_path / 'lines.db'}", storage_mode='changes')
+    _, db, _ = dashboard.get_components()
+    poller.save_lines([poll(0)])
+    first = dashboard.load_current_lines('1', 103, db.get_last_snapshot_id())
+
+    poller.save_lines([poll(5, odds=-130)])
+    second = dashboard.load_current_lines('1', 103, db.get_last_snapshot_id())
+    poller.engine.dispose()
+
+    assert list(first['odds']) == [-110]
+    assert list(second['odds']) == [-130]
+
+def test_board_analysis_covers_the_slate(dashboard, tmp_path):
+    _, db, _ = dashboard.get_components()
+    db.save_lines([poll(0, selection='Over'), poll(0, selection='Under'), poll(0, event_id='2'),
+                   poll(0, event_id='3')])
+
+    analyzed = dashboard.load_board_analysis(('1', '2'), db.get_last_snapshot_id())
+    assert sorted(analyzed['event_id']) == ['1', '1', '2']
+    assert analyzed.loc[analyzed['event_id'] == '1', 'hold'].tolist() == pytest.approx([220 / 210 - 1] * 2)
@@ -0,0 +1,119 @@
+# tests/test_dimensions.py
+import sqlite3
+
+import pytest
+from sqlalchemy import inspect
+
+from database import Database
+from tests.conftest import poll
+
+def query(db, sql):
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql(sql).all()
+
+def test_lines_share_player_and_selection_keys(db):
+    db.save_lines([poll(0, player_id='p1'), poll(0, bookie_id=12, player_id='p1'),
+                   poll(0, selection='Under', player_id='p1')])
+
+    assert query(db, "SELECT upstream_id, name FROM players") == [('p1', 'Player A')]
+    assert query(db, "SELECT name FROM selections ORDER BY name") == [('Over',), ('Under',)]
+    assert len(query(db, "SELECT DISTINCT player_key FROM betting_lines")) == 1
+
+def test_lines_store_keys_and_read_back_names(db):
+    assert not {'market_type', 'player_name', 'selection'} & {
+        column['name'] for column in inspect(db.engine).get_columns('betting_lines')
+    }
+    db.save_lines([poll(0, player_id='p1'), poll(0, selection='Under', player_id='p1')])
+    db.board_cache.evict_event('1')
+
+    lines = db.get_current_lines('1', 103)
+    assert sorted((line.market_type, line.player_name, line.selection) for line in lines) == [
+        ('props', 'Player A', 'Over'), ('props', 'Player A', 'Under')
+    ]
+    assert {(row.player_name, row.selection) for row in db.get_current_board(['1'])} == {
+        ('Player A', 'Over'), ('Player A', 'Under')
+    }
+
+def test_game_lines_have_no_player(db):
+    db.save_lines([poll(0, market_id=2, player_name=None, selection='Home', market_type='game_lines')])
+    assert query(db, "SELECT player_key FROM betting_lines") == [(None,)]
+    assert query(db, "SELECT COUNT(*) FROM players") == [(0,)]
+
+def test_upstream_id_takes_over_a_player_stored_by_name(db):
+    db.save_lines([poll(0)])
+    db.save_lines([poll(5, odds=-130, player_id='p1')])
+
+    assert query(db, "SELECT upstream_id, name FROM players") == [('p1', 'Player A')]
+    ((key,),) = query(db, "SELECT id FROM players")
+    assert query(db, "SELECT player_key FROM betting_lines") == [(key,), (key,)]
+    assert db.dimensions.get_player('p1', 'Player A') == key
+
+def test_players_with_the_same_name_stay_apart_by_upstream_id(db):
+    db.save_lines([poll(0, player_id='p1'), poll(0, bookie_id=12, player_id='p2')])
+    assert query(db, "SELECT upstream_id FROM players ORDER BY upstream_id") == [('p1',), ('p2',)]
+
+def test_keys_are_cached_only_once_committed(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db, '_current_rows', fail)
+    with pytest.raises(RuntimeError):
+        db.save_lines([poll(0, player_id='p1', market_id=104)])
+
+    assert db.dimensions.get_player('p1', 'Player A') is None
+    assert db.dimensions.get_selection('Over') is None
+    assert not db.dimensions.has_market(104)
+    assert query(db, "SELECT COUNT(*) FROM players") == [(0,)]
+
+    monkeypatch.undo()
+    db.save_lines([poll(0, player_id='p1', market_id=104)])
+    assert db.dimensions.get_player('p1', 'Player A') == query(db, "SELECT id FROM players")[0][0]
+    assert db.dimensions.has_market(104)
+
+def test_cold_cache_finds_existing_rows(db):
+    db.save_lines([poll(0, player_id='p1')])
+    db.dimensions.clear()
+
+    db.save_lines([poll(5, odds=-130, player_id='p1')])
+    assert query(db, "SELECT COUNT(*) FROM players") == [(1,)]
+    assert query(db, "SELECT COUNT(*) FROM selections") == [(1,)]
+
+def test_migration_backfills_dimensions_for_legacy_rows(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE betting_lines (
+            id INTEGER PRIMARY KEY, event_id VARCHAR, market_id INTEGER, market_type VARCHAR,
+            bookie_id INTEGER, player_name VARCHAR, selection VARCHAR, line_value FLOAT,
+            odds INTEGER, timestamp DATETIME
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO betting_lines (event_id, market_id, market_type, bookie_id, player_name, selection, "
+        "line_value, odds, timestamp) VALUES ('1', ?, ?, ?, ?, ?, ?, -110, '2024-12-29 18:00:00.000000')",
+        [(103, 'props', 10, 'Player A', 'Over', 245.5), (103, 'props', 12, 'Player A', 'Under', 245.5),
+         (103, 'props', 10, 'Player B', 'Over', 60.5), (2, 'game_lines', 10, None, 'Home', -3.5)]
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(f"sqlite:///{path}", storage_mode='changes')
+    assert query(db, "SELECT upstream_id, name FROM players ORDER BY name") == [(None, 'Player A'), (None, 'Player B')]
+    assert query(db, "SELECT name FROM selections ORDER BY name") == [('Home',), ('Over',), ('Under',)]
+    assert query(db, "SELECT id, market_type FROM markets ORDER BY id") == [(2, 'game_lines'), (103, 'props')]
+    assert query(db, "SELECT id FROM bookies ORDER BY id") == [(10,), (12,)]
+    assert query(db, """
+        SELECT p.name, s.name FROM betting_lines l
+        LEFT JOIN players p ON p.id = l.player_key
+        JOIN selections s ON s.id = l.selection_key
+        ORDER BY l.id
+    """) == [('Player A', 'Over'), ('Player A', 'Under'), ('Player B', 'Over'), (None, 'Home')]
+    # The names now live only in the dimension tables
+    assert not {'market_type', 'player_name', 'selection'} & {
+        column['name'] for column in inspect(db.engine).get_columns('betting_lines')
+    }
+    assert [line.selection for line in db.get_snapshot_lines('1', 103, db.get_latest_snapshot_id('1', 103))] == ['Over', 'Under', 'Over']
+
+    # The first line with an upstream ID claims the backfilled player
+    db.save_lines([poll(5, player_id='p1')])
+    assert query(db, "SELECT upstream_id, name FROM players ORDER BY name") == [('p1', 'Player A'), (None, 'Player B')]
+    db.engine.dispose()
@@ -0,0 +1,42 @@
+# tests/test_fetch_planner.py
+from config import Config
+from fetch_planner import FetchPlanner
+from metrics import ERRORS
+
+EVENT_IDS = ['10000', '10001']
+LINES_PER_EVENT = 2 * 2 * len(Config.BOOKIE_MAP)  # Players x selections x books
+
+def test_planner_splits_events_into_chunks():
+    planner = FetchPlanner(None, Config.MARKET_CONFIG, max_events_per_request=2)
+    assert planner.plan(['1', '2', '3'], [('props', 103), ('game_lines', 2)]) == [
+        ('props', 103, ['1', '2']), ('props', 103, ['3']),
+        ('game_lines', 2, ['1', '2']), ('game_lines', 2, ['3'])
+    ]
+    assert len(planner.plan(['1'])) == len(planner.markets())
+
+def test_chunked_requests_fan_out_per_event(api_service):
+    planner = FetchPlanner(api_service, Config.MARKET_CONFIG, max_events_per_request=1)
+    results = planner.execute(EVENT_IDS, [('props', 103)])
+
+    assert api_service.stats['requests'] == len(EVENT_IDS)
+    assert {event_id: len(lines) for event_id, lines in results[103].items()} == {
+        event_id: LINES_PER_EVENT for event_id in EVENT_IDS
+    }
+
+def test_every_page_of_offers_is_fetched(api_service):
+    api_service.page_limit = 1  # One offer per player and event, so four pages
+
+    lines = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert api_service.stats['requests'] == 4
+    assert len(lines) == len(EVENT_IDS) * LINES_PER_EVENT
+
+def test_hitting_the_page_cap_is_reported(api_service, capsys):
+    api_service.page_limit = 1
+    api_service.max_pages = 3
+    errors = ERRORS._values.get(('pagination',), 0)
+
+    lines = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert api_service.stats['requests'] == 3
+    assert len(lines) == 3 * LINES_PER_EVENT // 2
+    assert ERRORS._values[('pagination',)] == errors + 1
+    assert "more than 3 pages" in capsys.readouterr().out
@@ -0,0 +1,101 @@
+# tests/test_line_archive.py
+from datetime import timedelta
+
+import pytest
+
+from line_archive import LineArchive, nfl_season_week
+from tests.conftest import KICKOFF, poll
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('duckdb')
+
+AFTER = KICKOFF + timedelta(hours=13)  # Past ARCHIVE_AFTER_HOURS, whatever the status
+
+def save_event(db, event_id='1', status='scheduled'):
+    db.save_events([{'event_id': event_id, 'home': 'Home', 'away': 'Away', 'scheduled': KICKOFF.isoformat() + 'Z',
+                     'status': status, 'season': 2024, 'week': 17}])
+
+def count_rows(db):
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT COUNT(*) FROM betting_lines").scalar()
+
+@pytest.fixture
+def archive(db, tmp_path):
+    return LineArchive(db, str(tmp_path / 'archive'), archive_after_hours=12)
+
+def test_nfl_season_week():
+    assert nfl_season_week(KICKOFF) == (2024, 17)
+    assert nfl_season_week(KICKOFF.replace(year=2025, month=1, day=5)) == (2024, 18)
+    assert nfl_season_week(KICKOFF.replace(month=8, day=15)) == (2024, 0)
+
+def test_export_writes_one_file_per_market_once(db, archive, tmp_path):
+    save_event(db, status='closed')
+    db.save_lines([poll(0), poll(0, market_id=102, line_value=1.5)])
+
+    assert archive.export(KICKOFF) == 2
+    root = tmp_path / 'archive'
+    files = sorted(path.relative_to(root).as_posix() for path in root.rglob('*.parquet'))
+    assert files == ['season=2024/week=17/market_id=102/event-1.parquet',
+                     'season=2024/week=17/market_id=103/event-1.parquet']
+    assert archive.export(KICKOFF) == 0
+    assert archive.query("SELECT count(*) AS n FROM lines")['n'][0] == 2
+
+def test_events_are_only_exported_once_finished_or_long_past_kickoff(db, archive):
+    save_event(db)
+    db.save_lines([poll(0)])
+    assert archive.pending_events(KICKOFF + timedelta(hours=1)) == []
+    assert [event.event_id for event in archive.pending_events(AFTER)] == ['1']
+
+def test_lines_saved_after_export_are_exported_again_before_compaction(db, archive):
+    save_event(db)
+    db.save_lines([poll(0, odds=-110)])
+    archive.export(AFTER)
+
+    # Still being polled: one price extends its row, another is new
+    db.save_lines([poll(60, odds=-110), poll(60, bookie_id=12, odds=-105)])
+    assert [event.event_id for event in archive.pending_events(AFTER)] == ['1']
+    assert archive.compact(retention_days=0, now=AFTER) == 0
+    assert count_rows(db) == 2
+
+    assert archive.export(AFTER) == 2
+    assert archive.pending_events(AFTER) == []
+    archived = archive.query("SELECT bookie_id, last_seen FROM lines ORDER BY bookie_id")
+    assert archived['bookie_id'].tolist() == [10, 12]
+    assert archived['last_seen'].tolist()[0] == KICKOFF + timedelta(minutes=60)
+
+    assert archive.compact(retention_days=0, now=AFTER) == 2
+    assert count_rows(db) == 0
+
+def test_compaction_keeps_movements_and_evicts_the_board(db, archive):
+    save_event(db, status='closed')
+    db.save_lines([poll(0, odds=-110)])
+    db.save_lines([poll(5, odds=-130)], movements=[{
+        'event_id': '1', 'market_id': 103, 'bookie_id': 10, 'player_name': 'Player A', 'selection': 'Over',
+        'previous_odds': -110, 'current_odds': -130, 'odds_movement': -20, 'previous_line': 245.5,
+        'current_line': 245.5, 'line_movement': 0, 'timestamp': KICKOFF + timedelta(minutes=5)
+    }])
+    archive.export(AFTER)
+
+    assert archive.compact(retention_days=14, now=AFTER) == 0
+    assert archive.compact(retention_days=14, now=KICKOFF + timedelta(days=15)) == 2
+    with db.ReadSession() as session:
+        (movement,) = session.query(db.LineMovement).all()
+    assert (movement.current_odds, movement.snapshot_id) == (-130, None)
+    assert db.board_cache.get_lines('1', 103) is None
+    assert db.get_current_lines('1', 103) == []
+
+@pytest.mark.parametrize('storage', ['db', 'full_db'])
+def test_price_changes_count_moves_in_either_storage_mode(request, storage, tmp_path):
+    db = request.getfixturevalue(storage)
+    archive = LineArchive(db, str(tmp_path / storage))
+    save_event(db, status='closed')
+    for minutes, odds in ((0, -110), (5, -110), (10, -120), (15, -120), (20, -110), (25, -110)):
+        db.save_lines([poll(minutes, odds=odds)])
+    archive.export(AFTER)
+
+    (row,) = archive.market_movement(103, season=2024, week=17).to_dict('records')
+    assert (row['open_odds'], row['close_odds'], row['min_odds'], row['max_odds']) == (-110, -110, -120, -110)
+    assert row['price_changes'] == 2
+
+def test_empty_archive_can_be_queried(archive):
+    assert archive.market_movement(103).empty
@@ -0,0 +1,45 @@
+# tests/test_line_history.py
+from datetime import timedelta
+
+from tests.conftest import KICKOFF, poll
+
+def test_buckets_have_open_close_min_and_max(db):
+    for minutes, odds in ((0, -110), (5, -130), (10, -120), (15, -125), (20, -105)):
+        db.save_lines([poll(minutes, odds=odds)])
+
+    history = db.get_line_history_buckets('1', 103, start=KICKOFF, end=KICKOFF + timedelta(minutes=30),
+                                          resolution=900)
+    series = history[(10, 'Over', 'Player A')]
+    assert series['timestamp'] == [KICKOFF, KICKOFF + timedelta(minutes=15)]
+    assert series['open'] == [-110, -125]
+    assert series['close'] == [-120, -105]
+    assert series['min'] == [-130, -125]
+    assert series['max'] == [-110, -105]
+
+def test_run_length_rows_are_expanded_per_snapshot(db):
+    # Unchanged polls extend one row, but every snapshot still lands in a bucket
+    for minutes in range(0, 30, 5):
+        db.save_lines([poll(minutes)])
+
+    history = db.get_line_history_buckets('1', 103, start=KICKOFF, end=KICKOFF + timedelta(minutes=30),
+                                          resolution=600)
+    series = history[(10, 'Over', 'Player A')]
+    assert series['timestamp'] == [KICKOFF + timedelta(minutes=m) for m in (0, 10, 20)]
+    assert series['open'] == series['close'] == [-110, -110, -110]
+
+def test_resolution_is_chosen_from_max_points(db):
+    for minutes in range(0, 60, 5):
+        db.save_lines([poll(minutes, odds=-110 - minutes)])
+
+    history = db.get_line_history_buckets('1', 103, start=KICKOFF, end=KICKOFF + timedelta(hours=1), max_points=4)
+    timestamps = history[(10, 'Over', 'Player A')]['timestamp']
+    assert 1 < len(timestamps) <= 4
+
+def test_series_are_filtered_and_bounded(db):
+    db.save_lines([poll(0), poll(0, player_name='Player B'), poll(0, selection='Under')])
+    db.save_lines([poll(90)])
+
+    history = db.get_line_history_buckets('1', 103, start=KICKOFF, end=KICKOFF + timedelta(hours=1),
+                                          resolution=60, player_name='Player A', selection='Over')
+    assert list(history) == [(10, 'Over', 'Player A')]
+    assert history[(10, 'Over', 'Player A')]['timestamp'] == [KICKOFF]
@@ -0,0 +1,91 @@
+# tests/test_line_tracker.py
+from datetime import timedelta
+
+import pytest
+
+from api_service import LineBatch
+from line_tracker import LineTracker
+from scheduler import UpdateScheduler
+from tests.conftest import KICKOFF, poll
+
+def detect(tracker, *lines):
+    movements = tracker.detect_movements(list(lines))
+    tracker.commit()
+    return movements
+
+@pytest.fixture
+def tracker(db):
+    return LineTracker(db, significant_move=15, lookback_hours=1)
+
+def test_first_sighting_is_not_a_movement(tracker):
+    assert detect(tracker, poll(0)) == []
+
+def test_move_from_the_previous_poll(tracker):
+    detect(tracker, poll(0, odds=-110))
+    (move,) = detect(tracker, poll(5, odds=-130, line_value=250.5))
+
+    assert (move['previous_odds'], move['current_odds'], move['odds_movement']) == (-110, -130, -20)
+    assert (move['previous_line'], move['current_line'], move['line_movement']) == (245.5, 250.5, 5.0)
+    assert move['timestamp'] == KICKOFF + timedelta(minutes=5)
+
+def test_slow_drift_is_reported_once_it_adds_up(tracker):
+    assert detect(tracker, poll(0, odds=-110)) == []
+    assert detect(tracker, poll(5, odds=-115)) == []
+    assert detect(tracker, poll(10, odds=-120)) == []
+    (move,) = detect(tracker, poll(15, odds=-125))
+    assert (move['previous_odds'], move['current_odds']) == (-110, -125)
+
+    # The reported move becomes the baseline
+    assert detect(tracker, poll(20, odds=-130)) == []
+    assert detect(tracker, poll(25, odds=-125)) == []
+
+def test_drift_outside_the_lookback_window_is_ignored(tracker):
+    detect(tracker, poll(0, odds=-110))
+    detect(tracker, poll(30, odds=-120))
+    # An hour after the first poll, the baseline is the -120 in effect then
+    assert detect(tracker, poll(95, odds=-125)) == []
+    (move,) = detect(tracker, poll(100, odds=-135))
+    assert move['previous_odds'] == -120
+
+def test_lines_are_keyed_by_book_player_and_selection(tracker):
+    detect(tracker, poll(0, odds=-110), poll(0, player_name='Player B', odds=-150), poll(0, bookie_id=12, odds=-110))
+    moves = detect(tracker, poll(5, odds=-110), poll(5, player_name='Player B', odds=-120),
+                   poll(5, bookie_id=12, odds=-110))
+    assert [(move['player_name'], move['bookie_id']) for move in moves] == [('Player B', 10)]
+
+def test_baseline_is_primed_from_the_saved_board(db):
+    db.save_lines([poll(0, odds=-110)])
+    (move,) = LineTracker(db).detect_movements([poll(5, odds=-130)])
+    assert move['previous_odds'] == -110
+
+def test_uncommitted_prices_are_rolled_back(tracker):
+    detect(tracker, poll(0, odds=-110))
+    assert len(tracker.detect_movements([poll(5, odds=-130)])) == 1
+    tracker.rollback()
+    assert len(tracker.detect_movements([poll(10, odds=-130)])) == 1
+    assert tracker.volatility('1', 103) == 0
+    tracker.commit()
+    assert tracker.volatility('1', 103) == 1
+
+def test_movement_is_reported_again_when_saving_fails(db, api_service, monkeypatch):
+    scheduler = UpdateScheduler(api_service, db, LineTracker(db))
+    published = []
+    monkeypatch.setattr(scheduler.movement_bus, 'publish', published.extend)
+
+    def results(minutes, odds):
+        return {103: {'1': LineBatch([poll(minutes, odds=odds)])}}
+    scheduler._process_results(results(0, -110))
+
+    save_lines = db.save_lines
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db, 'save_lines', fail)
+    with pytest.raises(RuntimeError):
+        scheduler._process_results(results(5, -130))
+    assert published == []
+
+    monkeypatch.setattr(db, 'save_lines', save_lines)
+    scheduler._process_results(results(10, -130))
+    assert [(move['previous_odds'], move['current_odds']) for move in published] == [(-110, -130)]
+    movements, _ = db.get_movements(event_id='1')
+    assert len(movements) == 1
@@ -0,0 +1,102 @@
+# tests/test_metrics.py
+import json
+import os
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from metrics import Counter, CycleProfiler, Gauge, Histogram, Registry, start_metrics_server
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+def test_counter_renders_help_type_and_labelled_samples(registry):
+    requests = registry.register(Counter('requests_total', 'HTTP responses', ['path', 'status']))
+    requests.inc(path='/offers', status=200)
+    requests.inc(2, path='/offers', status=200)
+    requests.inc(path='/events', status=304)
+
+    assert registry.render() == (
+        '# HELP requests_total HTTP responses\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{path="/events",status="304"} 1\n'
+        'requests_total{path="/offers",status="200"} 3\n'
+    )
+
+def test_gauge_without_labels(registry):
+    lag = registry.register(Gauge('lag_seconds', 'Lag'))
+    lag.set(-1.5)
+    assert registry.render().splitlines()[-1] == 'lag_seconds -1.5'
+
+def test_histogram_buckets_are_cumulative(registry):
+    seconds = registry.register(Histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1)))
+    for value in (0.05, 0.5, 5):
+        seconds.observe(value, stage='save')
+
+    assert registry.render().splitlines()[2:] == [
+        'stage_seconds_bucket{stage="save",le="0.1"} 1',
+        'stage_seconds_bucket{stage="save",le="1"} 2',
+        'stage_seconds_bucket{stage="save",le="+Inf"} 3',
+        'stage_seconds_sum{stage="save"} 5.55',
+        'stage_seconds_count{stage="save"} 3',
+    ]
+
+def test_histogram_times_a_block(registry):
+    seconds = registry.register(Histogram('block_seconds', 'Block time'))
+    with seconds.time():
+        pass
+    assert 'block_seconds_count 1' in registry.render()
+
+def test_label_values_are_escaped(registry):
+    errors = registry.register(Counter('errors_total', 'Errors', ['stage']))
+    errors.inc(stage='a "quoted"\\path\n')
+    assert 'errors_total{stage="a \\"quoted\\"\\\\path\\n"} 1' in registry.render()
+
+def test_wrong_labels_are_rejected(registry):
+    errors = registry.register(Counter('errors_total', 'Errors', ['stage']))
+    with pytest.raises(ValueError):
+        errors.inc(market_id=1)
+
+def test_server_serves_metrics_and_status(registry):
+    registry.register(Counter('cycles_total', 'Cycles')).inc()
+    server = start_metrics_server(0, registry=registry, status=lambda: {'state': 'idle'})
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urlopen(f"{base}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'cycles_total 1' in response.read().decode()
+        with urlopen(f"{base}/status") as response:
+            assert json.loads(response.read()) == {'state': 'idle'}
+        with pytest.raises(HTTPError):
+            urlopen(f"{base}/missing")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_profiler_dumps_every_nth_cycle(tmp_path):
+    profiler = CycleProfiler(every=2, directory=str(tmp_path))
+    for _ in range(4):
+        with profiler.cycle():
+            sum(range(100))
+    assert sorted(name.split('_')[1] for name in os.listdir(tmp_path)) == ['2', '4']
+
+def test_drained_values_merge_into_another_registry(registry):
+    worker = Registry()
+    for target in (registry, worker):
+        target.register(Counter('lines_total', 'Lines', ['kind']))
+        target.register(Histogram('fetch_seconds', 'Fetch time', buckets=(1,)))
+    registry.metrics[0].inc(5, kind='parsed')
+    worker.metrics[0].inc(3, kind='parsed')
+    worker.metrics[0].inc(kind='saved')
+    worker.metrics[1].observe(0.5)
+    worker.metrics[1].observe(2)
+
+    registry.merge(worker.drain())
+    assert worker.drain() == {}
+    rendered = registry.render()
+    assert 'lines_total{kind="parsed"} 8' in rendered
+    assert 'lines_total{kind="saved"} 1' in rendered
+    assert 'fetch_seconds_bucket{le="1"} 1' in rendered
+    assert 'fetch_seconds_count 2' in rendered
@@ -0,0 +1,100 @@
+# tests/test_movement_bus.py
+import json
+import time
+from datetime import datetime
+from urllib.request import Request, urlopen
+
+import pytest
+
+from movement_bus import DROPPED, MovementBus, MovementFeed, read_events, start_movement_server
+
+def movement(n, event_id='1'):
+    return {'event_id': event_id, 'market_id': 103, 'bookie_id': 10, 'player_name': 'Player A',
+            'selection': 'Over', 'previous_odds': -110, 'current_odds': -110 - n, 'odds_movement': -n,
+            'previous_line': 245.5, 'current_line': 245.5, 'line_movement': 0,
+            'timestamp': datetime(2024, 12, 29, 18, n)}
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+@pytest.fixture
+def server():
+    server = start_movement_server(MovementBus(history=10), 0, heartbeat=0.1)
+    yield server
+    server.stopping = True
+    server.shutdown()
+    server.server_close()
+
+def test_slow_subscriber_drops_its_oldest_movements():
+    bus = MovementBus()
+    dropped = DROPPED._values.get((), 0)
+    with bus.subscribe(maxsize=2) as subscription:
+        bus.publish([movement(n) for n in range(5)])
+        assert [move['odds_movement'] for move in subscription.drain()] == [-3, -4]
+        assert subscription.dropped == 3
+    assert DROPPED._values[()] == dropped + 3
+
+def test_blocking_subscriber_holds_the_publisher_up_to_the_timeout():
+    bus = MovementBus(block_timeout=0.05)
+    with bus.subscribe(maxsize=1, overflow='block') as subscription:
+        start = time.monotonic()
+        bus.publish([movement(1), movement(2)])
+        assert time.monotonic() - start >= 0.05
+        assert subscription.get(timeout=0)['odds_movement'] == -2
+
+def test_subscribers_filter_by_event():
+    bus = MovementBus()
+    with bus.subscribe(event_ids=['2']) as subscription:
+        bus.publish([movement(1, event_id='1'), movement(2, event_id='2')])
+        assert [move['event_id'] for move in subscription.drain()] == ['2']
+    assert [move['event_id'] for move in bus.recent(event_id='1')] == ['1']
+
+def test_subscribe_after_replays_the_ring_buffer():
+    bus = MovementBus(history=3)
+    bus.publish([movement(n) for n in range(5)])
+    with bus.subscribe(after=3) as subscription:
+        assert [move['odds_movement'] for move in subscription.drain()] == [-3, -4]
+    with bus.subscribe(after=0) as subscription:
+        assert [move['odds_movement'] for move in subscription.drain()] == [-2, -3, -4]
+    with bus.subscribe() as subscription:
+        assert subscription.drain() == []
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        MovementBus().subscribe(overflow='grow')
+
+def read_stream(server, count, last_event_id=None):
+    headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+    request = Request(f"http://127.0.0.1:{server.server_address[1]}/movements", headers=headers)
+    messages = []
+    with urlopen(request, timeout=5) as response:
+        for message in read_events(response):
+            messages.append(message)
+            if len(messages) == count:
+                return messages
+
+def test_stream_resumes_after_last_event_id(server):
+    server.bus.publish([movement(n) for n in range(3)])
+
+    messages = read_stream(server, 2, last_event_id='1')
+    assert [(seq, event) for seq, event, _ in messages] == [('2', 'movement'), ('3', 'movement')]
+    assert json.loads(messages[0][2])['timestamp'] == '2024-12-29T18:01:00'
+
+def test_recent_endpoint_filters_by_event(server):
+    server.bus.publish([movement(1, event_id='1'), movement(2, event_id='2')])
+    port = server.server_address[1]
+    with urlopen(f"http://127.0.0.1:{port}/movements/recent?event_id=2", timeout=5) as response:
+        assert [move['event_id'] for move in json.load(response)] == ['2']
+
+def test_feed_starts_with_movements_published_before_it_connected(server):
+    server.bus.publish([movement(1), movement(2)])
+    feed = MovementFeed(f"http://127.0.0.1:{server.server_address[1]}/movements", reconnect_seconds=0.1)
+
+    wait_for(lambda: len(feed.recent()) == 2)
+    server.bus.publish([movement(3)])
+    wait_for(lambda: len(feed.recent()) == 3)
+    assert [move['odds_movement'] for move in feed.recent()] == [-1, -2, -3]
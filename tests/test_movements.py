@@ -0,0 +1,68 @@
+# tests/test_movements.py
+from datetime import timedelta
+
+import pytest
+
+from tests.conftest import KICKOFF
+
+def movement(minutes, odds_movement, event_id='1', market_id=103, bookie_id=10, player_name='Player A'):
+    return {'event_id': event_id, 'market_id': market_id, 'bookie_id': bookie_id, 'player_name': player_name,
+            'selection': 'Over', 'previous_odds': -110, 'current_odds': -110 + odds_movement,
+            'odds_movement': odds_movement, 'previous_line': 245.5, 'current_line': 245.5,
+            'line_movement': 0, 'timestamp': KICKOFF + timedelta(minutes=minutes)}
+
+def pages(db, **kwargs):
+    """Every page, following cursors to the end"""
+    result, cursor = [], None
+    while True:
+        page, cursor = db.get_movements(cursor=cursor, **kwargs)
+        result.append(page)
+        if cursor is None:
+            return result
+
+def test_recent_order_pages_newest_first(db):
+    db.save_movements([movement(minutes, -20) for minutes in range(5)])
+
+    result = pages(db, limit=2)
+    assert [len(page) for page in result] == [2, 2, 1]
+    times = [move['timestamp'] for page in result for move in page]
+    assert times == sorted(times, reverse=True)
+    assert len(set(times)) == 5
+
+def test_magnitude_order_pages_biggest_first_and_breaks_ties_by_id(db):
+    db.save_movements([movement(0, -20), movement(1, 35), movement(2, -35), movement(3, 15), movement(4, 20)])
+
+    result = pages(db, order_by='magnitude', limit=2)
+    moves = [move['odds_movement'] for page in result for move in page]
+    assert moves == [-35, 35, 20, -20, 15]
+
+def test_a_full_last_page_has_no_cursor(db):
+    db.save_movements([movement(minutes, -20) for minutes in range(4)])
+
+    page, cursor = db.get_movements(limit=2)
+    page, cursor = db.get_movements(limit=2, cursor=cursor)
+    assert len(page) == 2 and cursor is None
+
+def test_pages_are_stable_while_movements_are_stored(db):
+    db.save_movements([movement(minutes, -20) for minutes in range(4)])
+    first, cursor = db.get_movements(limit=2)
+
+    db.save_movements([movement(10, -25), movement(11, -30)])  # Newer than everything paged so far
+    second, cursor = db.get_movements(limit=2, cursor=cursor)
+
+    assert [move['timestamp'] for move in first + second] == [KICKOFF + timedelta(minutes=m) for m in (3, 2, 1, 0)]
+    assert cursor is None
+
+def test_filters_apply_to_every_page(db):
+    db.save_movements([movement(0, -20, event_id='2'), movement(1, -20, bookie_id=12),
+                       movement(2, -20, player_name='Player B'), movement(3, -20, market_id=102)]
+                      + [movement(minutes, -20) for minutes in range(4, 7)])
+
+    result = pages(db, event_id='1', market_id=103, bookie_id=10, player_name='Player A', limit=2)
+    assert [move['timestamp'].minute for page in result for move in page] == [6, 5, 4]
+    page, _ = db.get_movements(since=KICKOFF + timedelta(minutes=2), until=KICKOFF + timedelta(minutes=4))
+    assert [move['timestamp'].minute for move in page] == [3, 2]
+
+def test_unknown_order_is_rejected(db):
+    with pytest.raises(ValueError):
+        db.get_movements(order_by='oldest')
@@ -0,0 +1,46 @@
+# tests/test_odds_analytics.py
+import numpy as np
+import pytest
+
+from odds_analytics import american_odds, analyze_board, book_holds, decimal_odds, implied_probability, load_board
+from tests.conftest import make_line
+
+TOTAL, SPREAD = 2, 3
+
+def game_line(market_id, bookie_id, selection, line_value, odds, event_id='1'):
+    return make_line(event_id=event_id, market_id=market_id, market_type='game_lines', bookie_id=bookie_id,
+                     player_name=None, selection=selection, line_value=line_value, odds=odds)
+
+def test_odds_conversions():
+    np.testing.assert_allclose(implied_probability([-110, 150, 100]), [110 / 210, 0.4, 0.5])
+    np.testing.assert_allclose(decimal_odds([-200, 150]), [1.5, 2.5])
+    np.testing.assert_allclose(american_odds([2 / 3, 0.4]), [-200, 150])
+
+def test_hold_and_fair_odds_remove_the_vig(db):
+    db.save_lines([game_line(TOTAL, 10, 'Over', 47.5, -110), game_line(TOTAL, 10, 'Under', 47.5, -110)])
+    analyzed = analyze_board(load_board(db), spread_market_ids=(SPREAD,))
+    assert analyzed['hold'].iloc[0] == pytest.approx(220 / 210 - 1)
+    assert analyzed['fair_prob'].tolist() == pytest.approx([0.5, 0.5])
+    assert analyzed['fair_odds'].tolist() == [-100, -100]
+
+def test_one_sided_markets_have_no_hold(db):
+    db.save_lines([game_line(TOTAL, 10, 'Over', 47.5, -110), game_line(TOTAL, 12, 'Under', 47.5, -110)])
+    analyzed = analyze_board(load_board(db), spread_market_ids=(SPREAD,))
+    assert analyzed['hold'].isna().all() and analyzed['fair_odds'].isna().all()
+
+def test_spread_sides_pair_on_opposite_lines(db):
+    db.save_lines([game_line(SPREAD, 10, 'Away 1', 3.5, -110), game_line(SPREAD, 10, 'Home 1', -3.5, -110),
+                   game_line(SPREAD, 12, 'Away 1', 3.5, -110), game_line(SPREAD, 12, 'Home 1', 3.5, -110)])
+    analyzed = analyze_board(load_board(db), spread_market_ids=(SPREAD,)).set_index('bookie_id')
+    assert analyzed.loc[10, 'hold'].tolist() == pytest.approx([220 / 210 - 1] * 2)
+    assert analyzed.loc[12, 'hold'].isna().all()
+
+def test_book_holds_average_each_market_across_the_slate(db):
+    db.save_lines([game_line(TOTAL, 10, 'Over', 47.5, -110), game_line(TOTAL, 10, 'Under', 47.5, -110),
+                   game_line(TOTAL, 10, 'Over', 44.5, -105, event_id='2'),
+                   game_line(TOTAL, 10, 'Under', 44.5, -105, event_id='2'),
+                   game_line(TOTAL, 12, 'Over', 47.5, -110)])
+    holds = book_holds(analyze_board(load_board(db), spread_market_ids=(SPREAD,)))
+
+    assert holds[['bookie_id', 'market_id', 'count']].values.tolist() == [[10, TOTAL, 2]]
+    assert holds['mean'].iloc[0] == pytest.approx((220 / 210 + 210 / 205) / 2 - 1)
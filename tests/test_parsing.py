@@ -0,0 +1,73 @@
+# tests/test_parsing.py
+import pytest
+
+from api_service import APIService, LineRecord
+from config import Config
+from tests.conftest import make_line
+
+@pytest.fixture
+def parser():
+    """An APIService that is only used to parse payloads, never to fetch"""
+    return APIService(base_url='http://unused', headers={}, bookie_map=Config.BOOKIE_MAP, skip_unchanged=False)
+
+def book(bookie_id, line, cost, active=True, replaced=False):
+    return {'id': bookie_id, 'lines': [{'active': active, 'replaced': replaced, 'line': line, 'cost': cost}]}
+
+PROP_OFFER = {
+    'event_id': 10000,
+    'market_id': 103,
+    'participants': [{'id': 1000001, 'type': 'person', 'player': {'first_name': 'Joe', 'last_name': 'Burrow'}}],
+    'selections': [
+        {'label': 'Over', 'books': [book(10, 245.5, -110), book(12, 246.5, -115)]},
+        {'label': 'Under', 'books': [book(10, 245.5, -110), book(999, 245.5, -110)]}
+    ]
+}
+
+def test_props_parse_into_line_records(parser):
+    lines = parser._process_offers('props', 103, [PROP_OFFER])
+
+    assert all(isinstance(line, LineRecord) for line in lines)
+    assert [(line.bookie_id, line.selection, line.line_value, line.odds) for line in lines] == [
+        (10, 'Over', 245.5, -110), (12, 'Over', 246.5, -115), (10, 'Under', 245.5, -110)
+    ]
+    first = lines[0]
+    assert (first.event_id, first.market_id, first.market_type) == ('10000', 103, 'props')
+    assert (first.player_name, first.player_id, first.bookie) == ('Joe Burrow', '1000001', 'Fanduel')
+    # Lines from one fetch share its timestamp
+    assert {line.timestamp for line in lines} == {lines.fetched_at}
+
+def test_inactive_and_replaced_lines_are_skipped(parser):
+    offer = {'event_id': 1, 'selections': [{'label': 'Over', 'books': [
+        book(10, 1.5, -110, active=False), book(12, 1.5, -110, replaced=True), book(13, 1.5, 120)
+    ]}]}
+    (line,) = parser._process_offers('props', 102, [offer])
+    assert line.bookie_id == 13
+    assert line.player_name == 'Unknown' and line.player_id is None
+
+def test_game_lines_have_no_player(parser):
+    offer = {'event_id': 7, 'selections': [
+        {'label': 'Away 7', 'books': [book(10, 3.5, -110)]},
+        {'label': 'Home 7', 'books': [book(10, -3.5, -110)]}
+    ]}
+    lines = parser._process_offers('game_lines', 3, [offer])
+    assert [(line.selection, line.line_value, line.player_name) for line in lines] == [
+        ('Away 7', 3.5, None), ('Home 7', -3.5, None)
+    ]
+
+@pytest.mark.parametrize('overrides, display', [
+    ({}, 'Player A - Over 245.5 (-110)'),
+    ({'market_type': 'game_lines', 'market_id': 1, 'player_name': None, 'selection': 'Away 1',
+      'line_value': None, 'odds': 150}, 'Away 1 (150)'),
+    ({'market_type': 'game_lines', 'market_id': 2, 'player_name': None, 'line_value': 47.5}, 'Over 47.5 (-110)'),
+    ({'market_type': 'game_lines', 'market_id': 3, 'player_name': None, 'selection': 'Home 1',
+      'line_value': 3.5}, 'Home 1 +3.5 (-110)'),
+])
+def test_display_is_rendered_on_demand(overrides, display):
+    assert make_line(**overrides).display == display
+
+def test_standin_payloads_parse_like_upstream(api_service):
+    lines = api_service.fetch_market_odds('props', 103, ['10000'])
+    # Two players, two sides, every book
+    assert len(lines) == 2 * 2 * len(Config.BOOKIE_MAP)
+    assert {line.player_id for line in lines} == {'1000000', '1000001'}
+    assert {line.event_id for line in lines} == {'10000'}
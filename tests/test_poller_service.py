@@ -0,0 +1,71 @@
+# tests/test_poller_service.py
+import signal
+import sys
+import threading
+
+import pytest
+
+import main
+from line_tracker import LineTracker
+from main import PollerService
+from scheduler import AdaptiveScheduler, UpdateScheduler
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal, 'signal', lambda signum, handler: None)  # Leave pytest's handlers alone
+    service = PollerService(f"sqlite:///{tmp_path / 'lines.db'}", scheduler='fixed')
+    service.config.METRICS_PORT = None
+    service.config.MOVEMENT_STREAM_PORT = None
+    return service
+
+def test_run_exits_cleanly_after_stop(service, monkeypatch):
+    monkeypatch.setattr(service.scheduler, 'start', lambda interval_minutes: service.scheduler.stop())
+    assert service.run() == 0
+    assert service.scheduler.state == 'stopped'
+
+def test_run_fails_when_polling_dies_on_its_own(service, monkeypatch):
+    monkeypatch.setattr(service.scheduler, 'start', lambda interval_minutes: None)
+    assert service.run() == 1
+    assert service.scheduler.state == 'stopped'
+
+@pytest.mark.parametrize('scheduler_class, run_cycle', [
+    (UpdateScheduler, UpdateScheduler.update_markets),
+    (AdaptiveScheduler, AdaptiveScheduler.run_pending),
+])
+def test_stop_during_a_cycle_leaves_it_draining(db, api_service, monkeypatch, scheduler_class, run_cycle):
+    scheduler = scheduler_class(api_service, db, LineTracker(db), markets=[('props', 103)])
+    monkeypatch.setattr(scheduler, 'archive_due', scheduler.stop)  # Signal arrives mid-cycle
+
+    run_cycle(scheduler)
+    assert scheduler.cycles == 1
+    assert scheduler.state == 'draining'
+
+def test_bare_options_run_the_poller(monkeypatch):
+    started = {}
+
+    class Service:
+        def __init__(self, database_url, **kwargs):
+            started.update(kwargs)
+
+        def run(self):
+            return 0
+    monkeypatch.setattr(main, 'PollerService', Service)
+    monkeypatch.setattr(sys, 'argv', ['main.py', '--weeks', '17,18'])
+
+    with pytest.raises(SystemExit) as exit:
+        main.main()
+    assert exit.value.code == 0
+    assert started['weeks'] == [17, 18]
+
+def test_run_fails_when_a_stuck_cycle_is_abandoned(service, monkeypatch):
+    release = threading.Event()
+
+    def start(interval_minutes):
+        service.scheduler.stop()
+        release.wait(5)  # A cycle that won't drain
+    monkeypatch.setattr(service.scheduler, 'start', start)
+    service.config.SHUTDOWN_TIMEOUT = 0.1
+    try:
+        assert service.run() == 2
+    finally:
+        release.set()
@@ -0,0 +1,34 @@
+# tests/test_query_plans.py
+import pytest
+from sqlalchemy import inspect
+
+from database import Database
+from query_plans import check_query_plans, hot_queries
+
+@pytest.fixture(params=['changes', 'full'])
+def any_db(request):
+    return request.getfixturevalue('db' if request.param == 'changes' else 'full_db')
+
+def test_hot_queries_use_indexes(any_db):
+    assert check_query_plans(any_db) == []
+
+def test_board_and_history_search_the_live_row_index(db):
+    with db.SessionLocal() as session:
+        queries = hot_queries(db, session)
+        for name in ('get_current_board', 'get_line_history_buckets', 'get_snapshot_lines'):
+            plan = db.explain_query_plan(queries[name])
+            assert any('ix_betting_lines_event_market_last_snapshot' in detail for detail in plan), name
+
+def test_migration_drops_retired_indexes(tmp_path):
+    path = tmp_path / 'lines.db'
+    db = Database(f"sqlite:///{path}")
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("CREATE INDEX ix_betting_lines_event_market_timestamp "
+                             "ON betting_lines (event_id, market_id, timestamp)")
+    db.engine.dispose()
+
+    db = Database(f"sqlite:///{path}")
+    assert 'ix_betting_lines_event_market_timestamp' not in {
+        index['name'] for index in inspect(db.engine).get_indexes('betting_lines')
+    }
+    db.engine.dispose()
@@ -0,0 +1,108 @@
+# tests/test_save_lines.py
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from api_service import UnchangedOffer
+from database import BettingLine
+from tests.conftest import KICKOFF, poll
+
+def stored_rows(db):
+    table = BettingLine.__table__
+    with db.engine.connect() as conn:
+        return [dict(row) for row in conn.execute(table.select().order_by(table.c.id)).mappings()]
+
+def test_unchanged_price_extends_the_existing_row(db):
+    db.save_lines([poll(0)])
+    db.save_lines([poll(5)])
+    db.save_lines([poll(10)])
+
+    rows = stored_rows(db)
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['timestamp'] == KICKOFF
+    assert row['last_seen'] == KICKOFF + timedelta(minutes=10)
+    assert (row['snapshot_id'], row['last_snapshot_id']) == (1, 3)
+
+def test_changed_price_inserts_a_new_row(db):
+    db.save_lines([poll(0, odds=-110)])
+    db.save_lines([poll(5, odds=-120)])
+    db.save_lines([poll(10, odds=-120)])
+
+    rows = stored_rows(db)
+    assert [row['odds'] for row in rows] == [-110, -120]
+    assert (rows[0]['snapshot_id'], rows[0]['last_snapshot_id']) == (1, 1)
+    assert (rows[1]['snapshot_id'], rows[1]['last_snapshot_id']) == (2, 3)
+
+def test_line_move_at_the_same_odds_is_a_new_price(db):
+    db.save_lines([poll(0, line_value=245.5)])
+    db.save_lines([poll(5, line_value=250.5)])
+
+    assert [row['line_value'] for row in stored_rows(db)] == [245.5, 250.5]
+
+def test_price_returning_to_an_old_value_starts_a_new_run(db):
+    db.save_lines([poll(0, odds=-110)])
+    db.save_lines([poll(5, odds=-120)])
+    db.save_lines([poll(10, odds=-110)])
+
+    rows = stored_rows(db)
+    assert [row['odds'] for row in rows] == [-110, -120, -110]
+    assert rows[2]['snapshot_id'] == 3
+
+def test_line_missing_from_a_poll_drops_off_the_board(db):
+    db.save_lines([poll(0), poll(0, selection='Under', odds=-110)])
+    db.save_lines([poll(5)])
+
+    current = db.get_current_lines('1', 103)
+    assert [line.selection for line in current] == ['Over']
+
+def test_unchanged_offers_are_carried_into_the_new_snapshot(db):
+    db.save_lines([poll(0), poll(0, bookie_id=12, odds=-105)])
+    skipped = UnchangedOffer('1', 103, 'Player A', 12, KICKOFF + timedelta(minutes=5))
+    saved = db.save_lines([poll(5, odds=-115)], unchanged=[skipped])
+
+    assert saved == 2
+    rows = {(row['bookie_id'], row['odds']): row for row in stored_rows(db)}
+    assert len(rows) == 3
+    carried = rows[(12, -105)]
+    assert carried['last_snapshot_id'] == 2
+    assert carried['last_seen'] == KICKOFF + timedelta(minutes=5)
+    assert {(line.bookie_id, line.odds) for line in db.get_current_lines('1', 103)} == {(10, -115), (12, -105)}
+
+def test_unchanged_offers_alone_still_take_a_snapshot(db):
+    db.save_lines([poll(0)])
+    db.save_lines([], unchanged=[UnchangedOffer('1', 103, 'Player A', 10, KICKOFF + timedelta(minutes=5))])
+
+    (row,) = stored_rows(db)
+    assert row['last_snapshot_id'] == 2
+    with db.engine.connect() as conn:
+        assert conn.execute(select(db.Snapshot.line_count).order_by(db.Snapshot.id)).scalars().all() == [1, 1]
+
+def test_full_mode_inserts_every_poll_and_copies_unchanged_offers(full_db):
+    full_db.save_lines([poll(0), poll(0, bookie_id=12)])
+    full_db.save_lines([poll(5)], unchanged=[UnchangedOffer('1', 103, 'Player A', 12, KICKOFF + timedelta(minutes=5))])
+
+    rows = stored_rows(full_db)
+    assert len(rows) == 4
+    copied = [row for row in rows if row['bookie_id'] == 12 and row['snapshot_id'] == 2]
+    assert len(copied) == 1
+    assert copied[0]['timestamp'] == KICKOFF + timedelta(minutes=5)
+
+def test_board_cache_keeps_the_first_seen_time_of_extended_rows(db):
+    db.save_lines([poll(0)])
+    db.save_lines([poll(5)])
+
+    (line,) = db.board_cache.get_lines('1', 103)
+    assert line.timestamp == KICKOFF
+    assert line.snapshot_id == 1
+
+def test_saved_lines_from_the_standin_api(db, api_service):
+    lines = api_service.fetch_market_odds('props', 103, ['10000', '10001'])
+    assert db.save_lines(lines, lines.unchanged) == len(lines)
+
+    again = api_service.fetch_market_odds('props', 103, ['10000', '10001'])
+    assert len(again) == 0 and again.unchanged
+    db.save_lines(again, again.unchanged)
+    rows = stored_rows(db)
+    assert len(rows) == len(lines)
+    assert {row['last_snapshot_id'] for row in rows} == {3, 4}
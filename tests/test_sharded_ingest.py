@@ -0,0 +1,71 @@
+# tests/test_sharded_ingest.py
+import pytest
+
+from config import Config
+from line_tracker import LineTracker
+from main import PollerService
+from metrics import LINES, REQUESTS
+from sharded_ingest import ShardedScheduler, shard_of
+
+EVENT_IDS = ['10000', '10001']
+MARKETS = [('props', 103), ('game_lines', 2)]
+
+@pytest.fixture
+def scheduler(db, api_service):
+    scheduler = ShardedScheduler(api_service, db, LineTracker(db), markets=MARKETS, workers=2)
+    yield scheduler
+    if scheduler.state != 'stopped':
+        scheduler.close()
+
+def count_rows(db):
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT COUNT(*) FROM betting_lines").scalar()
+
+def test_shards_are_stable():
+    assert shard_of(103, 4) == shard_of(103, 4)
+    assert {shard_of(market_id, 2) for market_id in range(100, 110)} == {0, 1}
+
+def test_ingest_saves_every_shard_and_merges_worker_metrics(scheduler, db):
+    requests = sum(REQUESTS._values.values())
+    parsed = LINES._values.get(('parsed', '103'), 0)
+
+    scheduler.ingest(EVENT_IDS, MARKETS)
+
+    assert scheduler.write_queue.qsize() == 0
+    assert db.get_latest_snapshot_id('10000', 103) is not None
+    assert db.get_latest_snapshot_id('10001', 2) is not None
+    # Counted in the workers, reported in this process
+    assert sum(REQUESTS._values.values()) == requests + len(MARKETS)
+    assert LINES._values[('parsed', '103')] == parsed + 2 * 2 * 2 * len(Config.BOOKIE_MAP)
+    assert scheduler.api_service.stats['requests'] == len(MARKETS)
+
+def test_close_drains_queued_batches(scheduler, db, api_service):
+    lines = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    results = {}
+    scheduler.planner._fan_out(results, 103, lines)
+    scheduler.write_queue.put(results)
+
+    scheduler.close()
+    assert count_rows(db) == len(lines)
+    assert scheduler.state == 'stopped'
+
+def test_write_errors_reach_the_cycle_and_reset_worker_hashes(scheduler, db, monkeypatch):
+    scheduler.ingest(EVENT_IDS, MARKETS)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db, 'save_lines', fail)
+    with pytest.raises(RuntimeError):
+        scheduler.ingest(EVENT_IDS, MARKETS)
+
+    # Nothing is skipped as unchanged once the save failed
+    monkeypatch.undo()
+    rows = count_rows(db)
+    scheduler.api_service.reset_stats()
+    scheduler.ingest(EVENT_IDS, MARKETS)
+    assert scheduler.api_service.stats['books_unchanged'] == 0
+    assert count_rows(db) == rows
+
+def test_workers_need_the_fixed_scheduler(tmp_path):
+    with pytest.raises(ValueError):
+        PollerService(f"sqlite:///{tmp_path / 'lines.db'}", scheduler='adaptive', workers=2)
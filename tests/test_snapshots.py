@@ -0,0 +1,80 @@
+# tests/test_snapshots.py
+import sqlite3
+from datetime import datetime, timedelta
+
+from database import Database
+from line_tracker import LineTracker
+from tests.conftest import KICKOFF, make_line, poll
+
+def test_each_event_and_market_in_a_batch_gets_a_snapshot(db):
+    db.save_lines([poll(0), poll(0, bookie_id=12), poll(0, market_id=102, line_value=1.5),
+                   poll(0, event_id='2')])
+
+    with db.ReadSession() as session:
+        snapshots = session.query(db.Snapshot).order_by(db.Snapshot.id).all()
+    assert [(s.event_id, s.market_id, s.line_count) for s in snapshots] == [('1', 103, 2), ('1', 102, 1), ('2', 103, 1)]
+    assert all(s.taken_at == KICKOFF for s in snapshots)
+    assert sorted(db.get_market_ids('1')) == [102, 103]
+
+def test_latest_and_baseline_snapshots(db):
+    for minutes in (0, 5, 10):
+        db.save_lines([poll(minutes)])
+
+    assert db.get_latest_snapshot_id('1', 103) == 3
+    assert db.get_last_snapshot_id() == 3
+    assert db.get_baseline_snapshot_id('1', 103, KICKOFF + timedelta(minutes=1)) == 2
+    assert db.get_baseline_snapshot_id('1', 103, KICKOFF + timedelta(minutes=11)) is None
+    assert db.get_latest_snapshot_id('1', 102) is None
+
+def test_snapshot_lines_as_of_an_earlier_poll(db):
+    db.save_lines([poll(0, odds=-110), poll(0, bookie_id=12, odds=-105)])
+    db.save_lines([poll(5, odds=-125), poll(5, bookie_id=12, odds=-105)])
+
+    def board(snapshot_id):
+        return {(line.bookie_id, line.odds) for line in db.get_snapshot_lines('1', 103, snapshot_id)}
+    assert board(1) == {(10, -110), (12, -105)}
+    assert board(2) == {(10, -125), (12, -105)}
+
+def test_current_lines_are_loaded_from_the_database_on_a_cold_cache(db):
+    db.save_lines([poll(0, odds=-110)])
+    db.save_lines([poll(5, odds=-125)])
+    db.board_cache.evict_event('1')
+
+    (line,) = db.get_current_lines('1', 103)
+    assert (line.odds, line.snapshot_id) == (-125, 2)
+    assert db.board_cache.get_lines('1', 103) is not None
+
+def test_check_line_movements_compares_against_the_lookback_baseline(db):
+    now = datetime.utcnow()
+    db.save_lines([make_line(odds=-110, timestamp=now - timedelta(minutes=30))])
+    db.save_lines([make_line(odds=-120, timestamp=now - timedelta(minutes=20))])
+    db.save_lines([make_line(odds=-130, timestamp=now - timedelta(minutes=10))])
+
+    tracker = LineTracker(db, significant_move=15)
+    (move,) = tracker.check_line_movements('1', lookback_hours=1)
+    assert (move['previous_odds'], move['current_odds'], move['odds_movement']) == (-110, -130, -20)
+
+def test_migration_backfills_snapshots_for_legacy_rows(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE betting_lines (
+            id INTEGER PRIMARY KEY, event_id VARCHAR, market_id INTEGER, market_type VARCHAR,
+            bookie_id INTEGER, player_name VARCHAR, selection VARCHAR, line_value FLOAT,
+            odds INTEGER, timestamp DATETIME
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO betting_lines (event_id, market_id, market_type, bookie_id, player_name, selection, "
+        "line_value, odds, timestamp) VALUES ('1', 103, 'props', ?, 'Player A', 'Over', 245.5, ?, ?)",
+        [(10, -110, '2024-12-29 18:00:00.000000'), (12, -105, '2024-12-29 18:00:00.000000'),
+         (10, -120, '2024-12-29 18:05:00.000000')]
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(f"sqlite:///{path}", storage_mode='changes')
+    assert db.get_latest_snapshot_id('1', 103) == 2
+    assert [line.odds for line in db.get_current_lines('1', 103)] == [-120]
+    assert {line.odds for line in db.get_snapshot_lines('1', 103, 1)} == {-110, -105}
+    db.engine.dispose()
@@ -0,0 +1,62 @@
+# tests/test_unchanged.py
+from api_service import APIService
+from config import Config
+
+EVENT_IDS = ['10000', '10001']
+
+def move_price(slate, event_id, market_id, player, bookie_id, side='Over', delta=-10):
+    _, prices = slate._prices[(event_id, market_id)]
+    prices[player][bookie_id]['costs'][side] += delta
+
+def test_repeat_fetch_is_answered_304_and_skipped(api_service):
+    first = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert len(first) and not first.unchanged
+
+    api_service.reset_stats()
+    again = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert len(again) == 0
+    assert len(again.unchanged) == 2 * 2 * len(Config.BOOKIE_MAP)  # Events x players x books
+    assert api_service.hit_rates() == {'not_modified': 1.0, 'books_unchanged': 1.0}
+
+def test_only_the_changed_book_is_parsed(api_service, slate):
+    api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    move_price(slate, 10000, 103, player=1, bookie_id=12)
+
+    api_service.reset_stats()
+    batch = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert api_service.stats['not_modified'] == 0
+    assert {(line.event_id, line.player_id, line.bookie_id) for line in batch} == {('10000', '1000001', 12)}
+    assert len(batch.unchanged) == 2 * 2 * len(Config.BOOKIE_MAP) - 1
+    assert ('10000', 103, 'Player 10000-1', 12) not in {
+        (offer.event_id, offer.market_id, offer.player_name, offer.bookie_id) for offer in batch.unchanged
+    }
+
+def test_reset_hashes_parses_everything_again(api_service):
+    first = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    api_service.reset_hashes()
+
+    again = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert len(again) == len(first)
+    assert not again.unchanged
+
+def test_hashes_are_kept_per_event_across_requests(api_service):
+    api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    api_service.fetch_market_odds('props', 103, ['10000'])
+
+    # A different request, so no ETag; only the hashes can skip
+    batch = api_service.fetch_market_odds('props', 103, ['10001'])
+    assert len(batch.unchanged) == 2 * len(Config.BOOKIE_MAP)
+
+def test_skipping_can_be_disabled(standin):
+    api_service = APIService(f"http://127.0.0.1:{standin.server_address[1]}", {}, Config.BOOKIE_MAP,
+                             skip_unchanged=False)
+    first = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    again = api_service.fetch_market_odds('props', 103, EVENT_IDS)
+    assert len(again) == len(first)
+    assert not again.unchanged
+    assert api_service.stats['not_modified'] == 0
+
+def test_unchanged_game_lines_are_keyed_without_a_player(api_service):
+    api_service.fetch_market_odds('game_lines', 2, EVENT_IDS)
+    again = api_service.fetch_market_odds('game_lines', 2, EVENT_IDS)
+    assert {offer.player_name for offer in again.unchanged} == {None}
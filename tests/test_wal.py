@@ -0,0 +1,27 @@
+# tests/test_wal.py
+import pytest
+
+from database import Database
+from tests.conftest import make_line
+
+@pytest.mark.parametrize('name', ['lines.db', 'odds db #1.db', 'week 18 100%.db'])
+def test_read_only_engine_opens_any_path(tmp_path, name):
+    db = Database(f"sqlite:///{tmp_path / name}", storage_mode='changes', wal=True)
+    try:
+        assert db.read_engine is not db.engine
+        db.save_lines([make_line()])
+        db.board_cache.evict_event('1')
+        assert [line.odds for line in db.get_current_lines('1', 103)] == [-110]
+        assert sorted(path.name for path in tmp_path.iterdir() if not path.name.endswith(('-wal', '-shm'))) == [name]
+    finally:
+        db.read_engine.dispose()
+        db.engine.dispose()
+
+def test_read_only_engine_cannot_write(tmp_path):
+    db = Database(f"sqlite:///{tmp_path / 'lines.db'}", wal=True)
+    try:
+        with db.read_engine.connect() as conn, pytest.raises(Exception):
+            conn.exec_driver_sql("DELETE FROM events")
+    finally:
+        db.read_engine.dispose()
+        db.engine.dispose()